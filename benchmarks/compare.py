@@ -0,0 +1,63 @@
+"""
+Compare two benchmark result files::
+
+    python benchmarks/compare.py results/base.json results/new.json
+
+Exits with status 1 when a target got slower than the threshold allows or
+makes more D-Bus calls than before.
+"""
+import argparse
+import json
+import sys
+from typing import Any, Dict, Tuple
+
+Key = Tuple[str, str, str]
+
+
+def load(path: str) -> Dict[Key, Dict[str, Any]]:
+    """
+
+    :param path:
+    :return:
+    """
+    with open(path) as infile:
+        data = json.load(infile)
+    return {(r['scenario'], r['target'], r['mode']): r
+            for r in data['results']}
+
+
+def main() -> int:
+    """
+
+    :return:
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument('base')
+    parser.add_argument('new')
+    parser.add_argument('--threshold', type=float, default=1.2,
+                        help='allowed wall time ratio new/base')
+    args = parser.parse_args()
+
+    base, new = load(args.base), load(args.new)
+    regressions = 0
+
+    for key in sorted(base.keys() & new.keys()):
+        b, n = base[key], new[key]
+        ratio = n['wall_ms'] / b['wall_ms'] if b['wall_ms'] else 1.0
+        b_calls, n_calls = sum(b['calls'].values()), sum(n['calls'].values())
+        flag = ''
+
+        if ratio > args.threshold or n_calls > b_calls:
+            flag = '  REGRESSION'
+            regressions += 1
+
+        print('{:8} {:55} {:5} {:9.2f} -> {:9.2f} ms ({:5.2f}x) '
+              '{:6} -> {:6} calls {:9.1f} -> {:9.1f} KiB{}'.format(
+                  *key, b['wall_ms'], n['wall_ms'], ratio, b_calls, n_calls,
+                  b['peak_kb'], n['peak_kb'], flag))
+
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
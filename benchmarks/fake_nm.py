@@ -0,0 +1,358 @@
+"""
+Scriptable fake NetworkManager service.
+
+Exports enough of the org.freedesktop.NetworkManager object tree for the
+providers in ``src/network`` to run against it: the manager, settings,
+connection profiles, devices (ethernet and wifi), access points, active
+connections and IPv4 configurations. Run it on a private bus and point the
+providers at it through ``DBUS_SYSTEM_BUS_ADDRESS``::
+
+    python benchmarks/fake_nm.py --devices 50 --access-points 500
+
+Prints ``ready`` on stdout once the bus name is owned.
+"""
+import argparse
+import sys
+from collections import Counter
+from typing import Any, Callable, Dict, List
+
+import dbus
+import dbus.service
+from dbus.mainloop.glib import DBusGMainLoop
+from gi.repository import GLib
+
+BUS_NAME = 'org.freedesktop.NetworkManager'
+NM_PATH = '/org/freedesktop/NetworkManager'
+SETTINGS_PATH = NM_PATH + '/Settings'
+
+PROPERTIES_IFACE = 'org.freedesktop.DBus.Properties'
+NM_IFACE = 'org.freedesktop.NetworkManager'
+DEVICE_IFACE = NM_IFACE + '.Device'
+WIRELESS_IFACE = DEVICE_IFACE + '.Wireless'
+AP_IFACE = NM_IFACE + '.AccessPoint'
+ACTIVE_IFACE = NM_IFACE + '.Connection.Active'
+IP4_IFACE = NM_IFACE + '.IP4Config'
+IP6_IFACE = NM_IFACE + '.IP6Config'
+SETTINGS_IFACE = NM_IFACE + '.Settings'
+CONNECTION_IFACE = SETTINGS_IFACE + '.Connection'
+FAKE_IFACE = 'org.kvnm.Fake'
+
+DEVICE_TYPE_ETHERNET, DEVICE_TYPE_WIFI = 1, 2
+DEVICE_STATE_ACTIVATED = 100
+STATE_CONNECTED_GLOBAL = 70
+
+# D-Bus calls served, by method name.
+calls: Counter = Counter()
+options = argparse.Namespace(latency=0)
+
+
+def ip4(a: int, b: int, c: int, d: int) -> dbus.UInt32:
+    """
+    IPv4 address as NetworkManager sends it: network byte order in a
+    host integer.
+
+    :param a:
+    :param b:
+    :param c:
+    :param d:
+    :return:
+    """
+    return dbus.UInt32(int.from_bytes(bytes((a, b, c, d)), sys.byteorder))
+
+
+def data(items: List[dict]) -> dbus.Array:
+    """
+    AddressData or RouteData value.
+
+    :param items:
+    :return:
+    """
+    return dbus.Array([dbus.Dictionary(item, signature='sv') for item in items],
+                      signature='a{sv}')
+
+
+def paths(items: List[str]) -> dbus.Array:
+    """
+
+    :param items:
+    :return:
+    """
+    return dbus.Array(items, signature='o')
+
+
+def reply(method: str, callback: Callable, value: Any = None) -> None:
+    """
+    Count a call and answer it, after the configured latency if any.
+    Delayed replies don't block the main loop, so concurrent clients
+    overlap like they would with a real daemon.
+
+    :param method:
+    :param callback:
+    :param value:
+    :return:
+    """
+    calls[method] += 1
+    args = () if value is None else (value,)
+
+    if options.latency:
+        GLib.timeout_add(options.latency, lambda: callback(*args) and False)
+    else:
+        callback(*args)
+
+
+class FakeObject(dbus.service.Object):
+    """
+    An exported object with static properties per interface.
+    """
+    def __init__(self, bus: dbus.Bus, path: str,
+                 props: Dict[str, Dict[str, Any]]):
+        """
+
+        :param bus:
+        :param path:
+        :param props:
+        """
+        super().__init__(bus, path)
+        self.path = path
+        self.props = props
+
+    @dbus.service.method(PROPERTIES_IFACE, in_signature='s',
+                         out_signature='a{sv}',
+                         async_callbacks=('on_reply', 'on_error'))
+    def GetAll(self, interface, on_reply, on_error):
+        reply('GetAll', on_reply,
+              dbus.Dictionary(self.props.get(interface, {}), signature='sv'))
+
+    @dbus.service.method(PROPERTIES_IFACE, in_signature='ss',
+                         out_signature='v',
+                         async_callbacks=('on_reply', 'on_error'))
+    def Get(self, interface, name, on_reply, on_error):
+        reply('Get', on_reply, self.props[interface][name])
+
+
+class Manager(FakeObject):
+    @dbus.service.method(NM_IFACE, out_signature='ao',
+                         async_callbacks=('on_reply', 'on_error'))
+    def GetDevices(self, on_reply, on_error):
+        reply('GetDevices', on_reply, self.props[NM_IFACE]['Devices'])
+
+    @dbus.service.method(NM_IFACE, out_signature='a{ss}',
+                         async_callbacks=('on_reply', 'on_error'))
+    def GetPermissions(self, on_reply, on_error):
+        reply('GetPermissions', on_reply, dbus.Dictionary({
+            NM_IFACE + '.network-control': 'yes',
+            NM_IFACE + '.settings.modify.system': 'auth',
+            NM_IFACE + '.enable-disable-wifi': 'yes',
+        }, signature='ss'))
+
+    @dbus.service.method(FAKE_IFACE, out_signature='a{su}')
+    def Stats(self):
+        return dbus.Dictionary(calls, signature='su')
+
+    @dbus.service.method(FAKE_IFACE)
+    def ResetStats(self):
+        calls.clear()
+
+
+class Settings(FakeObject):
+    @dbus.service.method(SETTINGS_IFACE, out_signature='ao',
+                         async_callbacks=('on_reply', 'on_error'))
+    def ListConnections(self, on_reply, on_error):
+        reply('ListConnections', on_reply,
+              self.props[SETTINGS_IFACE]['Connections'])
+
+
+class Connection(FakeObject):
+    def __init__(self, bus: dbus.Bus, path: str, settings: dict):
+        """
+
+        :param bus:
+        :param path:
+        :param settings:
+        """
+        super().__init__(bus, path, {})
+        self.settings = settings
+
+    @dbus.service.method(CONNECTION_IFACE, out_signature='a{sa{sv}}',
+                         async_callbacks=('on_reply', 'on_error'))
+    def GetSettings(self, on_reply, on_error):
+        reply('GetSettings', on_reply, self.settings)
+
+    @dbus.service.method(CONNECTION_IFACE, in_signature='s',
+                         out_signature='a{sa{sv}}',
+                         async_callbacks=('on_reply', 'on_error'))
+    def GetSecrets(self, setting, on_reply, on_error):
+        secrets = {}
+        if setting == '802-11-wireless-security':
+            secrets = {setting: {'psk': 'fake-secret'}}
+        reply('GetSecrets', on_reply,
+              dbus.Dictionary(secrets, signature='sa{sv}'))
+
+
+class WifiDevice(FakeObject):
+    @dbus.service.method(WIRELESS_IFACE, out_signature='ao',
+                         async_callbacks=('on_reply', 'on_error'))
+    def GetAccessPoints(self, on_reply, on_error):
+        reply('GetAccessPoints', on_reply,
+              self.props[WIRELESS_IFACE]['AccessPoints'])
+
+
+def build(bus: dbus.Bus, args: argparse.Namespace) -> List[FakeObject]:
+    """
+    Export the object tree described by the command line.
+
+    :param bus:
+    :param args:
+    :return:
+    """
+    objects: List[FakeObject] = []
+    wifi = min(args.wifi, args.devices)
+
+    conn_paths = ['%s/%d' % (SETTINGS_PATH, i) for i in range(args.connections)]
+    for i, path in enumerate(conn_paths):
+        objects.append(Connection(bus, path, dbus.Dictionary({
+            'connection': {'id': 'profile-%d' % i, 'type': '802-3-ethernet',
+                           'uuid': '00000000-0000-0000-0000-%012d' % i},
+            'ipv4': {'method': 'auto'},
+            'ipv6': {'method': 'auto'},
+        }, signature='sa{sv}')))
+
+    dev_paths, ap_paths, ip4_paths = [], [], []
+    for i in range(args.devices):
+        path = '%s/Devices/%d' % (NM_PATH, i)
+        ip4_path = '%s/IP4Config/%d' % (NM_PATH, i)
+        ip6_path = '%s/IP6Config/%d' % (NM_PATH, i)
+        dev_paths.append(path)
+        ip4_paths.append(ip4_path)
+        gateway = '10.%d.%d.1' % (i // 256, i % 256)
+
+        objects.append(FakeObject(bus, ip4_path, {IP4_IFACE: {
+            'Addresses': dbus.Array([
+                dbus.Array([ip4(10, i // 256, i % 256, 2), 24,
+                            ip4(10, i // 256, i % 256, 1)], signature='u')
+            ], signature='au'),
+            'Routes': dbus.Array([
+                dbus.Array([ip4(172, (r >> 8) & 0xff, r & 0xff, 0), 24,
+                            ip4(10, i // 256, i % 256, 1), 100], signature='u')
+                for r in range(args.routes)
+            ], signature='au'),
+            'AddressData': data([{
+                'address': '10.%d.%d.2' % (i // 256, i % 256),
+                'prefix': dbus.UInt32(24)}]),
+            'RouteData': data([{
+                'dest': '172.%d.%d.0' % ((r >> 8) & 0xff, r & 0xff),
+                'prefix': dbus.UInt32(24), 'next-hop': gateway,
+                'metric': dbus.UInt32(100)} for r in range(args.routes)]),
+            'Gateway': gateway,
+            'Nameservers': dbus.Array([ip4(10, 0, 0, 53)], signature='u'),
+        }}))
+        objects.append(FakeObject(bus, ip6_path, {IP6_IFACE: {
+            'AddressData': data([{
+                'address': 'fd00:%x::2' % i, 'prefix': dbus.UInt32(64)}]),
+            'RouteData': data([{
+                'dest': 'fd10:%x:%x::' % (i, r), 'prefix': dbus.UInt32(48),
+                'next-hop': 'fd00:%x::1' % i, 'metric': dbus.UInt32(100)}
+                for r in range(args.routes6)]),
+            'Gateway': 'fd00:%x::1' % i,
+        }}))
+
+        props = {DEVICE_IFACE: {
+            'Interface': 'wlan%d' % i if i < wifi else 'veth%d' % i,
+            'DeviceType': dbus.UInt32(
+                DEVICE_TYPE_WIFI if i < wifi else DEVICE_TYPE_ETHERNET),
+            'State': dbus.UInt32(DEVICE_STATE_ACTIVATED),
+            'Driver': 'iwlwifi' if i < wifi else 'veth',
+            'Managed': dbus.Boolean(True),
+            'HwAddress': '02:00:00:00:%02X:%02X' % (i // 256, i % 256),
+            'Ip4Config': dbus.ObjectPath(ip4_path),
+            'Ip6Config': dbus.ObjectPath(ip6_path),
+        }}
+
+        if i < wifi:
+            aps = []
+            for j in range(i, args.access_points, wifi):
+                ap_path = '%s/AccessPoint/%d' % (NM_PATH, j)
+                ssid = ('ssid-%d' % (j % max(args.ssids, 1))).encode()
+                aps.append(ap_path)
+                objects.append(FakeObject(bus, ap_path, {AP_IFACE: {
+                    'Ssid': dbus.Array(ssid, signature='y'),
+                    'HwAddress': '06:00:00:00:%02X:%02X' % (j // 256, j % 256),
+                    'Frequency': dbus.UInt32(2412 + 5 * (j % 13)),
+                    'Strength': dbus.Byte(j % 101),
+                    'LastSeen': dbus.Int32(1000),
+                }}))
+            ap_paths.extend(aps)
+            props[WIRELESS_IFACE] = {
+                'AccessPoints': paths(aps),
+                'LastScan': dbus.Int64(1000),
+            }
+            objects.append(WifiDevice(bus, path, props))
+        else:
+            objects.append(FakeObject(bus, path, props))
+
+    active_paths = []
+    for i in range(min(args.active, args.devices, args.connections)):
+        path = '%s/ActiveConnection/%d' % (NM_PATH, i)
+        active_paths.append(path)
+        objects.append(FakeObject(bus, path, {ACTIVE_IFACE: {
+            'Id': 'profile-%d' % i,
+            'Type': '802-3-ethernet',
+            'Uuid': '00000000-0000-0000-0000-%012d' % i,
+            'Connection': dbus.ObjectPath(conn_paths[i]),
+            'Default': dbus.Boolean(i == 0),
+            'Devices': paths([dev_paths[i]]),
+        }}))
+
+    objects.append(Settings(bus, SETTINGS_PATH, {SETTINGS_IFACE: {
+        'Hostname': 'fake-host',
+        'CanModify': dbus.Boolean(True),
+        'Connections': paths(conn_paths),
+    }}))
+    objects.append(Manager(bus, NM_PATH, {NM_IFACE: {
+        'Version': '1.99.0-fake',
+        'State': dbus.UInt32(STATE_CONNECTED_GLOBAL),
+        'NetworkingEnabled': dbus.Boolean(True),
+        'WirelessEnabled': dbus.Boolean(True),
+        'WirelessHardwareEnabled': dbus.Boolean(True),
+        'WwanEnabled': dbus.Boolean(False),
+        'WwanHardwareEnabled': dbus.Boolean(False),
+        'Devices': paths(dev_paths),
+        'AllDevices': paths(dev_paths),
+        'ActiveConnections': paths(active_paths),
+    }}))
+    return objects
+
+
+def main() -> None:
+    """
+
+    :return:
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--devices', type=int, default=10)
+    parser.add_argument('--wifi', type=int, default=1,
+                        help='how many of the devices are wifi devices')
+    parser.add_argument('--access-points', type=int, default=50)
+    parser.add_argument('--ssids', type=int, default=20,
+                        help='distinct SSIDs shared by the access points')
+    parser.add_argument('--connections', type=int, default=10)
+    parser.add_argument('--active', type=int, default=5)
+    parser.add_argument('--routes', type=int, default=10,
+                        help='IPv4 routes per device')
+    parser.add_argument('--routes6', type=int, default=0,
+                        help='IPv6 routes per device')
+    parser.add_argument('--latency', type=int, default=0,
+                        help='reply delay in milliseconds')
+    parser.parse_args(namespace=options)
+
+    DBusGMainLoop(set_as_default=True)
+    bus = dbus.SystemBus()
+    objects = build(bus, options)
+    name = dbus.service.BusName(BUS_NAME, bus)
+
+    print('ready', flush=True)
+    GLib.MainLoop().run()
+
+
+if __name__ == '__main__':
+    main()
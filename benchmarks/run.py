@@ -0,0 +1,360 @@
+"""
+Benchmark the providers, and optionally the widgets, against a fake
+NetworkManager on a private bus::
+
+    python benchmarks/run.py --sizes small,medium,large
+    python benchmarks/run.py --widgets   # needs a display
+    python benchmarks/run.py --replay calls.jsonl --timing
+
+For every scenario a private ``dbus-daemon`` and ``fake_nm.py`` are
+started, then each provider is run cold (empty cache) and warm. Wall time,
+client side and server side D-Bus call counts and peak traced memory are
+written to ``benchmarks/results/<revision>.json``; compare two result
+files with ``compare.py``.
+
+With ``--replay``, the providers are run against a recording made with
+``python -m kvnm --record`` instead (see ``network.recording``), with or
+without the recorded latencies, and no bus is started.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(os.path.dirname(BENCH_DIR), 'src')
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+sys.path.insert(0, SRC_DIR)
+
+# name: (devices, wifi, access points, connections, active, routes)
+SCENARIOS: Dict[str, Tuple[int, ...]] = {
+    'small': (10, 1, 50, 10, 5, 10),
+    'medium': (50, 2, 500, 100, 20, 100),
+    'large': (200, 4, 2000, 500, 50, 1000),
+}
+PROVIDERS = (
+    'network.device.get_available_devices',
+    'network.ssid.get_ssids',
+    'network.connection.get_connection_details',
+    'network.connection.get_active_connections',
+    'network.connection.get_available_connections',
+    'network.info.get_general_info',
+    'network.routes.get_routes',
+)
+REPEAT = 3
+
+
+def start_bus() -> Tuple[subprocess.Popen, str]:
+    """
+    Start a private bus daemon and return it with its address.
+
+    :return:
+    """
+    proc = subprocess.Popen(
+        ['dbus-daemon', '--session', '--nofork', '--print-address'],
+        stdout=subprocess.PIPE, universal_newlines=True)
+    return proc, proc.stdout.readline().strip()
+
+
+def start_fake(address: str, scenario: Tuple[int, ...],
+               latency: int) -> subprocess.Popen:
+    """
+    Start the fake NetworkManager and wait until it owns its name.
+
+    :param address:
+    :param scenario:
+    :param latency:
+    :return:
+    """
+    devices, wifi, aps, connections, active, routes = scenario
+    proc = subprocess.Popen(
+        [sys.executable, os.path.join(BENCH_DIR, 'fake_nm.py'),
+         '--devices', str(devices), '--wifi', str(wifi),
+         '--access-points', str(aps), '--connections', str(connections),
+         '--active', str(active), '--routes', str(routes),
+         '--latency', str(latency)],
+        stdout=subprocess.PIPE, universal_newlines=True,
+        env=dict(os.environ, DBUS_SYSTEM_BUS_ADDRESS=address))
+
+    if proc.stdout.readline().strip() != 'ready':
+        raise RuntimeError('fake NetworkManager failed to start')
+    return proc
+
+
+def resolve(path: str) -> Callable[[], Any]:
+    """
+
+    :param path:
+    :return:
+    """
+    import importlib
+
+    module, func = path.rsplit('.', 1)
+    return getattr(importlib.import_module(module), func)
+
+
+def server_calls(reset: bool = False) -> Dict[str, int]:
+    """
+
+    :param reset:
+    :return:
+    """
+    from network.properties import get_bus, NM_BUS_NAME, NM_PATH
+
+    method = 'ResetStats' if reset else 'Stats'
+    result = get_bus().call_blocking(
+        NM_BUS_NAME, NM_PATH, 'org.kvnm.Fake', method, None, ())
+    return {str(k): int(v) for k, v in (result or {}).items()}
+
+
+def consume(data: Any) -> Any:
+    """
+    Read streamed tables to the end, as the table popups do. Streams
+    are only cached once exhausted, and their reads run in the
+    background until then.
+
+    :param data:
+    :return:
+    """
+    from widgets.data import is_stream
+
+    if is_stream(data):
+        cols, rows = data
+        return cols, list(rows)
+    return data
+
+
+def materialize(data: Any) -> Any:
+    """
+    Generate lazy subtrees, as a full dump would.
+
+    :param data:
+    :return:
+    """
+    from widgets.data import node_children, is_tree
+
+    if is_tree(data):
+        for child in node_children(data):
+            materialize(child)
+    return consume(data)
+
+
+def measure(func: Callable[[], Any], cold: bool,
+            replay: Optional[Any] = None) -> Dict[str, Any]:
+    """
+    Best wall time of REPEAT runs, then one traced run for memory.
+    Streamed results are read to the end within the timed call.
+
+    :param func:
+    :param cold:
+    :param replay: the Replay backend, which has no server side count.
+    :return:
+    """
+    from network.cache import cache
+    from network.properties import calls
+
+    best = float('inf')
+    for _ in range(REPEAT):
+        if cold:
+            cache.clear()
+        calls.clear()
+        if replay is None:
+            server_calls(reset=True)
+        else:
+            replay.rewind()
+
+        start = time.perf_counter()
+        consume(func())
+        best = min(best, time.perf_counter() - start)
+
+    result = {
+        'wall_ms': round(best * 1000, 3),
+        'calls': dict(calls),
+        'server_calls': server_calls() if replay is None else {},
+    }
+
+    if cold:
+        cache.clear()
+    tracemalloc.start()
+    consume(func())
+    result['peak_kb'] = round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+    tracemalloc.stop()
+    return result
+
+
+def bench_providers(name: str,
+                    replay: Optional[Any] = None) -> List[Dict[str, Any]]:
+    """
+
+    :param name:
+    :param replay:
+    :return:
+    """
+    results = []
+
+    for path in PROVIDERS:
+        provider = resolve(path)
+        for mode in ('cold', 'warm'):
+            results.append(dict(
+                scenario=name, target=path, mode=mode,
+                **measure(provider, mode == 'cold', replay)))
+
+        if path.endswith('get_connection_details'):
+            results.append(dict(
+                scenario=name, target=path + '(full)', mode='cold',
+                **measure(lambda: materialize(provider()), True, replay)))
+    return results
+
+
+def bench_replay(path: str, timing: bool) -> List[Dict[str, Any]]:
+    """
+    Run the providers against a recording.
+
+    :param path:
+    :param timing:
+    :return:
+    """
+    from network import recording
+
+    replay = recording.install(replay=path, timing=timing)
+    name = 'replay:' + os.path.splitext(os.path.basename(path))[0]
+    return bench_providers(name, replay)
+
+
+def bench_widgets(name: str) -> List[Dict[str, Any]]:
+    """
+    Time the widget builds done by the setting popups.
+
+    :param name:
+    :return:
+    """
+    os.environ.setdefault('KIVY_NO_ARGS', '1')
+    from kivy.uix.treeview import TreeView
+    from widgets.tableview import TableColumn, TableView, RecycleTableView
+    from widgets.treeview import populate_tree_view
+
+    # Listed once: every build adds the same rows.
+    cols, rows = consume(resolve('network.ssid.get_ssids')())
+    tree = materialize(resolve('network.connection.get_connection_details')())
+
+    def table(cls):
+        def build():
+            view = cls(size=(500, 320), pos_hint={})
+            for col in cols:
+                view.add_column(TableColumn(**col))
+            for row in rows:
+                view.add_row(row)
+        return build
+
+    def tree_view(lazy):
+        def build():
+            populate_tree_view(TreeView(hide_root=True), None, tree, lazy)
+        return build
+
+    builds = {
+        'TableView': table(TableView),
+        'RecycleTableView': table(RecycleTableView),
+        'TreeView': tree_view(False),
+        'TreeView(lazy)': tree_view(True),
+    }
+    return [
+        dict(scenario=name, target=target, mode='warm',
+             **measure(build, False))
+        for target, build in builds.items()
+    ]
+
+
+def revision() -> str:
+    """
+
+    :return:
+    """
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCH_DIR,
+            universal_newlines=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def bench_scenarios(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    """
+    Run every scenario against the fake NetworkManager.
+
+    :param args:
+    :return:
+    """
+    bus, address = start_bus()
+    # Must be set before the providers open the system bus.
+    os.environ['DBUS_SYSTEM_BUS_ADDRESS'] = address
+    results: List[Dict[str, Any]] = []
+
+    try:
+        for name in args.sizes.split(','):
+            fake = start_fake(address, SCENARIOS[name], args.latency)
+            try:
+                results.extend(bench_providers(name))
+                if args.widgets:
+                    results.extend(bench_widgets(name))
+            finally:
+                fake.terminate()
+                fake.wait()
+    finally:
+        bus.terminate()
+        bus.wait()
+
+    return results
+
+
+def main() -> int:
+    """
+
+    :return:
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default='small,medium',
+                        help='comma separated: ' + ', '.join(SCENARIOS))
+    parser.add_argument('--latency', type=int, default=0,
+                        help='fake reply delay in milliseconds')
+    parser.add_argument('--widgets', action='store_true')
+    parser.add_argument('--replay', metavar='FILE',
+                        help='run the providers against a recording')
+    parser.add_argument('--timing', action='store_true',
+                        help='replay with the recorded latencies')
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    if args.replay:
+        results = bench_replay(args.replay, args.timing)
+    else:
+        results = bench_scenarios(args)
+
+    rev = revision()
+    output = args.output or os.path.join(RESULTS_DIR, rev + '.json')
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+
+    with open(output, 'w') as outfile:
+        json.dump({
+            'revision': rev,
+            'python': platform.python_version(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'latency_ms': args.latency,
+            'replay': args.replay,
+            'results': results,
+        }, outfile, indent=2)
+
+    for r in results:
+        print('{scenario:8} {target:55} {mode:5} {wall_ms:10.2f} ms '
+              '{calls_total:6} calls {peak_kb:10.1f} KiB'.format(
+                  calls_total=sum(r['calls'].values()), **r))
+    print('results written to', output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
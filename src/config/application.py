@@ -1,14 +1,29 @@
+import json
+import time
+from typing import Dict, List, Optional, Tuple
+
 from kivy.app import App
 from kivy.logger import Logger
 from kivy.uix.screenmanager import NoTransition
 from kivy.uix.popup import Popup
+from kivy.uix.settings import SettingItem
 from kivy.clock import Clock
 from kivy.config import ConfigParser
+from kivy.core.window import Window
+from dbus.exceptions import DBusException
 
 from main import BASE_DIR, DEBUG_MODE, ICON_PATH
+from startup import START_TIME
 from gui.manager import Manager
+from gui.screen import load_layout
 from .settings import CustomSettings
-from network.info import get_general_info, get_permissions
+from network import cache, profiler
+from network.snapshot import snapshot
+from network.sampler import Sampler
+from network import recording
+from network.registry import registry, ProviderError
+import plugins
+from .worker import submit
 from .defaults import *
 
 NOTIFICATION_APP = 'kvnm'
@@ -18,13 +33,21 @@ NOTIFICATION_MSG = "Thanks for use KvNM"
 
 GITHUB_URL = 'https://github.com/gmork2/kvnm'
 
+# Last known provider data, next to application.ini.
+SNAPSHOT_FILE = 'snapshot.bin'
+
+INFO_JSON = 'info.json'
+PERMISSIONS_JSON = 'permissions.json'
+
 OPTIONS = [
-    ('General', 'info.json'),
-    ('Permissions', 'permissions.json'),
+    ('General', INFO_JSON),
+    ('Permissions', PERMISSIONS_JSON),
     ('Connections', 'connection.json'),
     ('SSID', 'ssid.json'),
     ('Devices', 'device.json'),
+    ('Routes', 'routes.json'),
 ]
+DEBUG_OPTION = ('Debug', 'debug.json')
 
 
 class Application(App):
@@ -48,6 +71,15 @@ class Application(App):
 
             Clock.schedule_once(self.notify, 1)
 
+        # NetworkManager general info and permissions, queried once
+        # after the first frame.
+        self.general_info: Optional[Dict] = None
+        self.permissions: Optional[Dict] = None
+        self.permissions_panel = False
+        self.first_frame_time: Optional[float] = None
+        # History samplers started, stopped on exit.
+        self.samplers: List[Sampler] = []
+
         super().__init__(*args, **kwargs)
 
     def create_settings(self):
@@ -77,12 +109,23 @@ class Application(App):
         :param config:
         :return:
         """
-        config.setdefaults('permissions', get_permissions())
-        config.setdefaults('info', get_general_info())
+        # Values saved by the last run are shown until NetworkManager
+        # answers; nothing is queried before the first frame.
+        for section, filename in (('info', INFO_JSON),
+                                  ('permissions', PERMISSIONS_JSON)):
+            config.setdefaults(section, dict.fromkeys(
+                CustomSettings.json_keys(filename), ''))
 
         config.setdefaults('ssid', DEFAULT_SSID)
         config.setdefaults('connection', DEFAULT_CONNECTION)
         config.setdefaults('device', DEFAULT_DEVICE)
+        config.setdefaults('routes', DEFAULT_ROUTES)
+        config.setdefaults('debug', DEFAULT_DEBUG)
+
+        for plugin in plugins.discover():
+            config.setdefaults(plugin.section, plugins.defaults(plugin))
+        for origin, error in plugins.errors().items():
+            Logger.error(f'Application: plugin {origin}: {error}')
 
     def build(self) -> Manager:
         """
@@ -92,10 +135,215 @@ class Application(App):
         self.title = 'Network Manager'
         self.icon: str = ICON_PATH
         self.settings_cls = CustomSettings
+        profiler.configure(self.config.getboolean('debug', 'profiling'))
+        try:
+            if recording.install_from_env():
+                Logger.info('Application: NetworkManager calls are '
+                            'recorded or replayed')
+        except (OSError, ValueError) as e:
+            Logger.error(f'Application: recording unavailable: {e}')
+        snapshot.open(os.path.join(
+            os.path.dirname(self.get_application_config()), SNAPSHOT_FILE))
+        self.register_providers()
+        load_layout()
         self.root = root = Manager(transition=NoTransition())
 
+        Window.bind(on_flip=self.on_first_frame)
         return root
 
+    def on_first_frame(self, window: Window) -> None:
+        """
+        Report the startup time and start the background work that was
+        kept out of it.
+
+        :param window:
+        :return:
+        """
+        window.unbind(on_flip=self.on_first_frame)
+        self.first_frame_time = elapsed = time.perf_counter() - START_TIME
+        profiler.record('startup', 'first frame', elapsed)
+        Logger.info(f'Application: first frame after {elapsed:.3f}s')
+
+        submit(self.load_network_state, self.on_network_state,
+               self.on_network_state_error)
+        submit(registry.preload, self.on_providers_loaded)
+        submit(self.start_samplers, lambda result: None,
+               self.on_sampler_error)
+
+    @staticmethod
+    def load_network_state() -> Tuple[Dict, Dict]:
+        """
+        Keep the cache in sync with NetworkManager from now on, then
+        query the general info and permissions. Runs in a worker.
+
+        :return:
+        """
+        from network.info import get_general_info, get_permissions
+
+        try:
+            # A replayed state never changes.
+            if not recording.replaying():
+                cache.install()
+        except (ImportError, DBusException) as e:
+            Logger.warning(f'Application: NetworkManager signals '
+                           f'unavailable, cache falls back to TTL ({e})')
+
+        with profiler.span('startup', 'network state'):
+            return get_general_info(), get_permissions()
+
+    def on_network_state(self, state: Tuple[Dict, Dict]) -> None:
+        """
+        Store the queried values and show them in the open settings.
+        The permissions panel is only written when its entries changed,
+        and added if the previous run left none.
+
+        :param state:
+        :return:
+        """
+        self.general_info, self.permissions = state
+        self.apply_values('info', self.general_info)
+        self.apply_values('permissions', self.permissions)
+
+        written = CustomSettings.create_json_from_dict(
+            self.permissions, 'permissions', PERMISSIONS_JSON)
+        settings = self._app_settings
+
+        if settings is not None and not self.permissions_panel:
+            settings.add_json_panel(
+                'Permissions', self.config,
+                os.path.join(BASE_DIR, 'json', PERMISSIONS_JSON))
+            self.permissions_panel = True
+        elif written:
+            Logger.info('Application: permissions changed, the panel '
+                        'is updated on next start')
+
+    @staticmethod
+    def on_network_state_error(error: BaseException) -> None:
+        """
+
+        :param error:
+        :return:
+        """
+        Logger.error(f'Application: NetworkManager unavailable: {error!r}')
+
+    def apply_values(self, section: str, values: Dict) -> None:
+        """
+        Write the values that changed to the config section and to the
+        settings items showing them. The config file is only rewritten
+        when one did.
+
+        :param section:
+        :param values:
+        :return:
+        """
+        changed = {
+            key: str(value) for key, value in values.items()
+            if not self.config.has_option(section, key) or
+            self.config.get(section, key) != str(value)
+        }
+        if not changed:
+            return
+
+        for key, value in changed.items():
+            self.config.set(section, key, value)
+        self.config.write()
+
+        if self._app_settings is None:
+            return
+        for widget in self._app_settings.walk(restrict=True):
+            if isinstance(widget, SettingItem) and \
+                    widget.section == section and widget.key in changed:
+                widget.value = self.config.get(section, key=widget.key)
+
+    def register_providers(self) -> None:
+        """
+        Declare the provider paths found in the config; they are
+        imported in the background once the first frame is drawn.
+
+        :return:
+        """
+        for section, keys in PROVIDER_KEYS.items():
+            for key in keys:
+                path = self.config.get(section, key)
+                try:
+                    registry.add([path])
+                except ProviderError as e:
+                    Logger.error(f'Application: [{section}] {key}: {e}')
+
+        # Plugin providers are only imported when their panel opens.
+        for plugin in plugins.discover():
+            for key in plugin.providers:
+                path = self.config.get(plugin.section, key)
+                cache_policy = plugin.cache or plugins.CachePolicy()
+                try:
+                    registry.declare(
+                        path, cache_policy.tags, cache_policy.ttl,
+                        plugin.cost)
+                except ProviderError as e:
+                    Logger.error(f'Application: [{plugin.section}] {key}: {e}')
+
+    @staticmethod
+    def on_providers_loaded(errors: dict) -> None:
+        """
+
+        :param errors:
+        :return:
+        """
+        for path, error in errors.items():
+            Logger.error(f'Application: {error}')
+
+    def start_samplers(self) -> None:
+        """
+        Start recording history in the background, so it covers the
+        time before a panel is opened. SSID history is only recorded on
+        machines with a wireless device. Runs in a worker.
+
+        :return:
+        """
+        try:
+            from network import ssid
+        except ImportError as e:
+            Logger.warning(f'Application: history unavailable ({e})')
+            return
+
+        if ssid.has_wireless():
+            ssid.sampler.start()
+            self.samplers.append(ssid.sampler)
+        else:
+            Logger.info('Application: no wireless device, '
+                        'SSID history not recorded')
+        if self.config.getboolean('device', 'statistics'):
+            self.start_traffic()
+
+    def start_traffic(self) -> None:
+        """
+        Start sampling device traffic at the configured rate.
+
+        :return:
+        """
+        from network import traffic
+
+        traffic.start(self.config.getint('device', 'refresh_rate_ms'))
+
+    @staticmethod
+    def on_sampler_error(error: BaseException) -> None:
+        """
+
+        :param error:
+        :return:
+        """
+        Logger.error(f'Application: sampler failed to start: {error!r}')
+
+    @staticmethod
+    def stop_traffic() -> None:
+        """
+
+        :return:
+        """
+        from network import traffic
+
+        traffic.stop()
+
     def notify(self, *args, **kwargs) -> None:
         """
 
@@ -117,13 +365,28 @@ class Application(App):
         :param settings:
         :return:
         """
-        settings.create_json_from_dict(
-            get_permissions(), 'permissions', 'permissions.json')
+        if self.permissions is not None:
+            settings.create_json_from_dict(
+                self.permissions, 'permissions', PERMISSIONS_JSON)
+
+        options = list(OPTIONS)
+        if DEBUG_MODE or profiler.enabled:
+            options.append(DEBUG_OPTION)
 
-        for pref in OPTIONS:
+        for pref in options:
             json_data = os.path.join(BASE_DIR, 'json', pref[1])
+            if pref[1] == PERMISSIONS_JSON:
+                # First run: added once the permissions are known.
+                self.permissions_panel = os.path.exists(json_data)
+                if not self.permissions_panel:
+                    continue
             settings.add_json_panel(pref[0], self.config, json_data)
 
+        for plugin in plugins.discover():
+            settings.add_json_panel(
+                plugin.title, self.config,
+                data=json.dumps(plugins.panel_data(plugin)))
+
     def on_config_change(self, config: ConfigParser,
                          section: str, key: str, value: str) -> None:
         """
@@ -139,6 +402,16 @@ class Application(App):
             Logger.debug(f'Application: on_config_change('
                          f'{section}, {key}, {value})')
 
+            if (section, key) == ('debug', 'profiling'):
+                profiler.configure(value == '1')
+            elif section == 'device' and \
+                    key in ('statistics', 'refresh_rate_ms'):
+                if config.getboolean('device', 'statistics'):
+                    submit(self.start_traffic, lambda result: None,
+                           self.on_sampler_error)
+                else:
+                    self.stop_traffic()
+
     def display_settings(self, settings: CustomSettings) -> None:
         """
         Display settings inside popup.
@@ -174,6 +447,21 @@ class Application(App):
 
         :return:
         """
+        Logger.info(f'Application: cache stats {cache.cache.stats()}')
+        for sampler in self.samplers:
+            sampler.stop()
+        self.stop_traffic()
+
+        try:
+            snapshot.save()
+        except OSError as e:
+            Logger.error(f'Application: snapshot not saved: {e}')
+        recording.close()
+
+        dump_path = self.config.get('debug', 'dump_path')
+        if profiler.enabled and dump_path:
+            profiler.dump(dump_path)
+            Logger.info(f'Application: profile written to {dump_path}')
         print("\n* KvNM is licensed under GNU GPLv3 (\33[32mhttp://fsf.org/\33[0m)")
         print(f'* Visit at \33[32m{GITHUB_URL}\33[0m\n')
 
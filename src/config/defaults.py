@@ -5,7 +5,11 @@ from typing import Dict
 Default = Dict[str, str]
 
 
-DEFAULT_SSID = {'ssids': 'network.ssid.get_ssids'}
+DEFAULT_SSID = {
+    'ssids': 'network.ssid.get_ssids',
+    'ssids_aggregated': 'network.ssid.get_ssids_aggregated',
+    'ssids_by_band': 'network.ssid.get_ssids_by_band',
+}
 
 DEFAULT_CONNECTION = {
     'connection_details': 'network.connection.get_connection_details',
@@ -15,6 +19,27 @@ DEFAULT_CONNECTION = {
 
 DEFAULT_DEVICE = {
     'available_devices': 'network.device.get_available_devices',
+    'statistics': '0',
+    'refresh_rate_ms': '1000',
+}
+
+DEFAULT_ROUTES = {
+    'routes': 'network.routes.get_routes',
+}
+
+DEFAULT_DEBUG = {
+    'profiling': '0',
+    'profile': 'network.profiler.get_profile',
+    'dump_path': '',
+}
+
+# Config keys holding provider paths, by section.
+PROVIDER_KEYS = {
+    'ssid': tuple(DEFAULT_SSID),
+    'connection': tuple(DEFAULT_CONNECTION),
+    'device': ('available_devices',),
+    'routes': tuple(DEFAULT_ROUTES),
+    'debug': ('profile',),
 }
 
 DEFAULT_ADD_CONNECTION = {
@@ -1,24 +1,51 @@
 import os
 import json
-from typing import Dict, Union, overload, Optional
+import hashlib
+from typing import Callable, Dict, List, Set, Tuple, Union, Optional
 
+from kivy.clock import Clock
 from kivy.logger import Logger
 from kivy.properties import ObjectProperty
 from kivy.uix.popup import Popup
+from kivy.uix.label import Label
+from kivy.uix.boxlayout import BoxLayout
+from kivy.uix.widget import Widget
 from kivy.uix.settings import Settings, SettingItem, SettingsPanel
 from kivy.metrics import dp
 from kivy.uix.scrollview import ScrollView
-from kivy.factory import Factory
 from kivy.core.window import Window
-from kivy.uix.treeview import TreeView
-
-from widgets.treeview import populate_tree_view, Tree
-from widgets.tableview import TableColumn, TableView, Table
+from kivy.uix.textinput import TextInput
+from kivy.uix.treeview import TreeView, TreeViewLabel
+
+from widgets.treeview import (
+    populate_tree_view, update_tree_view, reset_volatile_nodes, expand_path,
+    set_highlight, Tree
+)
+from widgets.tableview import (
+    TableColumn, TableHeader, RecycleTableView, TableFill, Table
+)
+from widgets.data import StreamTable, is_stream
+from widgets.virtuallist import VirtualList
+from widgets.index import TreeIndex
+from network import profiler
+from network.cache import cache
+from network.snapshot import snapshot
+from network.registry import registry
+from network import secrets
 
 from main import BASE_DIR
+from .worker import Job, submit, iterate
 
 TABLE_SIZE = (500, 320)
 POPUP_SIZE_HINT = (None, 0.95)
+LOADING_TEXT = 'Loading...'
+# Appended to the popup title while it shows the saved snapshot.
+STALE_TEXT = ' (last known)'
+SEARCH_HEIGHT = 40
+# Seconds without typing before searching.
+SEARCH_DELAY = .25
+# Matches expanded at most, the rest are only counted.
+MAX_MATCHES = 100
 TEMPLATE: Dict[str, Union[str, bool]] = {
     "type": "string",
     "title": '',
@@ -28,35 +55,48 @@ TEMPLATE: Dict[str, Union[str, bool]] = {
 }
 
 
-@overload
-def _get_data(instance: "SettingTable") -> Table:
-    pass
-
-
-def _get_data(instance: "SettingTree") -> Tree:
+def _get_provider(path: str) -> Callable[[], Union[Table, Tree]]:
     """
+    Return the provider function named by a setting value, importing
+    its module on first use.
 
-    :param instance:
+    :param path:
     :return:
     """
-    module, func = instance.value.rsplit('.', 1)
+    with profiler.span('resolve', path):
+        return registry.get(path).func
 
-    Factory.register(func, module=module)
-    return getattr(Factory, func)()
 
-
-class SettingTree(SettingItem):
+class SettingPopup(SettingItem):
     """
-    Implementation of a Tree setting on top of a :class:`SettingItem`.
-    It is visualized with a :class:`~kivy.uix.switch.Switch` widget that, when
-    clicked, will open a :class:`~kivy.uix.popup.Popup` with a
-    :class:`~kivy.uix.treeview.TreeView` so the user can expand
-    label nodes.
+    Base class for settings that display provider data inside a
+    :class:`~kivy.uix.popup.Popup`. The popup opens immediately while the
+    provider runs in a worker thread. The popup and its content are kept
+    between opens; on reopen only the data is refreshed. Until the
+    provider first answers, the data saved by the previous run is shown,
+    marked stale.
+
+    While the popup is open, invalidations of the provider's cache tags
+    (NetworkManager signals, samplers) refresh it. A burst of them is
+    coalesced into a single provider call on the next frame.
     """
     # Used to store the current popup when it is shown.
     popup: Optional[Popup] = ObjectProperty(None, allownone=True)
-
-    def on_panel(self, instance: "SettingTree",
+    # Widget showing the provider data, reused across opens.
+    content: Optional[Widget] = ObjectProperty(None, allownone=True)
+    # Provider call in progress, if any.
+    job: Optional[Job] = ObjectProperty(None, allownone=True)
+    # Provider data currently displayed. Not a Kivy property, assigning
+    # one compares the old and new tables for equality.
+    data: Union[Table, Tree, None] = None
+    # Set when a refresh is requested while the provider runs.
+    stale: bool = False
+    # Cache tags of the provider, watched while the popup is open.
+    watched_tags: Set[str] = set()
+    # Whether the data shown is kept in the snapshot.
+    saved: bool = True
+
+    def on_panel(self, instance: "SettingPopup",
                  value: SettingsPanel) -> None:
         """
         On release create popup.
@@ -67,99 +107,512 @@ class SettingTree(SettingItem):
         """
         if value is None:
             return
+        self._trigger_refresh = Clock.create_trigger(self._refresh)
         self.fbind('on_release', self._create_popup)
 
-    @staticmethod
-    def _create_tree(instance: "SettingTree") -> TreeView:
+    def _create_content(self, data: Union[Table, Tree]) -> Widget:
         """
+        Build the popup content from provider data.
 
+        :param data:
         :return:
         """
-        tree: Tree = _get_data(instance)
-        tv = TreeView(hide_root=True)
-        tv.bind(minimum_height=tv.setter('height'))
+        raise NotImplementedError
 
-        populate_tree_view(tv, None, tree)
-        return tv
+    def _update_content(self, data: Union[Table, Tree]) -> bool:
+        """
+        Refresh the existing content in place. Return False when it
+        has to be rebuilt instead.
 
-    def _create_popup(self, instance: "SettingTree") -> None:
+        :param data:
+        :return:
+        """
+        return False
+
+    def _create_popup(self, instance: "SettingPopup") -> None:
         """
 
         :param instance:
         :return:
         """
-        root = ScrollView(pos=(0, 0))
-        root.add_widget(self._create_tree(instance))
+        if self.popup is None:
+            popup_width = min(0.95 * Window.width, dp(500))
+
+            self.popup = Popup(
+                title=self.title, content=Label(text=LOADING_TEXT),
+                size_hint=POPUP_SIZE_HINT,
+                width=popup_width
+            )
+            self.popup.bind(on_dismiss=self._on_dismiss)
+        elif self.content is None:
+            self.popup.content = Label(text=LOADING_TEXT)
+
+        if self.content is None:
+            self._show_snapshot()
+        if self.job is None:
+            self._submit()
+        self.popup.open()
+
+        cache.subscribe(self._on_invalidate)
+
+    def _show_snapshot(self) -> None:
+        """
+        Show the data saved by the previous run, if any.
 
-        popup_width = min(0.95 * Window.width, dp(500))
-        popup = Popup(
-            title=self.title, content=root,
-            size_hint=POPUP_SIZE_HINT,
-            width=popup_width
-        )
-        self.popup = popup
+        :return:
+        """
+        data = snapshot.get(self.value) if self.saved else None
+        if data is None:
+            return
 
-        popup.open()
+        with profiler.span('widget', self.value):
+            self.popup.content = self.content = self._create_content(data)
+        self.data = data
+        self.popup.title = self.title + STALE_TEXT
 
+    def _submit(self) -> None:
+        """
+        Resolve and run the provider in a worker thread, so a provider
+        module is never imported on the main thread.
 
-class SettingTable(SettingItem):
+        :return:
+        """
+        path = self.value
+
+        def call() -> Union[Table, Tree]:
+            return profiler.profiled('provider', path)(_get_provider(path))()
+
+        self.job = submit(call, self._on_data, self._on_error)
+
+    def _on_invalidate(self, tags: Tuple[str, ...]) -> None:
+        """
+        Called from the thread that invalidated the cache.
+
+        :param tags:
+        :return:
+        """
+        if self.watched_tags.intersection(tags):
+            self._trigger_refresh()
+
+    def _refresh(self, *args) -> None:
+        """
+        Call the provider again, or once more after the running call.
+
+        :param args:
+        :return:
+        """
+        if self.job is not None:
+            self.stale = True
+        else:
+            self._submit()
+
+    def _on_data(self, data: Union[Table, Tree]) -> None:
+        """
+        Show provider data. Cached providers return the very same
+        object while nothing changed, which costs nothing to show.
+
+        :param data:
+        :return:
+        """
+        self.job = None
+        self.popup.title = self.title
+        # Resolved by now, which makes this a dict lookup.
+        self.watched_tags = set(registry.get(self.value).cache_tags)
+        if self.stale:
+            self.stale = False
+            self._trigger_refresh()
+
+        if data is self.data and self.content is not None:
+            return
+
+        with profiler.span('widget', self.value):
+            if self.content is None or not self._update_content(data):
+                self.popup.content = self.content = \
+                    self._create_content(data)
+        self.data = data
+        # Streamed tables are saved once filled.
+        if self.saved and not is_stream(data):
+            snapshot.put(self.value, data)
+
+    def _on_error(self, error: BaseException) -> None:
+        """
+
+        :param error:
+        :return:
+        """
+        self.job = None
+        self.stale = False
+        self.content = self.data = None
+        self.popup.title = self.title
+
+        Logger.error(f'Settings: {self.value} failed: {error!r}')
+        self.popup.content = Label(text=str(error))
+
+    def _on_dismiss(self, popup: Popup) -> None:
+        """
+        Drop the provider result if the popup is dismissed first, and
+        stop refreshing.
+
+        :param popup:
+        :return:
+        """
+        cache.unsubscribe(self._on_invalidate)
+        self._trigger_refresh.cancel()
+        self.stale = False
+
+        if self.job is not None:
+            self.job.cancel()
+            self.job = None
+
+
+class SettingTree(SettingPopup):
     """
-    Implementation of a Table setting on top of a :class:`SettingItem`.
+    Implementation of a Tree setting on top of a :class:`SettingItem`.
     It is visualized with a :class:`~kivy.uix.switch.Switch` widget that, when
     clicked, will open a :class:`~kivy.uix.popup.Popup` with a
-    :class:`~kivy.uix.tableview.TableView`.
+    :class:`~kivy.uix.treeview.TreeView` so the user can expand
+    label nodes. A search box expands and highlights the nodes whose
+    label matches; the index behind it covers the loaded subtrees and
+    is built again once more of them are loaded.
     """
-    # Used to store the current popup when it is shown.
-    popup: Optional[Popup] = ObjectProperty(None, allownone=True)
+    tree_view: Optional[TreeView] = ObjectProperty(None, allownone=True)
+    scroll_view: Optional[ScrollView] = ObjectProperty(None, allownone=True)
+    search_input: Optional[TextInput] = ObjectProperty(None, allownone=True)
+    search_status: Optional[Label] = ObjectProperty(None, allownone=True)
+    # Index of the displayed tree, or the job building it.
+    search_index: Optional[TreeIndex] = None
+    index_job: Optional[Job] = None
+
+    def _create_content(self, tree: Tree) -> BoxLayout:
+        """
 
-    def on_panel(self, instance: "SettingTable", value: SettingsPanel):
+        :param tree:
+        :return:
         """
+        self.tree_view = tv = TreeView(hide_root=True)
+        tv.bind(minimum_height=tv.setter('height'))
+        self.highlighted: List[TreeViewLabel] = []
+        self._trigger_search = Clock.create_trigger(
+            self._search, SEARCH_DELAY)
 
-        :param instance:
-        :param value:
+        populate_tree_view(tv, None, tree, lazy=True)
+
+        self.search_input = TextInput(
+            hint_text='Search', multiline=False, write_tab=False)
+        self.search_input.bind(text=lambda *args: self._trigger_search())
+        self.search_status = Label(size_hint_x=.3)
+
+        search = BoxLayout(size_hint_y=None, height=dp(SEARCH_HEIGHT))
+        search.add_widget(self.search_input)
+        search.add_widget(self.search_status)
+
+        self.scroll_view = ScrollView(pos=(0, 0))
+        self.scroll_view.add_widget(tv)
+
+        root = BoxLayout(orientation='vertical')
+        root.add_widget(search)
+        root.add_widget(self.scroll_view)
+        return root
+
+    def _update_content(self, tree: Tree) -> bool:
+        """
+        Apply the new tree to the nodes in place; only the open nodes
+        are compared. A search in progress is run again on the new tree.
+
+        :param tree:
         :return:
         """
-        if value is None:
+        update_tree_view(self.tree_view, tree)
+        if self.search_input.text.strip():
+            self._trigger_search()
+        return True
+
+    def _search(self, *args) -> None:
+        """
+        Expand and highlight the nodes matching the search box, building
+        the index of the displayed tree first if needed.
+
+        :param args:
+        :return:
+        """
+        for tree_node in self.highlighted:
+            set_highlight(tree_node, False)
+        self.highlighted = []
+        self.search_status.text = ''
+
+        query = self.search_input.text
+        tree = self.data
+        if not query.strip() or tree is None:
             return
-        self.fbind('on_release', self._create_popup)
 
-    @staticmethod
-    def _create_table(instance: "SettingTable") -> TableView:
+        if self.search_index is None or self.search_index.tree is not tree \
+                or self.search_index.stale():
+            if self.index_job is None:
+                self.search_status.text = LOADING_TEXT
+                self.index_job = submit(
+                    lambda: TreeIndex(tree), self._on_index,
+                    self._on_index_error)
+            return
+
+        with profiler.span('widget', 'TreeView search'):
+            paths = self.search_index.search(query)
+            for path in paths[:MAX_MATCHES]:
+                tree_node = expand_path(self.tree_view, path)
+                set_highlight(tree_node, True)
+                self.highlighted.append(tree_node)
+
+        self.search_status.text = '%d found' % len(paths)
+        if self.highlighted:
+            first = self.highlighted[0]
+            self.tree_view.select_node(first)
+            # Scroll once the expanded nodes are laid out.
+            Clock.schedule_once(lambda dt: self.scroll_view.scroll_to(first))
+
+    def _on_index(self, index: TreeIndex) -> None:
         """
 
-        :param instance:
+        :param index:
         :return:
         """
-        cols, rows = _get_data(instance)
-        table = TableView(
+        self.index_job = None
+        self.search_index = index
+        self._search()
+
+    def _on_index_error(self, error: BaseException) -> None:
+        """
+
+        :param error:
+        :return:
+        """
+        self.index_job = None
+        Logger.error(f'Settings: indexing {self.value} failed: {error!r}')
+        self.search_status.text = str(error)
+
+    def _on_dismiss(self, popup: Popup) -> None:
+        """
+        Forget secrets: cached ones and the nodes showing them.
+
+        :param popup:
+        :return:
+        """
+        super()._on_dismiss(popup)
+
+        secrets.clear()
+        if self.tree_view is not None:
+            reset_volatile_nodes(self.tree_view)
+
+
+class SettingTable(SettingPopup):
+    """
+    Implementation of a Table setting on top of a :class:`SettingItem`.
+    It is visualized with a :class:`~kivy.uix.switch.Switch` widget that, when
+    clicked, will open a :class:`~kivy.uix.popup.Popup` with a
+    :class:`~widgets.tableview.RecycleTableView`, which only builds
+    the rows visible in the popup. Column headers sort and filter the
+    rows. Streamed rows are added over several frames as they are read.
+    """
+    # Streamed rows being added to the table, if any.
+    fill: Optional[TableFill] = None
+
+    table_view: Optional[RecycleTableView] = ObjectProperty(
+        None, allownone=True)
+
+    def _create_content(self, data: Union[Table, StreamTable]) -> BoxLayout:
+        """
+        Build the table below its sortable, filterable column headers.
+
+        :param data:
+        :return:
+        """
+        cols, rows = data
+        self.table_view = table = RecycleTableView(
             size=TABLE_SIZE,
-            pos_hint={'x': 0.1, 'center_y': .5}
+            pos_hint={'x': 0.1}
         )
         for col in cols:
             table.add_column(TableColumn(**col))
 
-        for row in rows:
-            table.add_row(row)
+        self._set_rows(table, data)
 
-        return table
+        root = BoxLayout(orientation='vertical')
+        root.add_widget(TableHeader(table))
+        root.add_widget(table)
+        return root
 
-    def _create_popup(self, instance: "SettingTable"):
+    def _update_content(self, data: Union[Table, StreamTable]) -> bool:
         """
+        Update the rows that changed, unless the columns changed. The
+        sort order and filters are kept.
 
-        :param instance:
+        :param data:
         :return:
         """
-        root = ScrollView(pos=(0, 0))
-        root.add_widget(self._create_table(instance))
+        cols, rows = data
+        if [col.key for col in self.table_view.columns] != \
+                [col['key'] for col in cols]:
+            return False
 
-        popup_width = min(0.95 * Window.width, dp(500))
+        self._set_rows(self.table_view, data)
+        return True
 
-        self.popup = popup = Popup(
-            title=self.title, content=root,
-            size_hint=POPUP_SIZE_HINT,
-            width=popup_width
-        )
-        popup.open()
+    def _set_rows(self, table: RecycleTableView,
+                  data: Union[Table, StreamTable]) -> None:
+        """
+
+        :param table:
+        :param data:
+        :return:
+        """
+        self._cancel_fill()
+        cols, rows = data
+
+        if is_stream(data):
+            self.fill = TableFill(
+                table, iterate(rows), self._on_fill_done, self._on_error)
+        else:
+            table.set_data(rows)
+
+    def _on_fill_done(self) -> None:
+        """
+        Save the filled table as the provider's last known data.
+
+        :return:
+        """
+        self.fill = None
+        if self.data is not None:
+            cols, rows = self.data
+            snapshot.put(self.value, (cols, self.table_view.index.rows))
+
+    def _cancel_fill(self) -> None:
+        """
+        Stop a fill in progress. The table then holds a partial
+        stream, so the next result must be shown even if it's the same.
+
+        :return:
+        """
+        if self.fill is not None:
+            self.fill.cancel()
+            self.fill = None
+            self.data = None
+
+    def _on_error(self, error: BaseException) -> None:
+        """
+
+        :param error:
+        :return:
+        """
+        self._cancel_fill()
+        super()._on_error(error)
+
+    def _on_dismiss(self, popup: Popup) -> None:
+        """
+
+        :param popup:
+        :return:
+        """
+        super()._on_dismiss(popup)
+        self._cancel_fill()
+
+
+class SettingRoutes(SettingPopup):
+    """
+    Implementation of a Routes setting on top of a :class:`SettingItem`.
+    The popup lists every route in a :class:`~widgets.virtuallist.VirtualList`
+    and looks up the route of the main table serving the destination
+    typed in the lookup box. The provider returns a :class:`~network.routes.RouteTable`;
+    lines are only formatted while in view. Routing tables can be large,
+    so they are not kept in the snapshot.
+    """
+    saved = False
+
+    route_list: Optional[VirtualList] = ObjectProperty(None, allownone=True)
+    lookup_input: Optional[TextInput] = ObjectProperty(None, allownone=True)
+    lookup_result: Optional[Label] = ObjectProperty(None, allownone=True)
+
+    def _create_content(self, table) -> BoxLayout:
+        """
+
+        :param table:
+        :return:
+        """
+        self.route_list = VirtualList(table.label, len(table))
+        self._trigger_lookup = Clock.create_trigger(
+            self._lookup, SEARCH_DELAY)
+
+        self.lookup_input = TextInput(
+            hint_text='Destination address', multiline=False,
+            write_tab=False)
+        self.lookup_input.bind(text=lambda *args: self._trigger_lookup())
+        self.lookup_result = Label(
+            halign='left', valign='middle', shorten=True)
+        self.lookup_result.bind(size=self.lookup_result.setter('text_size'))
+
+        lookup = BoxLayout(size_hint_y=None, height=dp(SEARCH_HEIGHT))
+        lookup.add_widget(self.lookup_input)
+        lookup.add_widget(self.lookup_result)
+
+        root = BoxLayout(orientation='vertical')
+        root.add_widget(lookup)
+        root.add_widget(self.route_list)
+        self._show_count(table)
+        return root
+
+    def _update_content(self, table) -> bool:
+        """
+        Show the new routes from the same position, and look the
+        destination up again.
+
+        :param table:
+        :return:
+        """
+        self.route_list.get_text = table.label
+        self.route_list.count = len(table)
+        self.route_list.refresh()
+        self._show_count(table)
+        self._trigger_lookup()
+        return True
+
+    def _show_count(self, table) -> None:
+        """
+
+        :param table:
+        :return:
+        """
+        if not self.lookup_input.text.strip():
+            self.route_list.selected = -1
+            self.lookup_result.text = '%d routes' % len(table)
+
+    def _lookup(self, *args) -> None:
+        """
+        Select the route serving the address in the lookup box.
+
+        :param args:
+        :return:
+        """
+        table = self.data
+        query = self.lookup_input.text.strip()
+        if table is None:
+            return
+        if not query:
+            self._show_count(table)
+            return
+
+        with profiler.span('widget', 'route lookup'):
+            try:
+                index = table.lookup(query)
+            except ValueError:
+                self.route_list.selected = -1
+                self.lookup_result.text = 'Not an address'
+                return
+
+        if index is None:
+            self.route_list.selected = -1
+            self.lookup_result.text = 'No route'
+            return
+
+        self.route_list.selected = index
+        self.route_list.scroll_to(index)
+        self.lookup_result.text = table.label(index)
 
 
 class CustomSettings(Settings):
@@ -176,10 +629,13 @@ class CustomSettings(Settings):
 
         self.register_type('tree', SettingTree)
         self.register_type('table', SettingTable)
+        self.register_type('routes', SettingRoutes)
 
     @staticmethod
-    def create_json_from_dict(d: dict, section: str, filename: str) -> None:
+    def create_json_from_dict(d: dict, section: str, filename: str) -> bool:
         """
+        Write the panel entries of the dict keys, unless the file already
+        holds them. Return True if the file was written.
 
         :param d:
         :param section:
@@ -187,12 +643,40 @@ class CustomSettings(Settings):
         :return:
         """
         path = os.path.join(BASE_DIR, 'json', filename)
-        data = [
+        data = json.dumps([
             {**TEMPLATE, 'section': section, 'title': perm, 'key': perm}
             for perm in d.keys()
-        ]
-        with open(path, 'w') as outfile:
-            json.dump(data, outfile)
+        ]).encode()
+
+        try:
+            with open(path, 'rb') as infile:
+                digest = hashlib.sha1(infile.read()).digest()
+        except OSError:
+            digest = None
+        if digest == hashlib.sha1(data).digest():
+            return False
+
+        with open(path, 'wb') as outfile:
+            outfile.write(data)
+        return True
+
+    @staticmethod
+    def json_keys(filename: str) -> List[str]:
+        """
+        Return the keys of the entries of a panel file, none if it
+        doesn't exist yet.
+
+        :param filename:
+        :return:
+        """
+        path = os.path.join(BASE_DIR, 'json', filename)
+
+        try:
+            with open(path) as infile:
+                return [entry['key'] for entry in json.load(infile)
+                        if 'key' in entry]
+        except (OSError, ValueError):
+            return []
 
     def on_close(self) -> None:
         """
@@ -0,0 +1,158 @@
+"""
+Run blocking provider calls off the Kivy main thread.
+"""
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Deque, Iterable, Optional
+
+from kivy.clock import Clock
+
+MAX_WORKERS = 4
+
+_executor = ThreadPoolExecutor(
+    max_workers=MAX_WORKERS, thread_name_prefix='kvnm-worker')
+
+
+class Job:
+    """
+    A function running in the worker pool. Its result, or the exception
+    it raised, is delivered on the main thread through
+    :meth:`~kivy.clock.Clock.schedule_once` unless the job was
+    cancelled first.
+    """
+    def __init__(self, func: Callable[[], Any],
+                 on_result: Callable[[Any], None],
+                 on_error: Optional[Callable[[BaseException], None]] = None):
+        """
+
+        :param func:
+        :param on_result:
+        :param on_error:
+        """
+        self.cancelled: bool = False
+        self.on_result = on_result
+        self.on_error = on_error
+
+        self.future: Future = _executor.submit(func)
+        self.future.add_done_callback(self._done)
+
+    def _done(self, future: Future) -> None:
+        """
+        Called from the worker thread once func has finished.
+
+        :param future:
+        :return:
+        """
+        if self.cancelled or future.cancelled():
+            return
+
+        error = future.exception()
+        if error is None:
+            Clock.schedule_once(
+                lambda dt: self._deliver(self.on_result, future.result()))
+        elif self.on_error is not None:
+            Clock.schedule_once(
+                lambda dt: self._deliver(self.on_error, error))
+
+    def _deliver(self, callback: Callable, value: Any) -> None:
+        """
+
+        :param callback:
+        :param value:
+        :return:
+        """
+        if not self.cancelled:
+            callback(value)
+
+    def cancel(self) -> None:
+        """
+        Drop the result. A call that already started keeps running in
+        its thread but its callbacks are never invoked.
+
+        :return:
+        """
+        self.cancelled = True
+        self.future.cancel()
+
+
+def submit(func: Callable[[], Any], on_result: Callable[[Any], None],
+           on_error: Optional[Callable[[BaseException], None]] = None) -> Job:
+    """
+
+    :param func:
+    :param on_result:
+    :param on_error:
+    :return:
+    """
+    return Job(func, on_result, on_error)
+
+
+class Feed:
+    """
+    Items of an iterator read in the worker pool and handed over to the
+    main thread, which polls :meth:`take` (e.g. once per frame) instead
+    of being called back for every item.
+    """
+    def __init__(self, iterable: Iterable[Any]):
+        """
+
+        :param iterable:
+        """
+        self.items: Deque[Any] = deque()
+        self.cancelled: bool = False
+        self.done: bool = False
+        self.error: Optional[BaseException] = None
+
+        self.future: Future = _executor.submit(self._run, iterable)
+
+    def _run(self, iterable: Iterable[Any]) -> None:
+        """
+
+        :param iterable:
+        :return:
+        """
+        try:
+            for item in iterable:
+                if self.cancelled:
+                    break
+                self.items.append(item)
+        except BaseException as e:
+            self.error = e
+        finally:
+            self.done = True
+
+    def take(self) -> Any:
+        """
+        Return the next item. Raise IndexError if none is ready yet.
+
+        :return:
+        """
+        return self.items.popleft()
+
+    def exhausted(self) -> bool:
+        """
+        Return True once every item has been produced and taken.
+
+        :return:
+        """
+        # done is set after the last append, so read it first.
+        done = self.done
+        return done and not self.items
+
+    def cancel(self) -> None:
+        """
+        Stop reading at the next item.
+
+        :return:
+        """
+        self.cancelled = True
+        self.future.cancel()
+
+
+def iterate(iterable: Iterable[Any]) -> Feed:
+    """
+
+    :param iterable:
+    :return:
+    """
+    return Feed(iterable)
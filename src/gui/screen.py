@@ -6,7 +6,18 @@ from kivy.app import App
 
 from main import BASE_DIR
 
-Builder.load_file(os.path.join(BASE_DIR, 'layout', 'settings.kv'))
+LAYOUT_PATH = os.path.join(BASE_DIR, 'layout', 'settings.kv')
+
+
+def load_layout() -> None:
+    """
+    Load the rules of the settings widgets, once. Called when the
+    application builds rather than on import.
+
+    :return:
+    """
+    if LAYOUT_PATH not in Builder.files:
+        Builder.load_file(LAYOUT_PATH)
 
 
 class SettingsScreen(Screen):
@@ -0,0 +1,200 @@
+"""
+Headless entry point. Run from the ``src`` directory::
+
+    python -m kvnm dump --format json
+    python -m kvnm dump --format csv --section device
+    python -m kvnm --record calls.jsonl dump
+    python -m kvnm --replay calls.jsonl --timing dump --section ssid
+
+Providers are resolved from the same dotted paths as the settings panels
+and Kivy is never imported, so it runs without a display.
+"""
+import argparse
+import csv
+import json
+import sys
+from typing import Any, Callable, Dict, Iterator, List, Optional, TextIO, Tuple
+
+from config.defaults import (
+    DEFAULT_SSID, DEFAULT_CONNECTION, DEFAULT_DEVICE, DEFAULT_ROUTES,
+    PROVIDER_KEYS
+)
+from network.info import get_general_info, get_permissions
+from network.registry import registry
+from network import recording
+from widgets.data import Table, Tree, node_children, is_tree
+import plugins
+
+PROVIDERS: Dict[str, Dict[str, str]] = {
+    'ssid': DEFAULT_SSID,
+    'connection': DEFAULT_CONNECTION,
+    'device': {key: DEFAULT_DEVICE[key] for key in PROVIDER_KEYS['device']},
+    'routes': DEFAULT_ROUTES,
+    **{plugin.section: plugin.providers for plugin in plugins.discover()},
+}
+SECTIONS = ('info', 'permissions') + tuple(PROVIDERS)
+FORMATS = ('json', 'csv')
+TREE_SEP = ' / '
+
+
+def iter_providers(sections: List[str]) -> Iterator[Tuple[str, Callable]]:
+    """
+
+    :param sections:
+    :return:
+    """
+    for section in sections:
+        if section == 'info':
+            yield section, get_general_info
+        elif section == 'permissions':
+            yield section, get_permissions
+        else:
+            for key, path in PROVIDERS[section].items():
+                yield '{}.{}'.format(section, key), registry.get(path).func
+
+
+def table_records(table: Table) -> Tuple[List[str], List[Dict[str, str]]]:
+    """
+    Return column keys and data rows. A header row in front, as
+    tables used to carry before the views rendered their own, is
+    skipped.
+
+    :param table:
+    :return:
+    """
+    cols, rows = table
+    keys = [col['key'] for col in cols]
+    header = {col['key']: col['title'] for col in cols}
+
+    return keys, [row for row in rows if row != header]
+
+
+def tree_to_dict(node: Tree) -> Dict[str, Any]:
+    """
+    Fully materialize a tree, including lazily generated subtrees.
+    Volatile subtrees (secrets) are left out.
+
+    :param node:
+    :return:
+    """
+    children = [] if node.get('volatile') else node_children(node)
+    return {
+        'node_id': node['node_id'],
+        'children': [tree_to_dict(child) for child in children]
+    }
+
+
+def iter_tree_paths(node: Tree, prefix: Tuple[str, ...] = ()) \
+        -> Iterator[Tuple[str, ...]]:
+    """
+
+    :param node:
+    :param prefix:
+    :return:
+    """
+    path = prefix + (node['node_id'],)
+    yield path
+
+    if node.get('volatile'):
+        return
+    for child in node_children(node):
+        yield from iter_tree_paths(child, path)
+
+
+def to_json(data: Any) -> Any:
+    """
+
+    :param data:
+    :return:
+    """
+    if hasattr(data, 'as_table'):
+        data = data.as_table()
+    if isinstance(data, tuple):
+        keys, records = table_records(data)
+        return {'columns': keys, 'rows': records}
+    if is_tree(data):
+        return tree_to_dict(data)
+    return data
+
+
+def to_csv(name: str, data: Any) -> Iterator[List[Any]]:
+    """
+    Rows of a section. Every row starts with the section name.
+
+    :param name:
+    :param data:
+    :return:
+    """
+    if hasattr(data, 'as_table'):
+        data = data.as_table()
+    if isinstance(data, tuple):
+        keys, records = table_records(data)
+        yield [name] + keys
+        for record in records:
+            yield [name] + [record.get(key, '') for key in keys]
+    elif is_tree(data):
+        for path in iter_tree_paths(data):
+            yield [name, TREE_SEP.join(path)]
+    else:
+        for key, value in data.items():
+            yield [name, key, value]
+
+
+def dump(sections: List[str], fmt: str, out: TextIO) -> None:
+    """
+    Write every section as soon as its provider returns.
+
+    :param sections:
+    :param fmt:
+    :param out:
+    :return:
+    """
+    if fmt == 'csv':
+        writer = csv.writer(out)
+        for name, provider in iter_providers(sections):
+            writer.writerows(to_csv(name, provider()))
+            out.flush()
+        return
+
+    out.write('{')
+    for i, (name, provider) in enumerate(iter_providers(sections)):
+        out.write('{}\n  {}: {}'.format(
+            ',' if i else '', json.dumps(name),
+            json.dumps(to_json(provider()))))
+        out.flush()
+    out.write('\n}\n')
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+
+    :param argv:
+    :return:
+    """
+    parser = argparse.ArgumentParser(prog='kvnm')
+    parser.add_argument(
+        '--record', metavar='FILE',
+        help='write the NetworkManager calls made to a file')
+    parser.add_argument(
+        '--replay', metavar='FILE',
+        help='answer NetworkManager calls from a recorded file')
+    parser.add_argument(
+        '--timing', action='store_true',
+        help='replay with the recorded latencies')
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    dump_parser = commands.add_parser(
+        'dump', help='print NetworkManager state')
+    dump_parser.add_argument('--format', choices=FORMATS, default='json')
+    dump_parser.add_argument(
+        '--section', choices=SECTIONS, action='append',
+        help='section to dump, may be repeated (default: all)')
+
+    args = parser.parse_args(argv)
+    recording.install(args.record, args.replay, args.timing)
+    try:
+        dump(args.section or list(SECTIONS), args.format, sys.stdout)
+    finally:
+        recording.close()
+    return 0
@@ -1,3 +1,6 @@
+# Taken before importing Kivy, to time the startup.
+import startup
+
 from os import path
 
 import kivy
@@ -0,0 +1,384 @@
+"""
+In-process snapshot of NetworkManager state.
+
+Entries are tagged with the object paths and object kinds they were built
+from. NetworkManager signals invalidate only the entries carrying an
+affected tag; a TTL covers the case where signals are not delivered, and
+the least recently used entries are evicted once the cache is full.
+"""
+import functools
+import threading
+import time
+from collections import OrderedDict
+from typing import (
+    Any, Callable, Dict, Hashable, Iterable, Iterator, List, Optional, Set,
+    Tuple
+)
+
+from widgets.data import Columns, is_stream
+
+DEFAULT_TTL = 30.0
+DEFAULT_MAXSIZE = 1024
+
+# Object kind tags used by providers.
+MANAGER, DEVICE, ACCESS_POINT = 'manager', 'device', 'access_point'
+ACTIVE_CONNECTION, CONNECTION = 'active_connection', 'connection'
+IP4_CONFIG, IP6_CONFIG = 'ip4_config', 'ip6_config'
+PERMISSIONS = 'permissions'
+# Invalidated by the samplers after every sample: SSID strength history
+# and device traffic rates, sampled at different rates.
+HISTORY, TRAFFIC = 'history', 'traffic'
+
+# Interfaces whose properties are never cached. Their change signals,
+# emitted every few seconds, must not invalidate anything.
+UNCACHED_INTERFACES = ('org.freedesktop.NetworkManager.Device.Statistics',)
+
+# Interface suffix (after org.freedesktop.NetworkManager) -> kind.
+KINDS: Dict[str, str] = {
+    '': MANAGER,
+    '.Device': DEVICE,
+    '.AccessPoint': ACCESS_POINT,
+    '.Connection.Active': ACTIVE_CONNECTION,
+    '.Settings': CONNECTION,
+    '.Settings.Connection': CONNECTION,
+    '.IP4Config': IP4_CONFIG,
+    '.IP6Config': IP6_CONFIG,
+}
+
+
+# listener(tags), called after the entries with one of tags were dropped.
+Listener = Callable[[Tuple[str, ...]], None]
+
+
+def kind_of(interface: str) -> str:
+    """
+    Return the kind tag of a NetworkManager interface. Device subtype
+    interfaces (e.g. ``Device.Wireless``) map to the device kind.
+
+    :param interface:
+    :return:
+    """
+    suffix = interface[len('org.freedesktop.NetworkManager'):]
+
+    if suffix.startswith('.Device'):
+        suffix = '.Device'
+    return KINDS.get(suffix, suffix)
+
+
+class SnapshotCache:
+    """
+    Thread safe, size bounded mapping of keys to loaded values with tag
+    based invalidation.
+    """
+    def __init__(self, maxsize: int = DEFAULT_MAXSIZE,
+                 ttl: float = DEFAULT_TTL):
+        """
+
+        :param maxsize:
+        :param ttl:
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = self.misses = 0
+        self.evictions = self.invalidations = 0
+
+        self._entries: OrderedDict = OrderedDict()
+        self._tags: Dict[str, Set[Hashable]] = {}
+        # Bumped by key invalidations and clear(), and per tag by tag
+        # invalidations.
+        self._generation = 0
+        self._tag_generations: Dict[str, int] = {}
+        self._listeners: List[Listener] = []
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def lookup(self, key: Hashable) -> Tuple[bool, Any]:
+        """
+        Return ``(True, value)`` for a live entry, ``(False, None)``
+        otherwise.
+
+        :param key:
+        :return:
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is not None and entry[1] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, entry[0]
+
+            self.misses += 1
+            return False, None
+
+    def generation(self, tags: Iterable[str] = ()) -> int:
+        """
+        Return a number that changes on every invalidation that could
+        affect an entry with the given tags. Read it before loading a
+        value and pass it to :meth:`put`.
+
+        :param tags:
+        :return:
+        """
+        with self._lock:
+            return self._generation + sum(
+                self._tag_generations.get(tag, 0) for tag in tags)
+
+    def put(self, key: Hashable, value: Any, tags: Iterable[str] = (),
+            ttl: float = None, generation: Optional[int] = None) -> None:
+        """
+        Store a value, unless an invalidation of its tags happened since
+        the given generation was read.
+
+        :param key:
+        :param value:
+        :param tags:
+        :param ttl:
+        :param generation:
+        :return:
+        """
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+
+        tags = tuple(tags)
+
+        with self._lock:
+            if generation is None or generation == self.generation(tags):
+                self._store(key, value, expires, tags)
+
+    def get(self, key: Hashable, loader: Callable[[], Any],
+            tags: Iterable[str] = (), ttl: float = None) -> Any:
+        """
+        Return the cached value for key, calling loader on a miss.
+        A value is not stored if one of its tags was invalidated while
+        it was being loaded.
+
+        :param key:
+        :param loader:
+        :param tags:
+        :param ttl:
+        :return:
+        """
+        found, value = self.lookup(key)
+        if found:
+            return value
+
+        generation = self.generation(tags)
+        value = loader()
+        self.put(key, value, tags, ttl, generation)
+        return value
+
+    def _store(self, key: Hashable, value: Any, expires: float,
+               tags: Tuple[str, ...]) -> None:
+        """
+
+        :param key:
+        :param value:
+        :param expires:
+        :param tags:
+        :return:
+        """
+        self._discard(key)
+        self._entries[key] = (value, expires, tags)
+
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(key)
+
+        while len(self._entries) > self.maxsize:
+            self._discard(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _discard(self, key: Hashable) -> None:
+        """
+
+        :param key:
+        :return:
+        """
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+
+        for tag in entry[2]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def invalidate(self, key: Hashable) -> None:
+        """
+
+        :param key:
+        :return:
+        """
+        with self._lock:
+            self._generation += 1
+            if key in self._entries:
+                self._discard(key)
+                self.invalidations += 1
+
+    def invalidate_tags(self, *tags: str) -> None:
+        """
+        Drop every entry carrying one of the tags and notify the
+        listeners, in the calling thread.
+
+        :param tags:
+        :return:
+        """
+        with self._lock:
+            for tag in tags:
+                self._tag_generations[tag] = \
+                    self._tag_generations.get(tag, 0) + 1
+                for key in list(self._tags.get(tag, ())):
+                    self._discard(key)
+                    self.invalidations += 1
+            listeners = list(self._listeners)
+
+        for listener in listeners:
+            listener(tags)
+
+    def subscribe(self, listener: Listener) -> None:
+        """
+        Register a listener. Registering it again is a no-op.
+
+        :param listener:
+        :return:
+        """
+        with self._lock:
+            if listener not in self._listeners:
+                self._listeners.append(listener)
+
+    def unsubscribe(self, listener: Listener) -> None:
+        """
+
+        :param listener:
+        :return:
+        """
+        with self._lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def clear(self) -> None:
+        """
+
+        :return:
+        """
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._tags.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Return hit, miss, eviction and invalidation counters.
+
+        :return:
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'size': len(self._entries),
+            }
+
+
+cache = SnapshotCache()
+
+
+def _record(key: Hashable, cols: Columns, rows: Iterator[Dict[str, str]],
+            tags: Tuple[str, ...], ttl: Optional[float], generation: int) \
+        -> Iterator[Dict[str, str]]:
+    """
+    Pass streamed rows through and store the complete table once the
+    stream is exhausted. An abandoned stream is never stored.
+
+    :param key:
+    :param cols:
+    :param rows:
+    :param tags:
+    :param ttl:
+    :param generation:
+    :return:
+    """
+    recorded = []
+    for row in rows:
+        recorded.append(row)
+        yield row
+
+    cache.put(key, (cols, recorded), tags, ttl, generation)
+
+
+def cached(*tags: str, ttl: Optional[float] = None) -> Callable:
+    """
+    Serve a provider from the snapshot cache. The entry is dropped
+    whenever an object of one of the given kinds changes. Streamed
+    tables are stored once fully read and served as plain tables.
+
+    :param tags:
+    :param ttl:
+    :return:
+    """
+    def decorator(func: Callable) -> Callable:
+        name = '{}.{}'.format(func.__module__, func.__name__)
+
+        @functools.wraps(func)
+        def wrapper(*args):
+            key = (name,) + args
+            found, value = cache.lookup(key)
+            if found:
+                return value
+
+            generation = cache.generation(tags)
+            value = func(*args)
+
+            if is_stream(value):
+                cols, rows = value
+                return cols, _record(
+                    key, cols, rows, tags, ttl, generation)
+
+            cache.put(key, value, tags, ttl, generation)
+            return value
+
+        wrapper.cache_tags = tags
+        return wrapper
+    return decorator
+
+
+def on_signal(signal: str, interface: str, path: str, args: tuple) -> None:
+    """
+    Invalidate the entries affected by a NetworkManager signal.
+
+    :param signal:
+    :param interface:
+    :param path:
+    :param args:
+    :return:
+    """
+    if signal == 'PropertiesChanged':
+        if interface in UNCACHED_INTERFACES:
+            return
+        cache.invalidate_tags(path, kind_of(interface))
+    elif signal in ('DeviceAdded', 'DeviceRemoved'):
+        cache.invalidate_tags(path, str(args[0]), MANAGER, DEVICE)
+    elif signal in ('AccessPointAdded', 'AccessPointRemoved'):
+        cache.invalidate_tags(path, str(args[0]), ACCESS_POINT)
+    elif signal in ('NewConnection', 'ConnectionRemoved'):
+        cache.invalidate_tags(path, str(args[0]), CONNECTION)
+    elif signal in ('Updated', 'Removed'):
+        cache.invalidate_tags(path, CONNECTION)
+    elif signal == 'CheckPermissions':
+        cache.invalidate_tags(PERMISSIONS)
+
+
+def install() -> None:
+    """
+    Keep the cache in sync with NetworkManager signals.
+
+    :return:
+    """
+    from network import signals
+
+    signals.connect(on_signal)
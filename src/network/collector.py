@@ -0,0 +1,80 @@
+"""
+Concurrent collection of per-object NetworkManager data.
+
+Each D-Bus round trip mostly waits on the daemon, so per-connection and
+per-device requests are fanned out over a small, bounded thread pool.
+Results come back in input order, which keeps the tables and trees built
+from them identical to a sequential collection.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, List, Optional, TypeVar
+
+MAX_WORKERS = 8
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+_local = threading.local()
+_executor: Optional[ThreadPoolExecutor] = None
+_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """
+
+    :return:
+    """
+    global _executor
+
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=MAX_WORKERS, thread_name_prefix='kvnm-collector')
+    return _executor
+
+
+def _in_worker(func: Callable[[T], R]) -> Callable[[T], R]:
+    """
+    Mark the calling thread as a pool worker while func runs.
+
+    :param func:
+    :return:
+    """
+    def call(item: T) -> R:
+        _local.worker = True
+        return func(item)
+    return call
+
+
+def fan_out(func: Callable[[T], R], items: Iterable[T]) -> List[R]:
+    """
+    Return ``[func(item) for item in items]``, computed concurrently.
+    Calls made from inside a pool worker run inline, so nested fan outs
+    can't exhaust the pool and deadlock.
+
+    :param func:
+    :param items:
+    :return:
+    """
+    items = list(items)
+
+    if len(items) < 2 or getattr(_local, 'worker', False):
+        return [func(item) for item in items]
+    return list(_get_executor().map(_in_worker(func), items))
+
+
+def stream(func: Callable[[T], R], items: Iterable[T]) -> Iterator[R]:
+    """
+    Like :func:`fan_out`, but yield each result as soon as it and the
+    ones before it are ready.
+
+    :param func:
+    :param items:
+    :return:
+    """
+    items = list(items)
+
+    if len(items) < 2 or getattr(_local, 'worker', False):
+        return map(func, items)
+    return _get_executor().map(_in_worker(func), items)
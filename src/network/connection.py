@@ -1,127 +1,235 @@
-import NetworkManager
+from functools import partial
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
-from widgets.tableview import Table, Columns, Rows, h
-from widgets.treeview import Tree
+import NetworkManager
+from dbus.exceptions import DBusException
+
+from widgets.data import (
+    Table, StreamTable, Columns, Rows, Tree, CompactTree, h
+)
+from network import secrets as secret_store
+from network.registry import provider, COST_HIGH
+from network.cache import (
+    cached, MANAGER, DEVICE, ACTIVE_CONNECTION, CONNECTION, IP4_CONFIG
+)
+from network.collector import fan_out, stream
+from network.properties import (
+    ActiveConnection, Device, Ip4Config, get_devices, get_ip4_config, get_settings_info,
+    get_connection_settings, get_connection_secrets,
+    get_active_connections as get_active_connections_records
+)
 
 __c = NetworkManager.const
-__NM = NetworkManager.NetworkManager
 
 NAME, TYPE, DEFAULT, DEVICES = 'name', 'type', 'default', 'devices'
+SECRETS_TIMEOUT = 5.0
 
 
-def add_active_connection(tree: Tree, settings: dict,
-                          devices: str) -> Tree:
+def add_settings(tree: CompactTree, parent: int, settings: dict) -> None:
     """
-    Add an active connection to tree.
+    Add one node per setting with a child per property.
 
     :param tree:
+    :param parent:
     :param settings:
-    :param devices:
     :return:
     """
-    node: Tree = dict(
-        node_id="%s%s" % (settings['connection']['id'], devices),
-        children=[]
-    )
-    tree['children'].append(node)
-
     for key, val in sorted(settings.items()):
-        node2: Tree = dict(node_id="%s" % key.title(), children=[])
-        node['children'].append(node2)
+        node2 = tree.add(parent, key.title())
 
         for name, value in val.items():
-            node3: Tree = dict(
-                node_id="{}: {}".format(str(name), str(value)),
-                children=[]
-            )
-            node2['children'].append(node3)
+            tree.add(node2, '%s: %s', (name, value))
+
+
+def setting_nodes(settings: dict) -> List[Tree]:
+    """
+    Return one node per setting with a child per property.
+
+    :param settings:
+    :return:
+    """
+    tree = CompactTree('')
+    add_settings(tree, 0, settings)
+    return tree.children(0)
+
+
+def add_active_connection(tree: CompactTree, settings: dict,
+                          devices: str) -> int:
+    """
+    Add an active connection to tree.
+
+    :param tree:
+    :param settings:
+    :param devices:
+    :return:
+    """
+    node = tree.add(0, '%s%s', (settings['connection']['id'], devices))
+    add_settings(tree, node, settings)
     return node
 
-# TODO: Refactor function
-def add_devices(conn: NetworkManager.ActiveConnection,
-                parent: Tree):
+
+def get_secrets(path: str, settings: Iterable[str]) -> dict:
+    """
+    Return the secrets of a connection from the short lived store,
+    asking NetworkManager on a miss.
+
+    :param path:
+    :param settings:
+    :return:
+    """
+    secrets = secret_store.get(path)
+
+    if secrets is None:
+        secrets = get_connection_secrets(path, settings, SECRETS_TIMEOUT)
+        secret_store.put(path, secrets)
+    return secrets
+
+
+def secret_children(path: str, settings: Tuple[str, ...]) -> List[Tree]:
     """
-    Add device nodes to parent tree.
+    Return the secret nodes of a connection.
 
-    :param conn:
+    :param path:
+    :param settings:
+    :return:
+    """
+    try:
+        secrets = get_secrets(path, settings)
+    except DBusException as e:
+        return [dict(node_id="Unavailable: %s" % e.get_dbus_message(),
+                     children=[])]
+    return setting_nodes(secrets)
+
+
+def add_device_children(tree: CompactTree, parent: int,
+                        dev: Device) -> None:
+    """
+    Add the child nodes of a device: type, MAC address and IPv4
+    configuration. Address and route labels are formatted from the
+    cached records when they are shown.
+
+    :param tree:
     :param parent:
+    :param dev:
     :return:
     """
-    node2: Tree = dict(node_id="devices", children=[])
-    parent['children'].append(node2)
+    tree.add(parent, '%s', (__c('device_type', dev.device_type),))
 
-    for dev in conn.Devices:
-        node3: Tree = dict(node_id="Device: %s" % dev.Interface, children=[])
-        node2['children'].append(node3)
+    if dev.hw_address:
+        tree.add(parent, 'MAC address %s', (dev.hw_address,))
 
-        node4: Tree = dict(
-            node_id="%s" % __c('device_type', dev.DeviceType),
-            children=[])
-        node3['children'].append(node4)
+    ip4: Optional[Ip4Config] = get_ip4_config(dev.ip4_config)
+    node4 = tree.add(parent, 'IPv4 config')
 
-        if hasattr(dev, 'HwAddress'):
-            node4: Tree = dict(
-                node_id="MAC address %s" % dev.HwAddress, children=[]
-            )
-            node3['children'].append(node4)
+    node5 = tree.add(node4, 'Addresses')
+    for addr in (ip4.addresses if ip4 else ()):
+        tree.add(node5, '%s/%d -> %s', addr)
 
-        node4: Tree = dict(node_id="IPv4 config", children=[])
-        node3['children'].append(node4)
-        node5: Tree = dict(node_id="Addresses", children=[])
-        node4['children'].append(node5)
+    node5 = tree.add(node4, 'Routes')
+    for route in (ip4.routes if ip4 else ()):
+        tree.add(node5, '%s/%d -> %s (%d)', route)
 
-        for addr in dev.Ip4Config.Addresses:
-            node6: Tree = dict(node_id="%s/%d -> %s" % tuple(addr), children=[])
-            node5['children'].append(node6)
+    node5 = tree.add(node4, 'Nameservers')
+    for ns in (ip4.nameservers if ip4 else ()):
+        tree.add(node5, '%s', (ns,))
 
-        node5: Tree = dict(node_id="Routes", children=[])
-        node4['children'].append(node5)
 
-        for route in dev.Ip4Config.Routes:
-            node6: Tree = dict(
-                node_id="%s/%d -> %s (%d)" % tuple(route),
-                children=[]
-            )
-            node5['children'].append(node6)
+def device_children(dev: Device) -> List[Tree]:
+    """
+    Return the child nodes of a device.
 
-        node5: Tree = dict(node_id="Nameservers", children=[])
-        node4['children'].append(node5)
+    :param dev:
+    :return:
+    """
+    tree = CompactTree('')
+    add_device_children(tree, 0, dev)
+    return tree.children(0)
 
-        for ns in dev.Ip4Config.Nameservers:
-            node6: Tree = dict(node_id="%s" % ns, children=[])
-            node5['children'].append(node6)
 
+def add_devices(devices: List[Device], tree: CompactTree, parent: int,
+                lazy: bool = False) -> None:
+    """
+    Add device nodes to parent tree. In lazy mode, the children of each
+    device (and the IPv4 configuration they need) are only generated
+    when the node is expanded, in a worker thread.
 
-def get_connection_details() -> Tree:
+    :param devices:
+    :param tree:
+    :param parent:
+    :param lazy:
+    :return:
     """
-    Return a tree with detailed information about currently
-    active connections.
+    node2 = tree.add(parent, 'devices')
 
+    for dev in devices:
+        if lazy:
+            tree.add(node2, 'Device: %s', (dev.interface,),
+                     children=partial(device_children, dev),
+                     background=True)
+        else:
+            node3 = tree.add(node2, 'Device: %s', (dev.interface,))
+            add_device_children(tree, node3, dev)
+
+
+def collect_devices(conns: List[ActiveConnection]) -> Dict[str, Device]:
+    """
+    Fetch the devices of several connections at once, each device once.
+
+    :param conns:
     :return:
     """
-    tree: Tree = dict(node_id="Active connections", children=[])
+    paths = list(dict.fromkeys(p for conn in conns for p in conn.devices))
+    return dict(zip(paths, get_devices(paths)))
+
+
+@provider(cost=COST_HIGH)
+@cached(MANAGER, ACTIVE_CONNECTION, CONNECTION, DEVICE, IP4_CONFIG)
+def get_connection_details(lazy: bool = True) -> Tree:
+    """
+    Return a tree with detailed information about currently
+    active connections. Device subtrees are generated on demand
+    unless lazy is False; secrets are always fetched on demand.
 
-    for conn in __NM.ActiveConnections:
-        settings: dict = conn.Connection.GetSettings()
+    :param lazy:
+    :return:
+    """
+    tree = CompactTree('Active connections')
+    conns: List[ActiveConnection] = get_active_connections_records()
+    all_settings: List[dict] = fan_out(
+        get_connection_settings, [conn.connection for conn in conns])
+    devices_by_path: Dict[str, Device] = collect_devices(conns)
+
+    if not lazy:
+        # Warm the cache, add_device_children reads them one by one.
+        fan_out(get_ip4_config, {
+            dev.ip4_config for dev in devices_by_path.values()})
+
+    for conn, conn_settings in zip(conns, all_settings):
+        # Sections are copied, the cached settings must not be modified.
+        settings: dict = {
+            key: dict(val) for key, val in conn_settings.items()
+        }
+        names: Tuple[str, ...] = tuple(settings)
 
         for s in list(settings.keys()):
             if 'data' in settings[s]:
                 settings[s + '-data'] = settings[s].pop('data')
 
-        secrets: dict = conn.Connection.GetSecrets()
-        for key in secrets:
-            settings[key].update(secrets[key])
+        devices: List[Device] = [devices_by_path[p] for p in conn.devices]
+        on = ""
+        if devices:
+            on: str = " (on %s)" % ", ".join([x.interface for x in devices])
 
-        devices = ""
-        if conn.Devices:
-            devices: str = " (on %s)" % ", ".join([x.Interface for x in conn.Devices])
+        node = add_active_connection(tree, settings, on)
+        tree.add(node, 'Secrets',
+                 children=partial(secret_children, conn.connection, names),
+                 volatile=True, background=True)
+        add_devices(devices, tree, node, lazy)
 
-        node: Tree = add_active_connection(tree, settings, devices)
-        add_devices(conn, node)
-
-    return tree
+    return tree.root
 
 
+@cached(MANAGER, ACTIVE_CONNECTION, DEVICE)
 def get_active_connections() -> Table:
     """
     Return a table with active connections.
@@ -132,22 +240,27 @@ def get_active_connections() -> Table:
         {'title': h(field), 'key': field, 'hint_text': ''}
         for field in (NAME, TYPE, DEFAULT, DEVICES)
     ]
-    rows: Rows = [{col['key']: col['title'] for col in cols}]
+    rows: Rows = []
+
+    conns: List[ActiveConnection] = get_active_connections_records()
+    devices_by_path: Dict[str, Device] = collect_devices(conns)
 
-    for conn in __NM.ActiveConnections:
-        settings: dict = conn.Connection.GetSettings()['connection']
+    for conn in conns:
         rows.append({
-            NAME: str(settings['id']),
-            TYPE: str(settings['type']),
-            DEFAULT: str(conn.Default),
-            DEVICES: ", ".join([x.Interface for x in conn.Devices])
+            NAME: str(conn.id),
+            TYPE: str(conn.type),
+            DEFAULT: str(conn.default),
+            DEVICES: ", ".join(
+                [devices_by_path[p].interface for p in conn.devices])
         })
     return cols, rows
 
 
-def get_available_connections() -> Table:
+@cached(CONNECTION)
+def get_available_connections() -> StreamTable:
     """
-    Return a table with available connections.
+    Return a table with available connections, streamed as their
+    settings are read.
 
     :return:
     """
@@ -155,13 +268,15 @@ def get_available_connections() -> Table:
         {'title': h(NAME), 'key': NAME, 'hint_text': ''},
         {'title': h(TYPE), 'key': TYPE, 'hint_text': ''},
     ]
-    rows: Rows = [{col['key']: col['title'] for col in cols}]
 
-    for conn in NetworkManager.Settings.ListConnections():
-        settings: dict = conn.GetSettings()['connection']
+    def rows() -> Iterator[Dict[str, str]]:
+        for conn_settings in stream(get_connection_settings,
+                                    get_settings_info().connections):
+            settings: dict = conn_settings['connection']
 
-        rows.append({
-            NAME: str(settings['id']),
-            TYPE: str(settings['type']),
-        })
-    return cols, rows
+            yield {
+                NAME: str(settings['id']),
+                TYPE: str(settings['type']),
+            }
+
+    return cols, rows()
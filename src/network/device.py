@@ -1,30 +1,67 @@
+from typing import Dict, Iterator
+
 import NetworkManager
 
-from widgets.tableview import Table, Columns, Rows, h
+from widgets.data import StreamTable, Columns, h
+from network.properties import get_device, get_manager
+from network.collector import stream
+from network.cache import cached, MANAGER, DEVICE, TRAFFIC
+from network import traffic
+from network.traffic import format_bytes
 
 __c = NetworkManager.const
-__NM = NetworkManager.NetworkManager
 
 NAME, STATE, DRIVER, MANAGED = 'name', 'state', 'driver', 'managed'
+RX_RATE, TX_RATE = 'rx rate', 'tx rate'
+RX_BYTES, TX_BYTES = 'rx total', 'tx total'
 
 
-def get_available_devices() -> Table:
+def traffic_cells(interface: str) -> Dict[str, str]:
     """
-    Return all available devices.
 
+    :param interface:
     :return:
     """
+    rates = traffic.traffic.get(interface)
+    if rates is None:
+        return dict.fromkeys((RX_RATE, TX_RATE, RX_BYTES, TX_BYTES), '')
+
+    return {
+        RX_RATE: format_bytes(rates.rx, '/s'),
+        TX_RATE: format_bytes(rates.tx, '/s'),
+        RX_BYTES: format_bytes(rates.rx_bytes),
+        TX_BYTES: format_bytes(rates.tx_bytes),
+    }
+
+
+@cached(MANAGER, DEVICE, TRAFFIC)
+def get_available_devices() -> StreamTable:
+    """
+    Return all available devices, streamed as they are read. While
+    traffic statistics are sampled, throughput columns are added.
+
+    :return:
+    """
+    fields = (NAME, STATE, DRIVER, MANAGED)
+    with_traffic = traffic.running()
+    if with_traffic:
+        fields += (RX_RATE, TX_RATE, RX_BYTES, TX_BYTES)
+
     cols: Columns = [
         {'title': h(field), 'key': field, 'hint_text': ''}
-        for field in (NAME, STATE, DRIVER, MANAGED)
+        for field in fields
     ]
-    rows: Rows = [{col['key']: col['title'] for col in cols}]
-
-    for dev in __NM.GetDevices():
-        rows.append({
-            NAME: str(dev.Interface),
-            STATE: str(__c('device_state', dev.State)),
-            DRIVER: str(dev.Driver),
-            MANAGED: str(dev.Managed),
-        })
-    return cols, rows
+
+    def rows() -> Iterator[Dict[str, str]]:
+        for dev in stream(get_device, get_manager().devices):
+            row = {
+                NAME: str(dev.interface),
+                STATE: str(__c('device_state', dev.state)),
+                DRIVER: str(dev.driver),
+                MANAGED: str(dev.managed),
+            }
+            if with_traffic:
+                row.update(traffic_cells(dev.interface))
+            yield row
+
+    return cols, rows()
@@ -0,0 +1,169 @@
+"""
+Signal strength history of access points.
+
+Samples are stored in ring buffers carved out of arrays preallocated for
+:data:`MAX_APS` access points of :data:`CAPACITY` samples each, one slot per
+BSSID. Memory is fixed (3 bytes per sample, about 4.4 MB with the defaults)
+and recording a sample allocates nothing. Slots of access points not seen
+for :data:`EXPIRE` seconds are released, and the least recently seen one is
+reused when every slot is taken.
+"""
+import threading
+import time
+from array import array
+from collections import namedtuple
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Seconds between samples.
+INTERVAL = 5.0
+# Samples kept per access point, 4 hours at the default interval.
+CAPACITY = 2880
+MAX_APS = 512
+EXPIRE = 600.0
+
+SPARK_WIDTH = 24
+# From weakest to strongest. Plain ASCII renders with any font.
+SPARKS = ' .:-=+*#%@'
+
+Stats = namedtuple('Stats', ['min', 'avg', 'max', 'count'])
+
+# (bssid, strength, frequency)
+Sample = Tuple[str, int, int]
+
+
+class History:
+    """
+    Per BSSID ring buffers of strength (0-100) and frequency (MHz).
+    """
+    def __init__(self, max_aps: int = MAX_APS, capacity: int = CAPACITY):
+        """
+
+        :param max_aps:
+        :param capacity:
+        """
+        self.capacity = capacity
+        self.strength = array('b', bytes(max_aps * capacity))
+        self.frequency = array('H', [0]) * (max_aps * capacity)
+
+        self.heads = array('L', [0]) * max_aps
+        self.counts = array('L', [0]) * max_aps
+        self.last_seen = array('d', [0.0]) * max_aps
+
+        self.slots: Dict[str, int] = {}
+        self.free: List[int] = list(range(max_aps - 1, -1, -1))
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.slots)
+
+    def _release(self, bssid: str) -> None:
+        """
+
+        :param bssid:
+        :return:
+        """
+        slot = self.slots.pop(bssid)
+        self.heads[slot] = self.counts[slot] = 0
+        self.free.append(slot)
+
+    def _slot(self, bssid: str) -> int:
+        """
+        Return the slot of a BSSID, taking a free one or the least
+        recently seen one for a new BSSID.
+
+        :param bssid:
+        :return:
+        """
+        slot = self.slots.get(bssid)
+        if slot is not None:
+            return slot
+
+        if not self.free:
+            self._release(min(
+                self.slots, key=lambda b: self.last_seen[self.slots[b]]))
+
+        slot = self.free.pop()
+        self.slots[bssid] = slot
+        return slot
+
+    def record(self, samples: Iterable[Sample],
+               now: Optional[float] = None) -> None:
+        """
+        Append one sample per access point and release the slots of the
+        ones that expired.
+
+        :param samples:
+        :param now:
+        :return:
+        """
+        now = time.monotonic() if now is None else now
+        capacity = self.capacity
+
+        with self._lock:
+            for bssid, strength, frequency in samples:
+                slot = self._slot(bssid)
+                head = self.heads[slot]
+
+                self.strength[slot * capacity + head] = strength
+                self.frequency[slot * capacity + head] = frequency
+                self.heads[slot] = (head + 1) % capacity
+                if self.counts[slot] < capacity:
+                    self.counts[slot] += 1
+                self.last_seen[slot] = now
+
+            for bssid, slot in list(self.slots.items()):
+                if now - self.last_seen[slot] > EXPIRE:
+                    self._release(bssid)
+
+    def samples(self, bssid: str) -> List[int]:
+        """
+        Return the recorded strengths of a BSSID, oldest first.
+
+        :param bssid:
+        :return:
+        """
+        with self._lock:
+            slot = self.slots.get(bssid)
+            if slot is None:
+                return []
+
+            start, head = slot * self.capacity, self.heads[slot]
+            if self.counts[slot] < self.capacity:
+                return self.strength[start:start + head].tolist()
+            return (self.strength[start + head:start + self.capacity] +
+                    self.strength[start:start + head]).tolist()
+
+    def stats(self, bssid: str) -> Optional[Stats]:
+        """
+
+        :param bssid:
+        :return:
+        """
+        values = self.samples(bssid)
+        if not values:
+            return None
+        return Stats(min=min(values), avg=sum(values) / len(values),
+                     max=max(values), count=len(values))
+
+    def sparkline(self, bssid: str, width: int = SPARK_WIDTH) -> str:
+        """
+        Return the strength history as text, each character averaging
+        an equal share of the samples.
+
+        :param bssid:
+        :param width:
+        :return:
+        """
+        values = self.samples(bssid)
+        if not values:
+            return ''
+
+        width = min(width, len(values))
+        chars = []
+        for i in range(width):
+            bucket = values[i * len(values) // width:
+                            (i + 1) * len(values) // width]
+            level = sum(bucket) / len(bucket) / 100
+            chars.append(SPARKS[min(int(level * len(SPARKS)),
+                                    len(SPARKS) - 1)])
+        return ''.join(chars)
@@ -8,8 +8,10 @@ from typing import NamedTuple, List
 
 import NetworkManager
 
+from network import properties
+from network.collector import fan_out
+
 __c = NetworkManager.const
-__NM = NetworkManager.NetworkManager
 
 
 def get_general_info() -> dict:
@@ -17,18 +19,21 @@ def get_general_info() -> dict:
 
     :return:
     """
+    nm = properties.get_manager()
+    settings = properties.get_settings_info()
+
     return {
-        'version': __NM.Version,
-        'hostname': NetworkManager.Settings.Hostname,
-        'can_modify': NetworkManager.Settings.CanModify,
-        'networking_enabled': __NM.NetworkingEnabled,
-        'wireless_enabled': __NM.WirelessEnabled,
-        'wireless_hw_enabled': __NM.WirelessHardwareEnabled,
-        'wwan_enabled': __NM.WwanEnabled,
-        'wwan_hw_enabled': __NM.WwanHardwareEnabled,
-        'wimax_enabled': __NM.WimaxEnabled,
-        'wimax_hw_enabled': __NM.WimaxHardwareEnabled,
-        'overall_state': __c('state', __NM.State)
+        'version': nm.version,
+        'hostname': settings.hostname,
+        'can_modify': settings.can_modify,
+        'networking_enabled': nm.networking_enabled,
+        'wireless_enabled': nm.wireless_enabled,
+        'wireless_hw_enabled': nm.wireless_hw_enabled,
+        'wwan_enabled': nm.wwan_enabled,
+        'wwan_hw_enabled': nm.wwan_hw_enabled,
+        'wimax_enabled': nm.wimax_enabled,
+        'wimax_hw_enabled': nm.wimax_hw_enabled,
+        'overall_state': __c('state', nm.state)
     }
 
 
@@ -40,7 +45,7 @@ def get_permissions() -> dict:
     """
     return {
         '.'.join(perm.split('.')[3:]).lower(): val.lower()
-        for perm, val in sorted(__NM.GetPermissions().items())
+        for perm, val in sorted(properties.get_permissions().items())
     }
 
 
@@ -52,8 +57,8 @@ def get_available_devices() -> List[NamedTuple]:
     """
     Device: NamedTuple = namedtuple('Device', ['name', 'state', 'driver', 'managed'])
     return [
-        Device(dev.Interface, __c('device_state', dev.State), dev.Driver, dev.Managed)
-        for dev in __NM.GetDevices()
+        Device(dev.interface, __c('device_state', dev.state), dev.driver, dev.managed)
+        for dev in properties.get_devices()
     ]
 
 
@@ -66,8 +71,9 @@ def get_available_connections() -> List[NamedTuple]:
     Connection: NamedTuple = namedtuple('Connection', ['name', 'type'])
     conns: List = list()
 
-    for conn in NetworkManager.Settings.ListConnections():
-        settings: dict = conn.GetSettings()['connection']
+    for conn_settings in fan_out(properties.get_connection_settings,
+                                 properties.get_settings_info().connections):
+        settings: dict = conn_settings['connection']
         conns.append(Connection(settings['id'], settings['type']))
 
     return conns
@@ -83,10 +89,10 @@ def get_active_connections() -> List[NamedTuple]:
         'name', 'type', 'default', 'devices'])
     active_conns: List = list()
 
-    for conn in __NM.ActiveConnections:
-        settings: dict = conn.Connection.GetSettings()['connection']
-        devices: str = ", ".join([x.Interface for x in conn.Devices])
+    for conn in properties.get_active_connections():
+        devices: str = ", ".join(
+            [x.interface for x in properties.get_devices(conn.devices)])
         active_conns.append(
-            ActiveConnection(settings['id'], settings['type'], conn.Default, devices)
+            ActiveConnection(conn.id, conn.type, conn.default, devices)
         )
     return active_conns
@@ -0,0 +1,208 @@
+"""
+Hot path instrumentation.
+
+Provider calls, D-Bus round trips and widget builds record their duration
+here when profiling is enabled, from ``application.ini`` (``[debug]
+profiling``) or the ``KVNM_PROFILE`` environment variable. Each timer keeps
+a rolling window of samples for percentiles. When disabled, instrumented
+code only pays for a global flag check.
+"""
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Tuple
+
+from widgets.data import Table, Columns, Rows, h
+
+ENV_VAR = 'KVNM_PROFILE'
+WINDOW = 512
+PERCENTILES = (50, 90, 99)
+
+CATEGORY, NAME, COUNT, MAX = 'category', 'name', 'count', 'max'
+P50, P90, P99 = 'p50', 'p90', 'p99'
+
+enabled: bool = os.environ.get(ENV_VAR, '') not in ('', '0')
+
+_samples: Dict[Tuple[str, str], Deque[float]] = {}
+_counts: Dict[Tuple[str, str], int] = {}
+_lock = threading.Lock()
+
+
+def configure(enable: bool) -> None:
+    """
+    Switch profiling on or off. The environment variable, if set,
+    keeps it enabled.
+
+    :param enable:
+    :return:
+    """
+    global enabled
+
+    enabled = enable or os.environ.get(ENV_VAR, '') not in ('', '0')
+
+
+def record(category: str, name: str, seconds: float) -> None:
+    """
+
+    :param category:
+    :param name:
+    :param seconds:
+    :return:
+    """
+    key = (category, name)
+
+    with _lock:
+        samples = _samples.get(key)
+        if samples is None:
+            samples = _samples[key] = deque(maxlen=WINDOW)
+            _counts[key] = 0
+        samples.append(seconds)
+        _counts[key] += 1
+
+
+class _Span:
+    """
+    Context manager timing a block of code.
+    """
+    __slots__ = ('category', 'name', 'start')
+
+    def __init__(self, category: str, name: str):
+        """
+
+        :param category:
+        :param name:
+        """
+        self.category = category
+        self.name = name
+
+    def __enter__(self) -> "_Span":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        record(self.category, self.name, time.perf_counter() - self.start)
+
+
+class _NullSpan:
+    """
+    Shared do-nothing span used while profiling is disabled.
+    """
+    __slots__ = ()
+
+    def __enter__(self) -> "_NullSpan":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(category: str, name: str):
+    """
+    Time a ``with`` block.
+
+    :param category:
+    :param name:
+    :return:
+    """
+    return _Span(category, name) if enabled else _NULL_SPAN
+
+
+def profiled(category: str, name: str = None) -> Callable:
+    """
+    Time every call of the decorated function.
+
+    :param category:
+    :param name:
+    :return:
+    """
+    def decorator(func: Callable) -> Callable:
+        label = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return func(*args, **kwargs)
+
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(category, label, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def _percentile(ordered: List[float], pct: int) -> float:
+    """
+    Nearest rank percentile of a sorted list.
+
+    :param ordered:
+    :param pct:
+    :return:
+    """
+    index = max(0, -(-len(ordered) * pct // 100) - 1)
+    return ordered[index]
+
+
+def summary() -> List[Dict[str, object]]:
+    """
+    Return count, percentiles and maximum in milliseconds per timer.
+
+    :return:
+    """
+    with _lock:
+        items = [(key, sorted(samples), _counts[key])
+                 for key, samples in _samples.items()]
+
+    result = []
+    for (category, name), ordered, count in sorted(items):
+        entry = {CATEGORY: category, NAME: name, COUNT: count,
+                 MAX: round(ordered[-1] * 1000, 3)}
+        for pct in PERCENTILES:
+            entry['p%d' % pct] = round(_percentile(ordered, pct) * 1000, 3)
+        result.append(entry)
+    return result
+
+
+def reset() -> None:
+    """
+
+    :return:
+    """
+    with _lock:
+        _samples.clear()
+        _counts.clear()
+
+
+def dump(path: str) -> None:
+    """
+    Write the summary as JSON.
+
+    :param path:
+    :return:
+    """
+    with open(path, 'w') as outfile:
+        json.dump(summary(), outfile, indent=2)
+
+
+def get_profile() -> Table:
+    """
+    Return the summary as a table, timings in milliseconds.
+
+    :return:
+    """
+    cols: Columns = [
+        {'title': h(field), 'key': field, 'hint_text': ''}
+        for field in (CATEGORY, NAME, COUNT, P50, P90, P99, MAX)
+    ]
+    rows: Rows = []
+
+    for entry in summary():
+        rows.append({key: str(value) for key, value in entry.items()})
+    return cols, rows
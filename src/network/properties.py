@@ -0,0 +1,530 @@
+"""
+Batched access to NetworkManager objects.
+
+Reading an attribute of a python-networkmanager object costs one
+``org.freedesktop.DBus.Properties.Get`` round trip. The functions in this
+module fetch every property of an object interface with a single ``GetAll``
+call and return plain records, so providers pay one call per object instead
+of one call per attribute.
+"""
+import socket
+import struct
+import time
+from collections import Counter, namedtuple
+from typing import Any, Callable, Dict, List, Optional, Iterable, Tuple
+
+import dbus
+
+from network import profiler
+from network.collector import fan_out
+from network.cache import cache, CONNECTION, PERMISSIONS
+
+NM_BUS_NAME = 'org.freedesktop.NetworkManager'
+NM_PATH = '/org/freedesktop/NetworkManager'
+SETTINGS_PATH = NM_PATH + '/Settings'
+NO_PATH = '/'
+
+PROPERTIES_IFACE = 'org.freedesktop.DBus.Properties'
+NM_IFACE = 'org.freedesktop.NetworkManager'
+DEVICE_IFACE = NM_IFACE + '.Device'
+WIRELESS_IFACE = DEVICE_IFACE + '.Wireless'
+STATISTICS_IFACE = DEVICE_IFACE + '.Statistics'
+AP_IFACE = NM_IFACE + '.AccessPoint'
+ACTIVE_IFACE = NM_IFACE + '.Connection.Active'
+IP4_IFACE = NM_IFACE + '.IP4Config'
+IP6_IFACE = NM_IFACE + '.IP6Config'
+SETTINGS_IFACE = NM_IFACE + '.Settings'
+CONNECTION_IFACE = SETTINGS_IFACE + '.Connection'
+
+MAC_KEYS = ('mac-address', 'cloned-mac-address', 'bssid')
+NO_REPLY = 'org.freedesktop.DBus.Error.NoReply'
+
+# Number of D-Bus round trips by method name.
+calls: Counter = Counter()
+
+Manager = namedtuple('Manager', [
+    'version', 'state', 'networking_enabled',
+    'wireless_enabled', 'wireless_hw_enabled',
+    'wwan_enabled', 'wwan_hw_enabled',
+    'wimax_enabled', 'wimax_hw_enabled',
+    'devices', 'active_connections'])
+SettingsInfo = namedtuple('SettingsInfo', [
+    'hostname', 'can_modify', 'connections'])
+Device = namedtuple('Device', [
+    'path', 'interface', 'device_type', 'state', 'driver', 'managed',
+    'hw_address', 'ip4_config', 'ip6_config'])
+Wireless = namedtuple('Wireless', ['path', 'access_points', 'last_scan'])
+Statistics = namedtuple('Statistics', [
+    'path', 'refresh_rate_ms', 'rx_bytes', 'tx_bytes'])
+AccessPoint = namedtuple('AccessPoint', [
+    'path', 'ssid', 'bssid', 'frequency', 'strength', 'last_seen'])
+ActiveConnection = namedtuple('ActiveConnection', [
+    'path', 'id', 'type', 'connection', 'default', 'devices'])
+Ip4Config = namedtuple('Ip4Config', [
+    'path', 'addresses', 'routes', 'nameservers'])
+# family: 4 or 6; next_hop is '' for a directly connected network.
+Route = namedtuple('Route', [
+    'family', 'dest', 'prefix', 'next_hop', 'metric', 'table'])
+Address = namedtuple('Address', ['family', 'address', 'prefix'])
+IpConfig = namedtuple('IpConfig', [
+    'path', 'family', 'addresses', 'routes', 'gateway'])
+
+_bus: Optional[dbus.Bus] = None
+
+
+def get_bus() -> dbus.Bus:
+    """
+    Return the shared system bus connection.
+
+    :return:
+    """
+    global _bus
+
+    if _bus is None:
+        _bus = dbus.SystemBus()
+    return _bus
+
+
+def to_python(value: Any) -> Any:
+    """
+    Convert a D-Bus value into plain python types.
+
+    :param value:
+    :return:
+    """
+    if isinstance(value, dbus.Boolean):
+        return bool(value)
+    if isinstance(value, (dbus.String, dbus.ObjectPath)):
+        return str(value)
+    if isinstance(value, (dbus.Array, dbus.ByteArray)):
+        if getattr(value, 'signature', None) == 'y':
+            return bytes(value)
+        return [to_python(v) for v in value]
+    if isinstance(value, dbus.Struct):
+        return tuple(to_python(v) for v in value)
+    if isinstance(value, dbus.Dictionary):
+        return {to_python(k): to_python(v) for k, v in value.items()}
+    if isinstance(value, dbus.Double):
+        return float(value)
+    if isinstance(value, int):
+        return int(value)
+    return value
+
+
+def call_bus(path: str, interface: str, method: str, args: Tuple,
+             timeout: Optional[float]) -> Any:
+    """
+    The default backend: call NetworkManager on the system bus.
+
+    :param path:
+    :param interface:
+    :param method:
+    :param args:
+    :param timeout:
+    :return:
+    """
+    # call_blocking skips the name owner lookup a proxy object costs.
+    result = get_bus().call_blocking(
+        NM_BUS_NAME, path, interface, method, None, args,
+        timeout=-1.0 if timeout is None else timeout)
+    return to_python(result)
+
+
+# Answers call_method, see network.recording.
+Backend = Callable[[str, str, str, Tuple, Optional[float]], Any]
+_backend: Backend = call_bus
+
+
+def get_backend() -> Backend:
+    """
+
+    :return:
+    """
+    return _backend
+
+
+def set_backend(backend: Optional[Backend]) -> None:
+    """
+    Serve every call_method from backend, or from the bus if None.
+
+    :param backend:
+    :return:
+    """
+    global _backend
+
+    _backend = call_bus if backend is None else backend
+    cache.clear()
+
+
+def call_method(path: str, interface: str, method: str, *args,
+                timeout: Optional[float] = None) -> Any:
+    """
+    Call a NetworkManager method and return its result as python types.
+
+    :param path:
+    :param interface:
+    :param method:
+    :param args:
+    :param timeout:
+    :return:
+    """
+    calls[method] += 1
+    name = method
+    if profiler.enabled and method == 'GetAll':
+        name = 'GetAll %s' % args[0]
+
+    with profiler.span('dbus', name):
+        return _backend(path, interface, method, args, timeout)
+
+
+def get_all(path: str, interface: str) -> Dict[str, Any]:
+    """
+    Fetch every property of an object interface in a single round trip.
+    Results are cached until the object emits a change signal.
+
+    :param path:
+    :param interface:
+    :return:
+    """
+    return cache.get(
+        ('GetAll', path, interface),
+        lambda: call_method(path, PROPERTIES_IFACE, 'GetAll', interface),
+        (path,)
+    )
+
+
+def ip4_to_str(value: int) -> str:
+    """
+    Convert an IPv4 address in network byte order into dotted notation.
+
+    :param value:
+    :return:
+    """
+    return socket.inet_ntop(socket.AF_INET, struct.pack('=I', value))
+
+
+def mac_to_str(value: bytes) -> str:
+    """
+
+    :param value:
+    :return:
+    """
+    return ':'.join('%02X' % b for b in value)
+
+
+def get_manager() -> Manager:
+    """
+    Return the NetworkManager root object.
+
+    :return:
+    """
+    props = get_all(NM_PATH, NM_IFACE)
+    return Manager(
+        version=props.get('Version', ''),
+        state=props.get('State', 0),
+        networking_enabled=props.get('NetworkingEnabled', False),
+        wireless_enabled=props.get('WirelessEnabled', False),
+        wireless_hw_enabled=props.get('WirelessHardwareEnabled', False),
+        wwan_enabled=props.get('WwanEnabled', False),
+        wwan_hw_enabled=props.get('WwanHardwareEnabled', False),
+        wimax_enabled=props.get('WimaxEnabled', False),
+        wimax_hw_enabled=props.get('WimaxHardwareEnabled', False),
+        devices=props.get('Devices', []),
+        active_connections=props.get('ActiveConnections', []),
+    )
+
+
+def get_settings_info() -> SettingsInfo:
+    """
+    Return the NetworkManager settings object.
+
+    :return:
+    """
+    props = get_all(SETTINGS_PATH, SETTINGS_IFACE)
+    return SettingsInfo(
+        hostname=props.get('Hostname', ''),
+        can_modify=props.get('CanModify', False),
+        connections=props.get('Connections', []),
+    )
+
+
+def get_permissions() -> Dict[str, str]:
+    """
+
+    :return:
+    """
+    return cache.get(
+        ('GetPermissions',),
+        lambda: call_method(NM_PATH, NM_IFACE, 'GetPermissions'),
+        (PERMISSIONS,)
+    )
+
+
+def get_device(path: str) -> Device:
+    """
+
+    :param path:
+    :return:
+    """
+    props = get_all(path, DEVICE_IFACE)
+    return Device(
+        path=path,
+        interface=props.get('Interface', ''),
+        device_type=props.get('DeviceType', 0),
+        state=props.get('State', 0),
+        driver=props.get('Driver', ''),
+        managed=props.get('Managed', False),
+        hw_address=props.get('HwAddress', ''),
+        ip4_config=props.get('Ip4Config', NO_PATH),
+        ip6_config=props.get('Ip6Config', NO_PATH),
+    )
+
+
+def get_devices(paths: Optional[Iterable[str]] = None) -> List[Device]:
+    """
+    Return device records, all devices known to NetworkManager by
+    default.
+
+    :param paths:
+    :return:
+    """
+    if paths is None:
+        paths = get_manager().devices
+    return fan_out(get_device, paths)
+
+
+def get_statistics(path: str) -> Statistics:
+    """
+    Return the traffic counters of a device. They change all the time,
+    so they are read past the cache.
+
+    :param path:
+    :return:
+    """
+    props = call_method(path, PROPERTIES_IFACE, 'GetAll', STATISTICS_IFACE)
+    return Statistics(
+        path=path,
+        refresh_rate_ms=props.get('RefreshRateMs', 0),
+        rx_bytes=props.get('RxBytes', 0),
+        tx_bytes=props.get('TxBytes', 0),
+    )
+
+
+def set_refresh_rate(path: str, refresh_rate_ms: int) -> None:
+    """
+    Set how often NetworkManager updates the traffic counters of a
+    device, 0 to stop updating them.
+
+    :param path:
+    :param refresh_rate_ms:
+    :return:
+    """
+    call_method(path, PROPERTIES_IFACE, 'Set', STATISTICS_IFACE,
+                'RefreshRateMs', dbus.UInt32(refresh_rate_ms, variant_level=1))
+
+
+def get_access_point(path: str) -> AccessPoint:
+    """
+
+    :param path:
+    :return:
+    """
+    props = get_all(path, AP_IFACE)
+    return AccessPoint(
+        path=path,
+        ssid=props.get('Ssid', b'').decode('utf-8', 'replace'),
+        bssid=props.get('HwAddress', ''),
+        frequency=props.get('Frequency', 0),
+        strength=props.get('Strength', 0),
+        last_seen=props.get('LastSeen', -1),
+    )
+
+
+def get_wireless(device: str) -> Wireless:
+    """
+
+    :param device:
+    :return:
+    """
+    props = get_all(device, WIRELESS_IFACE)
+    return Wireless(
+        path=device,
+        access_points=props.get('AccessPoints', []),
+        last_scan=props.get('LastScan', -1),
+    )
+
+
+def get_access_points(device: str) -> List[AccessPoint]:
+    """
+    Return the access points visible from a wireless device.
+
+    :param device:
+    :return:
+    """
+    return fan_out(get_access_point, get_wireless(device).access_points)
+
+
+def get_active_connection(path: str) -> ActiveConnection:
+    """
+
+    :param path:
+    :return:
+    """
+    props = get_all(path, ACTIVE_IFACE)
+    return ActiveConnection(
+        path=path,
+        id=props.get('Id', ''),
+        type=props.get('Type', ''),
+        connection=props.get('Connection', NO_PATH),
+        default=props.get('Default', False),
+        devices=props.get('Devices', []),
+    )
+
+
+def get_active_connections() -> List[ActiveConnection]:
+    """
+
+    :return:
+    """
+    return fan_out(get_active_connection, get_manager().active_connections)
+
+
+def get_ip_config(path: str, family: int = 4) -> Optional[IpConfig]:
+    """
+    Return the addresses and routes of an IPv4 or IPv6 configuration,
+    read from ``AddressData`` and ``RouteData``. NetworkManager versions
+    older than 1.6 only have the deprecated ``Addresses`` and ``Routes``;
+    those are read for IPv4.
+
+    :param path:
+    :param family:
+    :return:
+    """
+    if path == NO_PATH:
+        return None
+
+    props = get_all(path, IP4_IFACE if family == 4 else IP6_IFACE)
+
+    if 'AddressData' in props or family == 6:
+        addresses = [
+            Address(family, data['address'], data['prefix'])
+            for data in props.get('AddressData', [])
+        ]
+        routes = [
+            Route(family, data['dest'], data['prefix'],
+                  data.get('next-hop', ''), data.get('metric', 0),
+                  data.get('table', 0))
+            for data in props.get('RouteData', [])
+        ]
+    else:
+        addresses = [
+            Address(4, ip4_to_str(addr), prefix)
+            for addr, prefix, gateway in props.get('Addresses', [])
+        ]
+        routes = [
+            Route(4, ip4_to_str(dest), prefix,
+                  ip4_to_str(next_hop) if next_hop else '', metric, 0)
+            for dest, prefix, next_hop, metric in props.get('Routes', [])
+        ]
+
+    return IpConfig(path=path, family=family, addresses=addresses,
+                    routes=routes, gateway=props.get('Gateway', ''))
+
+
+def get_ip4_config(path: str) -> Optional[Ip4Config]:
+    """
+
+    :param path:
+    :return:
+    """
+    config = get_ip_config(path, 4)
+    if config is None:
+        return None
+
+    props = get_all(path, IP4_IFACE)
+    gateway = config.gateway or '0.0.0.0'
+    return Ip4Config(
+        path=path,
+        addresses=[
+            (addr.address, addr.prefix, gateway)
+            for addr in config.addresses
+        ],
+        routes=[
+            (route.dest, route.prefix, route.next_hop or '0.0.0.0',
+             route.metric)
+            for route in config.routes
+        ],
+        nameservers=[ip4_to_str(ns) for ns in props.get('Nameservers', [])],
+    )
+
+
+def _fixup_settings(settings: dict) -> dict:
+    """
+    Make byte and integer encoded settings human readable.
+
+    :param settings:
+    :return:
+    """
+    for name, section in settings.items():
+        for key, value in section.items():
+            if isinstance(value, bytes):
+                if key in MAC_KEYS:
+                    section[key] = mac_to_str(value)
+                elif key == 'ssid':
+                    section[key] = value.decode('utf-8', 'replace')
+            elif name == 'ipv4' and key == 'dns':
+                section[key] = [ip4_to_str(ns) for ns in value]
+            elif name == 'ipv4' and key in ('addresses', 'routes'):
+                section[key] = [
+                    [ip4_to_str(v) if i in (0, 2) else v
+                     for i, v in enumerate(item)]
+                    for item in value
+                ]
+    return settings
+
+
+def get_connection_settings(path: str) -> dict:
+    """
+
+    :param path:
+    :return:
+    """
+    return cache.get(
+        ('GetSettings', path),
+        lambda: _fixup_settings(
+            call_method(path, CONNECTION_IFACE, 'GetSettings')),
+        (path, CONNECTION)
+    )
+
+
+def get_connection_secrets(path: str, settings: Iterable[str],
+                           timeout: Optional[float] = None) -> dict:
+    """
+    Return the secrets of every setting in a connection. Settings
+    without secrets are skipped. The timeout applies to the connection
+    as a whole; when it runs out, a NoReply error is raised.
+
+    :param path:
+    :param settings:
+    :param timeout:
+    :return:
+    """
+    secrets: dict = {}
+    deadline = None if timeout is None else time.monotonic() + timeout
+
+    for name in settings:
+        remaining = None
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise dbus.exceptions.DBusException(
+                    'Timed out waiting for secrets', name=NO_REPLY)
+
+        try:
+            secrets.update(call_method(
+                path, CONNECTION_IFACE, 'GetSecrets', name, timeout=remaining))
+        except dbus.exceptions.DBusException as e:
+            if e.get_dbus_name() == NO_REPLY:
+                raise
+            continue
+    return secrets
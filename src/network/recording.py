@@ -0,0 +1,292 @@
+"""
+Record and replay the NetworkManager calls made by the providers.
+
+A :class:`Recorder` wraps the :mod:`~network.properties` backend and writes
+every call, with its arguments, result or error and latency, to a JSON
+Lines file. A :class:`Replay` serves the providers from such a file without
+NetworkManager, optionally sleeping for the recorded latencies, so slow
+panels can be reproduced on another machine and benchmarked.
+
+Secrets are never recorded: ``GetSecrets`` calls are written as failed.
+
+Both are installed with :func:`install`, or from the ``KVNM_RECORD``,
+``KVNM_REPLAY`` and ``KVNM_REPLAY_TIMING`` environment variables by
+:func:`install_from_env`.
+"""
+import base64
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from dbus.exceptions import DBusException
+
+from network import properties
+
+FORMAT_VERSION = 1
+RECORD_VAR = 'KVNM_RECORD'
+REPLAY_VAR = 'KVNM_REPLAY'
+TIMING_VAR = 'KVNM_REPLAY_TIMING'
+
+SECRET_METHODS = ('GetSecrets',)
+NO_SECRETS = 'org.freedesktop.NetworkManager.AgentManager.NoSecrets'
+NOT_RECORDED = 'org.freedesktop.DBus.Error.Failed'
+
+# (path, interface, method, encoded arguments)
+CallKey = Tuple[str, str, str, str]
+
+
+def encode(value: Any) -> Any:
+    """
+    Convert call arguments and results into JSON values. Bytes, tuples
+    and dicts with other than string keys are tagged, so they decode
+    to the same types.
+
+    :param value:
+    :return:
+    """
+    if isinstance(value, bytes):
+        return {'$bytes': base64.b64encode(value).decode('ascii')}
+    if isinstance(value, tuple):
+        return {'$tuple': [encode(v) for v in value]}
+    if isinstance(value, list):
+        return [encode(v) for v in value]
+    if isinstance(value, dict):
+        if all(isinstance(k, str) for k in value):
+            return {k: encode(v) for k, v in value.items()}
+        return {'$dict': [[encode(k), encode(v)] for k, v in value.items()]}
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, int):
+        return int(value)
+    if isinstance(value, float):
+        return float(value)
+    if isinstance(value, str):
+        return str(value)
+    return value
+
+
+def decode(value: Any) -> Any:
+    """
+
+    :param value:
+    :return:
+    """
+    if isinstance(value, list):
+        return [decode(v) for v in value]
+    if isinstance(value, dict):
+        if len(value) == 1:
+            tag, item = next(iter(value.items()))
+            if tag == '$bytes':
+                return base64.b64decode(item)
+            if tag == '$tuple':
+                return tuple(decode(v) for v in item)
+            if tag == '$dict':
+                return {decode(k): decode(v) for k, v in item}
+        return {k: decode(v) for k, v in value.items()}
+    return value
+
+
+def call_key(path: str, interface: str, method: str, args: Tuple) -> CallKey:
+    """
+
+    :param path:
+    :param interface:
+    :param method:
+    :param args:
+    :return:
+    """
+    return (path, interface, method,
+            json.dumps(encode(list(args)), sort_keys=True))
+
+
+class Recorder:
+    """
+    Backend writing every call it forwards to a file, one JSON object
+    per line after a header line.
+    """
+    def __init__(self, path: str,
+                 backend: Optional[properties.Backend] = None):
+        """
+
+        :param path:
+        :param backend: defaults to the current one.
+        """
+        self.path = path
+        self.backend = backend or properties.get_backend()
+        self.count = 0
+
+        self._file = open(path, 'w')
+        self._lock = threading.Lock()
+        self._write({'version': FORMAT_VERSION,
+                     'time': time.strftime('%Y-%m-%dT%H:%M:%S')})
+
+    def _write(self, record: Dict[str, Any]) -> None:
+        """
+
+        :param record:
+        :return:
+        """
+        line = json.dumps(record, separators=(',', ':'))
+        with self._lock:
+            if not self._file.closed:
+                self._file.write(line + '\n')
+                self._file.flush()
+
+    def __call__(self, path: str, interface: str, method: str, args: Tuple,
+                 timeout: Optional[float]) -> Any:
+        record: Dict[str, Any] = {
+            'path': path, 'interface': interface, 'method': method,
+            'args': encode(list(args))}
+
+        start = time.perf_counter()
+        try:
+            result = self.backend(path, interface, method, args, timeout)
+        except DBusException as e:
+            record['error'] = [e.get_dbus_name(), e.get_dbus_message()]
+            raise
+        else:
+            if method in SECRET_METHODS:
+                record['error'] = [NO_SECRETS, 'Not recorded']
+            else:
+                record['result'] = encode(result)
+            return result
+        finally:
+            record['seconds'] = round(time.perf_counter() - start, 6)
+            self.count += 1
+            self._write(record)
+
+    def close(self) -> None:
+        """
+
+        :return:
+        """
+        with self._lock:
+            self._file.close()
+
+
+class Replay:
+    """
+    Backend answering calls from a recording. Repeated calls get the
+    recorded answers in order, then the last one again; a call never
+    recorded fails with :data:`NOT_RECORDED`.
+    """
+    def __init__(self, path: str, timing: bool = False, speed: float = 1.0):
+        """
+
+        :param path:
+        :param timing: sleep for the recorded latency of each call.
+        :param speed: latency divisor when timing.
+        """
+        self.path = path
+        self.timing = timing
+        self.speed = speed
+        self.misses = 0
+
+        self._answers: Dict[CallKey, List[Dict[str, Any]]] = {}
+        self._served: Dict[CallKey, int] = {}
+        self._lock = threading.Lock()
+
+        with open(path) as infile:
+            header = json.loads(infile.readline())
+            if header.get('version') != FORMAT_VERSION:
+                raise ValueError(f'{path}: unsupported recording version '
+                                 f'{header.get("version")!r}')
+            for line in infile:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                key = (record['path'], record['interface'], record['method'],
+                       json.dumps(record['args'], sort_keys=True))
+                self._answers.setdefault(key, []).append(record)
+
+    def __len__(self) -> int:
+        return sum(len(answers) for answers in self._answers.values())
+
+    def __call__(self, path: str, interface: str, method: str, args: Tuple,
+                 timeout: Optional[float]) -> Any:
+        key = call_key(path, interface, method, args)
+
+        with self._lock:
+            answers = self._answers.get(key)
+            if answers is None:
+                self.misses += 1
+                raise DBusException(
+                    f'{method} {path} {interface} not recorded',
+                    name=NOT_RECORDED)
+            served = self._served.get(key, 0)
+            self._served[key] = served + 1
+            record = answers[min(served, len(answers) - 1)]
+
+        if self.timing:
+            time.sleep(record['seconds'] / self.speed)
+        if 'error' in record:
+            name, message = record['error']
+            raise DBusException(message, name=name)
+        return decode(record['result'])
+
+    def rewind(self) -> None:
+        """
+        Serve the recorded answers from the first one again.
+
+        :return:
+        """
+        with self._lock:
+            self._served.clear()
+
+
+def install(record: Optional[str] = None, replay: Optional[str] = None,
+            timing: bool = False) -> Optional[properties.Backend]:
+    """
+    Serve the providers from a recording, or record their calls to a
+    file. Replaying and recording at once records the replay.
+
+    :param record:
+    :param replay:
+    :param timing:
+    :return: the installed backend, if any.
+    """
+    backend = None
+    if replay:
+        backend = Replay(replay, timing)
+        properties.set_backend(backend)
+    if record:
+        backend = Recorder(record)
+        properties.set_backend(backend)
+    return backend
+
+
+def install_from_env() -> Optional[properties.Backend]:
+    """
+
+    :return:
+    """
+    return install(
+        record=os.environ.get(RECORD_VAR) or None,
+        replay=os.environ.get(REPLAY_VAR) or None,
+        timing=os.environ.get(TIMING_VAR, '') not in ('', '0'))
+
+
+def replaying() -> bool:
+    """
+    Return True if the providers are served from a recording.
+
+    :return:
+    """
+    backend = properties.get_backend()
+    while isinstance(backend, Recorder):
+        backend = backend.backend
+    return isinstance(backend, Replay)
+
+
+def close() -> None:
+    """
+    Finish the recording, if one is in progress, and go back to the bus.
+
+    :return:
+    """
+    backend = properties.get_backend()
+    if isinstance(backend, Recorder):
+        backend.close()
+        properties.set_backend(backend.backend)
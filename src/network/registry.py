@@ -0,0 +1,158 @@
+"""
+Registry of provider functions named by dotted paths in the config, e.g.
+``network.ssid.get_ssids``. Paths are validated when added, imported once
+(usually in the background right after startup) and then served with a
+single dict lookup. Each entry carries the provider metadata: the cache
+tags set by :func:`~network.cache.cached` and a cost hint.
+
+Declared paths (plugins) are not preloaded: they are imported on first use
+and wrapped with the declared cache policy.
+"""
+import importlib
+import threading
+from collections import namedtuple
+from typing import Callable, Dict, Iterable, Optional, Set, Tuple
+
+from network.cache import cached
+
+COST_LOW, COST_HIGH = 'low', 'high'
+
+Provider = namedtuple('Provider', ['path', 'func', 'cache_tags', 'cost'])
+Policy = namedtuple('Policy', ['cache_tags', 'ttl', 'cost'])
+
+
+class ProviderError(Exception):
+    """
+    A dotted path that doesn't name a callable provider.
+    """
+
+
+def provider(cost: str = COST_LOW) -> Callable:
+    """
+    Attach metadata to a provider function.
+
+    :param cost:
+    :return:
+    """
+    def decorator(func: Callable) -> Callable:
+        func.cost = cost
+        return func
+    return decorator
+
+
+def split(path: str) -> Tuple[str, str]:
+    """
+    Split a dotted path into module and attribute names.
+
+    :param path:
+    :return:
+    """
+    module, _, name = path.rpartition('.')
+
+    if not module or not name:
+        raise ProviderError(f'{path!r} is not a dotted path')
+    return module, name
+
+
+class ProviderRegistry:
+    """
+    Maps dotted paths to resolved providers.
+    """
+    def __init__(self):
+        self._paths: Set[str] = set()
+        self._policies: Dict[str, Policy] = {}
+        self._providers: Dict[str, Provider] = {}
+        self._lock = threading.Lock()
+
+    def add(self, paths: Iterable[str]) -> None:
+        """
+        Declare provider paths. Only their syntax is checked here.
+
+        :param paths:
+        :return:
+        """
+        for path in paths:
+            split(path)
+            with self._lock:
+                self._paths.add(path)
+
+    def declare(self, path: str, cache_tags: Tuple[str, ...] = (),
+                ttl: Optional[float] = None, cost: str = COST_LOW) -> None:
+        """
+        Declare a provider path to import on first use. Unless the
+        provider caches its results itself, it is cached with the given
+        tags and ttl.
+
+        :param path:
+        :param cache_tags:
+        :param ttl:
+        :param cost:
+        :return:
+        """
+        split(path)
+        with self._lock:
+            self._policies[path] = Policy(tuple(cache_tags), ttl, cost)
+
+    def resolve(self, path: str) -> Provider:
+        """
+        Import a provider and store it.
+
+        :param path:
+        :return:
+        """
+        module, name = split(path)
+
+        try:
+            func = getattr(importlib.import_module(module), name)
+        except (ImportError, AttributeError) as e:
+            raise ProviderError(f'{path!r} cannot be resolved: {e}') from e
+
+        if not callable(func):
+            raise ProviderError(f'{path!r} is not callable')
+
+        policy = self._policies.get(path)
+        if policy is not None and policy.cache_tags and \
+                not hasattr(func, 'cache_tags'):
+            func = cached(*policy.cache_tags, ttl=policy.ttl)(func)
+
+        entry = Provider(
+            path=path, func=func,
+            cache_tags=getattr(func, 'cache_tags', ()),
+            cost=getattr(func, 'cost', policy.cost if policy else COST_LOW))
+
+        with self._lock:
+            self._paths.add(path)
+            self._providers[path] = entry
+        return entry
+
+    def get(self, path: str) -> Provider:
+        """
+
+        :param path:
+        :return:
+        """
+        try:
+            return self._providers[path]
+        except KeyError:
+            return self.resolve(path)
+
+    def preload(self) -> Dict[str, ProviderError]:
+        """
+        Resolve every declared path not resolved yet and return the
+        ones that failed.
+
+        :return:
+        """
+        with self._lock:
+            pending = sorted(self._paths - self._providers.keys())
+
+        errors: Dict[str, ProviderError] = {}
+        for path in pending:
+            try:
+                self.resolve(path)
+            except ProviderError as e:
+                errors[path] = e
+        return errors
+
+
+registry = ProviderRegistry()
@@ -0,0 +1,314 @@
+"""
+IPv4 and IPv6 routes of every device, with longest prefix match lookups.
+
+Routes are read from ``RouteData`` and kept in one list; a path compressed
+binary trie per address family maps prefixes to positions in it. A trie
+holds at most two nodes per route, in flat arrays, so a full routing table
+stays within a few tens of bytes per route on top of the route records,
+and a lookup visits at most one node per prefix length. Each routing table
+has its own tries; lookups go to the main table unless told otherwise, as
+policy routing tables are only used when a rule selects them.
+"""
+import ipaddress
+import socket
+from array import array
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from widgets.data import Columns
+from network.registry import provider, COST_HIGH
+from network.cache import cached, MANAGER, DEVICE, IP4_CONFIG, IP6_CONFIG
+from network.collector import fan_out
+from network.properties import Device, Route, get_devices, get_ip_config
+
+FAMILY, DESTINATION, NEXT_HOP, METRIC, TABLE, DEVICE_NAME = (
+    'family', 'destination', 'next_hop', 'metric', 'table', 'device')
+COLUMNS: Columns = [
+    {'key': FAMILY, 'title': 'Family'},
+    {'key': DESTINATION, 'title': 'Destination'},
+    {'key': NEXT_HOP, 'title': 'Next hop'},
+    {'key': METRIC, 'title': 'Metric'},
+    {'key': TABLE, 'title': 'Table'},
+    {'key': DEVICE_NAME, 'title': 'Device'},
+]
+BITS = {4: 32, 6: 128}
+ADDRESS_FAMILIES = {4: socket.AF_INET, 6: socket.AF_INET6}
+# Route table numbers; NetworkManager reports 0 for the main table
+# unless configured otherwise.
+UNSPEC_TABLE, MAIN_TABLE = 0, 254
+
+
+def network_key(family: int, dest: str, prefix: int) -> int:
+    """
+    Return a route destination as an int with the host bits cleared.
+
+    :param family:
+    :param dest:
+    :param prefix:
+    :return:
+    :raises ValueError: if dest or prefix is not valid for family.
+    """
+    bits = BITS[family]
+    if not 0 <= prefix <= bits:
+        raise ValueError(f'invalid IPv{family} prefix length {prefix}')
+    value = int.from_bytes(
+        socket.inet_pton(ADDRESS_FAMILIES[family], dest), 'big')
+    return value >> (bits - prefix) << (bits - prefix) if prefix else 0
+
+
+def table_number(table: int) -> int:
+    """
+    Return the routing table number of a route, the main table for
+    an unspecified one.
+
+    :param table:
+    :return:
+    """
+    return MAIN_TABLE if table == UNSPEC_TABLE else table
+
+
+class PrefixTrie:
+    """
+    Path compressed binary trie from prefixes of a fixed width to int
+    values. Node 0 is the root, the zero length prefix.
+    """
+    def __init__(self, bits: int):
+        """
+
+        :param bits: address width.
+        """
+        self.bits = bits
+        self.keys: List[int] = [0]
+        self.lengths = array('B', [0])
+        self.children = (array('i', [-1]), array('i', [-1]))
+        self.values = array('i', [-1])
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def _new(self, key: int, length: int, value: int) -> int:
+        """
+
+        :param key:
+        :param length:
+        :param value:
+        :return:
+        """
+        self.keys.append(key)
+        self.lengths.append(length)
+        self.children[0].append(-1)
+        self.children[1].append(-1)
+        self.values.append(value)
+        return len(self.keys) - 1
+
+    def _bit(self, key: int, position: int) -> int:
+        """
+
+        :param key:
+        :param position: from the most significant bit.
+        :return:
+        """
+        return (key >> (self.bits - 1 - position)) & 1
+
+    def insert(self, key: int, length: int, value: int) -> None:
+        """
+        Map a prefix to value, replacing the value it had.
+
+        :param key: the network address, host bits cleared.
+        :param length:
+        :param value:
+        :return:
+        """
+        bits, keys, lengths = self.bits, self.keys, self.lengths
+        node = 0
+
+        while True:
+            node_length = lengths[node]
+            if length == node_length:
+                self.values[node] = value
+                return
+
+            side = (key >> (bits - 1 - node_length)) & 1
+            children = self.children[side]
+            child = children[node]
+            if child < 0:
+                children[node] = self._new(key, length, value)
+                return
+
+            child_length = lengths[child]
+            common = bits - (key ^ keys[child]).bit_length()
+            if common >= child_length and length >= child_length:
+                node = child
+                continue
+            common = min(common, length, child_length)
+
+            # The prefix diverges from the child's, or is shorter: put a
+            # node at the common part between them.
+            if common == length:
+                split = self._new(key, length, value)
+            else:
+                mask = ((1 << common) - 1) << (bits - common)
+                split = self._new(key & mask, common, -1)
+                branch = self._bit(key, common)
+                self.children[branch][split] = self._new(key, length, value)
+
+            self.children[self._bit(keys[child], common)][split] = child
+            children[node] = split
+            return
+
+    def lookup(self, address: int) -> int:
+        """
+        Return the value of the longest prefix containing address, -1
+        if none does.
+
+        :param address:
+        :return:
+        """
+        bits, keys, lengths = self.bits, self.keys, self.lengths
+        found = self.values[0]
+        node = 0
+
+        while True:
+            length = lengths[node]
+            if length == bits:
+                return found
+            node = self.children[(address >> (bits - 1 - length)) & 1][node]
+            if node < 0:
+                return found
+
+            if (address ^ keys[node]) >> (bits - lengths[node]):
+                return found
+            if self.values[node] >= 0:
+                found = self.values[node]
+
+
+class RouteTable:
+    """
+    Routes and the device they go through, with a trie per family and
+    routing table. Among routes to the same prefix, the lowest metric
+    wins. Routes that can't be parsed are listed but never looked up.
+    """
+    def __init__(self, routes: List[Tuple[Route, str]]):
+        """
+
+        :param routes: (route, interface) pairs.
+        """
+        self.routes = routes
+        # (family, table) -> trie
+        self.tries: Dict[Tuple[int, int], PrefixTrie] = {}
+
+        order = sorted(range(len(routes)),
+                       key=lambda i: routes[i][0].metric, reverse=True)
+        for i in order:
+            route = routes[i][0]
+            try:
+                key = network_key(route.family, route.dest, route.prefix)
+            except (OSError, KeyError, ValueError):
+                continue
+
+            trie_key = (route.family, table_number(route.table))
+            trie = self.tries.get(trie_key)
+            if trie is None:
+                trie = self.tries[trie_key] = PrefixTrie(BITS[route.family])
+            trie.insert(key, route.prefix, i)
+
+    def __len__(self) -> int:
+        return len(self.routes)
+
+    def label(self, index: int) -> str:
+        """
+        Return a route as ``ip route`` would show it.
+
+        :param index:
+        :return:
+        """
+        route, interface = self.routes[index]
+        text = '%s/%d' % (route.dest, route.prefix)
+        if route.next_hop:
+            text += ' via %s' % route.next_hop
+        text += ' dev %s metric %d' % (interface, route.metric)
+        if table_number(route.table) != MAIN_TABLE:
+            text += ' table %d' % route.table
+        return text
+
+    def row(self, index: int) -> Dict[str, str]:
+        """
+
+        :param index:
+        :return:
+        """
+        route, interface = self.routes[index]
+        return {
+            FAMILY: 'IPv%d' % route.family,
+            DESTINATION: '%s/%d' % (route.dest, route.prefix),
+            NEXT_HOP: route.next_hop,
+            METRIC: str(route.metric),
+            TABLE: str(table_number(route.table)),
+            DEVICE_NAME: interface,
+        }
+
+    def rows(self) -> Iterator[Dict[str, str]]:
+        """
+
+        :return:
+        """
+        return (self.row(i) for i in range(len(self.routes)))
+
+    def as_table(self) -> Tuple[Columns, Iterator[Dict[str, str]]]:
+        """
+        The routes as a streamed table, for headless dumps.
+
+        :return:
+        """
+        return COLUMNS, self.rows()
+
+    def tables(self) -> List[int]:
+        """
+        Return the numbers of the routing tables with routes.
+
+        :return:
+        """
+        return sorted({table for family, table in self.tries})
+
+    def lookup(self, destination: str,
+               table: int = MAIN_TABLE) -> Optional[int]:
+        """
+        Return the position of the route serving a destination address
+        in a routing table.
+
+        :param destination:
+        :param table:
+        :return:
+        :raises ValueError: if destination is not an IP address.
+        """
+        address = ipaddress.ip_address(destination.strip())
+        trie = self.tries.get((address.version, table_number(table)))
+        index = trie.lookup(int(address)) if trie is not None else -1
+        return None if index < 0 else index
+
+
+def device_routes(dev: Device) -> List[Tuple[Route, str]]:
+    """
+
+    :param dev:
+    :return:
+    """
+    routes = []
+    for family, path in ((4, dev.ip4_config), (6, dev.ip6_config)):
+        config = get_ip_config(path, family)
+        if config is not None:
+            routes.extend((route, dev.interface) for route in config.routes)
+    return routes
+
+
+@provider(cost=COST_HIGH)
+@cached(MANAGER, DEVICE, IP4_CONFIG, IP6_CONFIG)
+def get_routes() -> RouteTable:
+    """
+    Return the routes of every device.
+
+    :return:
+    """
+    return RouteTable([
+        pair for routes in fan_out(device_routes, get_devices())
+        for pair in routes
+    ])
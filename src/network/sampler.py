@@ -0,0 +1,98 @@
+"""
+Fixed interval background sampling.
+"""
+import threading
+import time
+from typing import Callable, Optional
+
+
+class Sampler:
+    """
+    Calls a function at a fixed interval in a daemon thread. A failing
+    call is remembered and sampling goes on, so a temporarily missing
+    NetworkManager only leaves a gap.
+    """
+    def __init__(self, name: str, func: Callable[[], None], interval: float):
+        """
+
+        :param name:
+        :param func:
+        :param interval:
+        """
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.error: Optional[Exception] = None
+
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        """
+
+        :return:
+        """
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        """
+        Start sampling. Calling it again is a no-op. Right after
+        :meth:`stop`, waits for the previous thread to finish its
+        sample first.
+
+        :return:
+        """
+        with self._lock:
+            if self.running and not self._stop.is_set():
+                return
+
+            self.join()
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Ask the thread to stop, without waiting for a sample in
+        progress; see :meth:`join`.
+
+        :return:
+        """
+        self._stop.set()
+
+    def join(self, timeout: Optional[float] = None) -> None:
+        """
+        Wait for the thread to end after :meth:`stop`. No-op from the
+        sampling thread itself.
+
+        :param timeout:
+        :return:
+        """
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+
+    def _run(self) -> None:
+        """
+        Sample on a fixed schedule; a slow call doesn't shift the ones
+        after it.
+
+        :return:
+        """
+        deadline = time.monotonic()
+
+        while not self._stop.is_set():
+            try:
+                self.func()
+                self.error = None
+            except Exception as e:
+                self.error = e
+
+            deadline += self.interval
+            now = time.monotonic()
+            if deadline < now:
+                deadline = now
+            self._stop.wait(deadline - now)
@@ -0,0 +1,50 @@
+"""
+Short lived store for connection secrets.
+
+Secrets go through the secret agent and polkit, so they are only fetched
+when the user asks for them, kept for at most :data:`SECRETS_TTL` seconds
+and wiped as soon as the popup showing them is closed.
+"""
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+SECRETS_TTL = 60.0
+
+_secrets: Dict[str, Tuple[float, dict]] = {}
+_lock = threading.Lock()
+
+
+def get(path: str) -> Optional[dict]:
+    """
+    Return the stored secrets of a connection, if still fresh.
+
+    :param path:
+    :return:
+    """
+    with _lock:
+        entry = _secrets.get(path)
+        if entry is not None and entry[0] > time.monotonic():
+            return entry[1]
+    return None
+
+
+def put(path: str, secrets: dict) -> None:
+    """
+
+    :param path:
+    :param secrets:
+    :return:
+    """
+    with _lock:
+        _secrets[path] = (time.monotonic() + SECRETS_TTL, secrets)
+
+
+def clear() -> None:
+    """
+    Forget every stored secret.
+
+    :return:
+    """
+    with _lock:
+        _secrets.clear()
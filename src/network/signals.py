@@ -0,0 +1,113 @@
+"""
+NetworkManager signal subscriptions.
+
+dbus-python only delivers signals to connections attached to a main loop
+and Kivy doesn't run one, so signals are received on a private system bus
+connection whose GLib main loop runs in a daemon thread. Callbacks are
+invoked from that thread.
+"""
+import threading
+from typing import Callable, List, Optional
+
+import dbus
+from dbus.mainloop.glib import DBusGMainLoop, threads_init
+from gi.repository import GLib
+
+from network.properties import (
+    NM_BUS_NAME, PROPERTIES_IFACE, NM_IFACE, WIRELESS_IFACE, SETTINGS_IFACE,
+    CONNECTION_IFACE
+)
+
+# callback(signal, interface, path, args)
+Callback = Callable[[str, str, str, tuple], None]
+
+SIGNALS = (
+    ('PropertiesChanged', PROPERTIES_IFACE),
+    ('DeviceAdded', NM_IFACE),
+    ('DeviceRemoved', NM_IFACE),
+    ('CheckPermissions', NM_IFACE),
+    ('AccessPointAdded', WIRELESS_IFACE),
+    ('AccessPointRemoved', WIRELESS_IFACE),
+    ('NewConnection', SETTINGS_IFACE),
+    ('ConnectionRemoved', SETTINGS_IFACE),
+    ('Updated', CONNECTION_IFACE),
+    ('Removed', CONNECTION_IFACE),
+)
+
+_callbacks: List[Callback] = []
+_lock = threading.Lock()
+_loop: Optional[GLib.MainLoop] = None
+
+
+def _dispatch(*args, signal: str = '', interface: str = '',
+              path: str = '') -> None:
+    """
+    Forward a received signal to every subscriber. For
+    ``PropertiesChanged`` the interface is the one whose properties
+    changed, not the properties interface itself.
+
+    :param args:
+    :param signal:
+    :param interface:
+    :param path:
+    :return:
+    """
+    if signal == 'PropertiesChanged' and args:
+        interface = str(args[0])
+
+    with _lock:
+        callbacks = list(_callbacks)
+
+    for callback in callbacks:
+        callback(signal, interface, path, args)
+
+
+def start() -> None:
+    """
+    Subscribe to NetworkManager signals and run the main loop in a
+    background thread. Calling it again is a no-op.
+
+    :return:
+    """
+    global _loop
+
+    with _lock:
+        if _loop is not None:
+            return
+
+        threads_init()
+        bus = dbus.SystemBus(private=True, mainloop=DBusGMainLoop())
+
+        for signal, interface in SIGNALS:
+            bus.add_signal_receiver(
+                _dispatch, signal_name=signal, dbus_interface=interface,
+                bus_name=NM_BUS_NAME, member_keyword='signal',
+                interface_keyword='interface', path_keyword='path')
+
+        _loop = GLib.MainLoop()
+        threading.Thread(
+            target=_loop.run, name='nm-signals', daemon=True).start()
+
+
+def connect(callback: Callback) -> None:
+    """
+    Register a callback for NetworkManager signals, starting the
+    listener if needed.
+
+    :param callback:
+    :return:
+    """
+    start()
+    with _lock:
+        _callbacks.append(callback)
+
+
+def disconnect(callback: Callback) -> None:
+    """
+
+    :param callback:
+    :return:
+    """
+    with _lock:
+        if callback in _callbacks:
+            _callbacks.remove(callback)
@@ -0,0 +1,229 @@
+"""
+Last known provider data, kept on disk between runs.
+
+The data shown by each panel is saved when the application stops and the
+file is memory-mapped when it starts, so a panel opened before its
+provider answered shows the previous data at once, marked stale. Loading
+only parses the header; an entry is decompressed the first time it is
+asked for. Volatile subtrees (secrets) and subtrees that were never
+generated are not saved.
+
+Layout: :data:`MAGIC`, the header length (4 bytes, big endian), the header
+(JSON, path -> ``[offset, length]`` from the end of the header) and the
+entries, each one zlib compressed JSON.
+"""
+import json
+import mmap
+import os
+import struct
+import threading
+import zlib
+from typing import Dict, Optional, Set, Tuple, Union
+
+from widgets.data import Table, Tree, is_tree
+
+MAGIC = b'KVNMSNAP1'
+_LENGTH = struct.Struct('>I')
+
+Data = Union[Table, Tree]
+
+
+def strip_tree(node: Tree) -> Tree:
+    """
+    Return a copy of the generated part of a tree, without its volatile
+    subtrees.
+
+    :param node:
+    :return:
+    """
+    children = node['children']
+    if not isinstance(children, list):
+        children = []
+
+    return {
+        'node_id': str(node['node_id']),
+        'children': [
+            strip_tree(child) for child in children
+            if not child.get('volatile')
+        ]
+    }
+
+
+def encode(data: Data) -> bytes:
+    """
+
+    :param data:
+    :return:
+    """
+    if is_tree(data):
+        obj = {'tree': strip_tree(data)}
+    else:
+        cols, rows = data
+        obj = {'columns': cols, 'rows': rows}
+    return zlib.compress(json.dumps(obj, separators=(',', ':')).encode())
+
+
+def decode(raw: bytes) -> Data:
+    """
+
+    :param raw:
+    :return:
+    """
+    obj = json.loads(zlib.decompress(raw).decode())
+    if 'tree' in obj:
+        return obj['tree']
+    return obj['columns'], obj['rows']
+
+
+class Snapshot:
+    """
+    Provider data by provider path, read from and written to one file.
+    """
+    def __init__(self):
+        self.path: Optional[str] = None
+
+        self._map: Optional[mmap.mmap] = None
+        self._base = 0
+        self._offsets: Dict[str, Tuple[int, int]] = {}
+        self._data: Dict[str, Data] = {}
+        self._changed: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._data or key in self._offsets
+
+    def open(self, path: str) -> None:
+        """
+        Map the snapshot file, if any. A missing, truncated or foreign
+        file leaves the snapshot empty.
+
+        :param path:
+        :return:
+        """
+        self.close()
+        self.path = path
+
+        try:
+            with open(path, 'rb') as file:
+                mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            # ValueError: empty file.
+            return
+
+        try:
+            start = len(MAGIC) + _LENGTH.size
+            if mapped[:len(MAGIC)] != MAGIC:
+                raise ValueError('not a snapshot')
+            length, = _LENGTH.unpack(mapped[len(MAGIC):start])
+            header = json.loads(mapped[start:start + length].decode())
+            offsets = {
+                key: (int(offset), int(size))
+                for key, (offset, size) in header.items()
+            }
+        except (ValueError, TypeError, struct.error):
+            mapped.close()
+            return
+
+        self._map = mapped
+        self._base = start + length
+        self._offsets = offsets
+
+    def _raw(self, key: str) -> Optional[bytes]:
+        """
+
+        :param key:
+        :return:
+        """
+        if self._map is None or key not in self._offsets:
+            return None
+        offset, size = self._offsets[key]
+        return self._map[self._base + offset:self._base + offset + size]
+
+    def get(self, key: str) -> Optional[Data]:
+        """
+        Return the saved data of a provider, None if there is none or
+        it can't be read.
+
+        :param key:
+        :return:
+        """
+        with self._lock:
+            if key in self._data:
+                return self._data[key]
+
+            raw = self._raw(key)
+            if raw is None:
+                return None
+            try:
+                data = decode(raw)
+            except (ValueError, KeyError, zlib.error):
+                del self._offsets[key]
+                return None
+
+            self._data[key] = data
+            return data
+
+    def put(self, key: str, data: Data) -> None:
+        """
+        Remember the data shown for a provider. It is only copied and
+        encoded when saved.
+
+        :param key:
+        :param data:
+        :return:
+        """
+        if not is_tree(data):
+            cols, rows = data
+            data = (cols, list(rows))
+
+        with self._lock:
+            self._data[key] = data
+            self._changed.add(key)
+
+    def save(self) -> None:
+        """
+        Write the snapshot, replacing the file at once.
+
+        :return:
+        """
+        if self.path is None:
+            return
+
+        with self._lock:
+            entries: Dict[str, bytes] = {}
+            for key in set(self._offsets) | self._changed:
+                if key in self._changed:
+                    entries[key] = encode(self._data[key])
+                else:
+                    entries[key] = self._raw(key)
+
+        header, offset = {}, 0
+        for key, raw in entries.items():
+            header[key] = [offset, len(raw)]
+            offset += len(raw)
+        header_bytes = json.dumps(header, separators=(',', ':')).encode()
+
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'wb') as file:
+            file.write(MAGIC)
+            file.write(_LENGTH.pack(len(header_bytes)))
+            file.write(header_bytes)
+            for raw in entries.values():
+                file.write(raw)
+        os.replace(tmp_path, self.path)
+
+    def close(self) -> None:
+        """
+
+        :return:
+        """
+        with self._lock:
+            if self._map is not None:
+                self._map.close()
+            self._map = None
+            self._offsets = {}
+            self._data.clear()
+            self._changed.clear()
+
+
+snapshot = Snapshot()
@@ -1,35 +1,210 @@
-import NetworkManager
+from typing import Callable, Dict, Hashable, Iterator, List, Tuple
 
-from widgets.tableview import Table, Columns, Rows, h
+import NetworkManager
 
-__c = NetworkManager.const
-__NM = NetworkManager.NetworkManager
+from widgets.data import Table, StreamTable, Columns, Rows, h
+from network.properties import (
+    AccessPoint, get_devices, get_access_point, get_wireless
+)
+from network.collector import fan_out
+from network.cache import (
+    cache, cached, MANAGER, DEVICE, ACCESS_POINT, HISTORY
+)
+from network.history import History, INTERVAL
+from network.sampler import Sampler
 
 SSID, FREQUENCY, STRENGTH = 'ssid', 'frequency', 'strength'
+BAND, BSSID, APS = 'band', 'bssid', 'aps'
+MIN, AVG, MAX, TREND = 'min', 'avg', 'max', 'trend'
+
+# Aggregation keys and policies.
+BY_SSID, BY_BAND, BY_BSSID = 'ssid', 'band', 'bssid'
+STRONGEST, MOST_RECENT = 'strongest', 'most_recent'
+
+GROUP_KEYS: Dict[str, Callable[[AccessPoint], Hashable]] = {
+    BY_SSID: lambda ap: ap.ssid,
+    BY_BAND: lambda ap: (ap.ssid, band(ap.frequency)),
+    BY_BSSID: lambda ap: ap.bssid,
+}
+POLICIES: Dict[str, Callable[[AccessPoint], Tuple]] = {
+    STRONGEST: lambda ap: (ap.strength, ap.last_seen),
+    MOST_RECENT: lambda ap: (ap.last_seen, ap.strength),
+}
+
+history = History()
+
+
+def sample_history() -> None:
+    """
+    Record the strength of every visible access point.
+
+    :return:
+    """
+    history.record(
+        (ap.bssid, ap.strength, ap.frequency)
+        for ap in visible_access_points()
+    )
+    cache.invalidate_tags(HISTORY)
+
+
+sampler = Sampler('kvnm-history', sample_history, INTERVAL)
+
+
+def band(frequency: int) -> str:
+    """
+    Return the Wi-Fi band of a frequency in MHz.
+
+    :param frequency:
+    :return:
+    """
+    if frequency < 3000:
+        return '2.4GHz'
+    if frequency < 5925:
+        return '5GHz'
+    return '6GHz'
+
+
+@cached(DEVICE, ACCESS_POINT)
+def scan_results(device: str) -> List[AccessPoint]:
+    """
+    Return the access points of a wireless device. The records are
+    reused until a device or access point signal (a new scan, a
+    strength change, an access point added or removed) drops them.
+    Removing a device drops the entries of every device.
+
+    :param device:
+    :return:
+    """
+    return fan_out(get_access_point, get_wireless(device).access_points)
+
+
+def has_wireless() -> bool:
+    """
+    Return True if NetworkManager has a wireless device.
+
+    :return:
+    """
+    return any(
+        dev.device_type == NetworkManager.NM_DEVICE_TYPE_WIFI
+        for dev in get_devices()
+    )
+
+
+def visible_access_points() -> List[AccessPoint]:
+    """
+    Return the access points seen by every wireless device.
 
+    :return:
+    """
+    return [
+        ap
+        for dev in get_devices()
+        if dev.device_type == NetworkManager.NM_DEVICE_TYPE_WIFI
+        for ap in scan_results(dev.path)
+    ]
 
-def get_ssids() -> Table:
+
+def aggregate(aps: List[AccessPoint], group: str = BY_SSID,
+              keep: str = STRONGEST) -> List[Tuple[AccessPoint, int]]:
     """
-    Return all visible SSIDs.
+    Group access points, keep one per group according to the policy
+    and return ``(access point, group size)`` pairs, strongest first.
 
+    :param aps:
+    :param group:
+    :param keep:
+    :return:
+    """
+    key, rank = GROUP_KEYS[group], POLICIES[keep]
+    groups: Dict[Hashable, List] = {}
+
+    for ap in aps:
+        entry = groups.get(key(ap))
+        if entry is None:
+            groups[key(ap)] = [ap, 1]
+        else:
+            entry[1] += 1
+            if rank(ap) > rank(entry[0]):
+                entry[0] = ap
+
+    return sorted(
+        ((ap, count) for ap, count in groups.values()),
+        key=lambda item: item[0].strength, reverse=True)
+
+
+def _aggregated_table(group: str) -> Table:
+    """
+
+    :param group:
     :return:
     """
     cols: Columns = [
         {'title': h(field), 'key': field, 'hint_text': ''}
-        for field in (SSID, FREQUENCY, STRENGTH)
+        for field in (SSID, BAND, FREQUENCY, STRENGTH, BSSID, APS)
     ]
-    rows: Rows = [{col['key']: col['title'] for col in cols}]
+    rows: Rows = []
+
+    for ap, count in aggregate(visible_access_points(), group):
+        rows.append({
+            SSID: str(ap.ssid),
+            BAND: band(ap.frequency),
+            FREQUENCY: str(ap.frequency)+'MHz',
+            STRENGTH: str(ap.strength),
+            BSSID: str(ap.bssid),
+            APS: str(count),
+        })
+    return cols, rows
 
-    for dev in __NM.GetDevices():
-        if dev.DeviceType != NetworkManager.NM_DEVICE_TYPE_WIFI:
-            continue
 
-        for ap in dev.GetAccessPoints():
-            rows.append({
-                SSID: str(ap.Ssid),
-                FREQUENCY: str(ap.Frequency)+'MHz',
-                STRENGTH: str(ap.Strength)
-            })
+@cached(MANAGER, DEVICE, ACCESS_POINT, HISTORY)
+def get_ssids() -> StreamTable:
+    """
+    Return all visible SSIDs, streamed one device at a time, with the
+    strength recorded by the history sampler.
 
-    return cols, rows
+    :return:
+    """
+    cols: Columns = [
+        {'title': h(field), 'key': field, 'hint_text': ''}
+        for field in (SSID, FREQUENCY, STRENGTH, MIN, AVG, MAX, TREND)
+    ]
+
+    def rows() -> Iterator[Dict[str, str]]:
+        for dev in get_devices():
+            if dev.device_type != NetworkManager.NM_DEVICE_TYPE_WIFI:
+                continue
+            for ap in scan_results(dev.path):
+                stats = history.stats(ap.bssid)
+                yield {
+                    SSID: str(ap.ssid),
+                    FREQUENCY: str(ap.frequency)+'MHz',
+                    STRENGTH: str(ap.strength),
+                    MIN: str(stats.min) if stats else '',
+                    AVG: '%.0f' % stats.avg if stats else '',
+                    MAX: str(stats.max) if stats else '',
+                    TREND: history.sparkline(ap.bssid),
+                }
+
+    return cols, rows()
+
+
+@cached(MANAGER, DEVICE, ACCESS_POINT)
+def get_ssids_aggregated() -> Table:
+    """
+    Return one row per SSID, the strongest access point of each,
+    sorted by strength.
 
+    :return:
+    """
+    return _aggregated_table(BY_SSID)
+
+
+@cached(MANAGER, DEVICE, ACCESS_POINT)
+def get_ssids_by_band() -> Table:
+    """
+    Return one row per SSID and band, the strongest access point of
+    each, sorted by strength.
+
+    :return:
+    """
+    return _aggregated_table(BY_BAND)
@@ -0,0 +1,220 @@
+"""
+Per device traffic rates.
+
+A sampler reads the RX/TX byte counters of every device at a fixed
+interval, one ``GetAll`` of ``Device.Statistics`` per device, fanned out.
+NetworkManager only updates the counters while ``RefreshRateMs`` is set,
+so it is set when sampling starts, and set back to 0 when it stops;
+devices whose counters can't be read that way (no permission, older
+NetworkManager) are read from ``/sys/class/net/<interface>/statistics``
+instead. Sampling is started from worker threads and stopped from the
+main thread, one at a time.
+"""
+import os
+import threading
+import time
+from collections import namedtuple
+from typing import Dict, List, Optional, Tuple
+
+from dbus.exceptions import DBusException
+
+from network.properties import (
+    Device, get_devices, get_statistics, set_refresh_rate
+)
+from network.collector import fan_out
+from network.cache import cache, TRAFFIC
+from network.sampler import Sampler
+
+DEFAULT_REFRESH_RATE_MS = 1000
+SYS_CLASS_NET = '/sys/class/net'
+UNITS = ('B', 'KB', 'MB', 'GB', 'TB')
+
+Counters = namedtuple('Counters', ['rx_bytes', 'tx_bytes'])
+# Bytes per second and byte totals.
+Rates = namedtuple('Rates', ['rx', 'tx', 'rx_bytes', 'tx_bytes'])
+
+
+def read_sysfs(interface: str) -> Optional[Counters]:
+    """
+    Return the kernel counters of a network interface.
+
+    :param interface:
+    :return:
+    """
+    path = os.path.join(SYS_CLASS_NET, interface, 'statistics')
+
+    try:
+        with open(os.path.join(path, 'rx_bytes')) as rx, \
+                open(os.path.join(path, 'tx_bytes')) as tx:
+            return Counters(int(rx.read()), int(tx.read()))
+    except (OSError, ValueError):
+        return None
+
+
+def read_counters(dev: Device) -> Optional[Counters]:
+    """
+
+    :param dev:
+    :return:
+    """
+    try:
+        stats = get_statistics(dev.path)
+        if stats.refresh_rate_ms:
+            return Counters(stats.rx_bytes, stats.tx_bytes)
+    except DBusException:
+        pass
+    return read_sysfs(dev.interface)
+
+
+def format_bytes(value: float, suffix: str = '') -> str:
+    """
+
+    :param value:
+    :param suffix:
+    :return:
+    """
+    for unit in UNITS[:-1]:
+        if abs(value) < 1024:
+            return '%.1f %s%s' % (value, unit, suffix)
+        value /= 1024
+    return '%.1f %s%s' % (value, UNITS[-1], suffix)
+
+
+class Traffic:
+    """
+    Turns successive counter readings into rates, by interface name.
+    """
+    def __init__(self):
+        self._previous: Dict[str, Tuple[float, Counters]] = {}
+        self._rates: Dict[str, Rates] = {}
+        self._lock = threading.Lock()
+
+    def update(self, counters: Dict[str, Counters],
+               now: Optional[float] = None) -> None:
+        """
+
+        :param counters:
+        :param now:
+        :return:
+        """
+        now = time.monotonic() if now is None else now
+
+        with self._lock:
+            for interface, current in counters.items():
+                previous = self._previous.get(interface)
+                self._previous[interface] = (now, current)
+                if previous is None or now <= previous[0]:
+                    continue
+
+                elapsed = now - previous[0]
+                # Counters restart when a device goes away and back.
+                rx = max(current.rx_bytes - previous[1].rx_bytes, 0)
+                tx = max(current.tx_bytes - previous[1].tx_bytes, 0)
+                self._rates[interface] = Rates(
+                    rx=rx / elapsed, tx=tx / elapsed,
+                    rx_bytes=current.rx_bytes, tx_bytes=current.tx_bytes)
+
+            for interface in set(self._previous) - set(counters):
+                del self._previous[interface]
+                self._rates.pop(interface, None)
+
+    def get(self, interface: str) -> Optional[Rates]:
+        """
+
+        :param interface:
+        :return:
+        """
+        with self._lock:
+            return self._rates.get(interface)
+
+    def clear(self) -> None:
+        """
+
+        :return:
+        """
+        with self._lock:
+            self._previous.clear()
+            self._rates.clear()
+
+
+def sample_traffic() -> None:
+    """
+    Read the counters of every device in one batch.
+
+    :return:
+    """
+    devices = get_devices()
+    counters = fan_out(read_counters, devices)
+
+    traffic.update({
+        dev.interface: value
+        for dev, value in zip(devices, counters) if value is not None
+    })
+    cache.invalidate_tags(TRAFFIC)
+
+
+def start(refresh_rate_ms: int = DEFAULT_REFRESH_RATE_MS) -> None:
+    """
+    Ask NetworkManager to update the counters at the given rate and
+    sample them at the same rate.
+
+    :param refresh_rate_ms:
+    :return:
+    """
+    global sampler
+
+    with _lock:
+        previous = sampler
+        stop()
+        if previous is not None:
+            # A sample in progress would fill the cleared rates again.
+            previous.join()
+
+        for dev in get_devices():
+            try:
+                set_refresh_rate(dev.path, refresh_rate_ms)
+            except DBusException:
+                continue
+            refreshed.append(dev.path)
+
+        sampler = Sampler(
+            'kvnm-traffic', sample_traffic, refresh_rate_ms / 1000)
+        sampler.start()
+
+
+def stop() -> None:
+    """
+    Stop sampling and let NetworkManager stop updating the counters
+    of the devices it was asked to.
+
+    :return:
+    """
+    global sampler
+
+    with _lock:
+        if sampler is not None:
+            sampler.stop()
+            sampler = None
+        traffic.clear()
+
+        while refreshed:
+            try:
+                set_refresh_rate(refreshed.pop(), 0)
+            except DBusException:
+                pass
+
+
+def running() -> bool:
+    """
+
+    :return:
+    """
+    return sampler is not None
+
+
+traffic = Traffic()
+sampler: Optional[Sampler] = None
+# Paths of the devices whose RefreshRateMs was set.
+refreshed: List[str] = []
+# Held by start() and stop(), start() calls stop().
+_lock = threading.RLock()
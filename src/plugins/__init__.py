@@ -0,0 +1,146 @@
+"""
+Settings panels declared by plugins.
+
+A plugin is a :class:`Plugin` declaration: its panel, the config defaults of
+its section, the dotted paths of its providers and their cache policy.
+Declarations are found in the modules and packages of this directory (a
+module-level ``PLUGIN``) and in the ``kvnm.plugins`` entry point group.
+
+Declaration modules are imported at startup and must stay cheap: provider
+paths are strings, and the modules they name are only imported, in a worker
+thread, the first time a panel using them is opened.
+"""
+import importlib
+import pkgutil
+from collections import namedtuple
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from network.registry import COST_LOW
+
+ENTRY_POINT_GROUP = 'kvnm.plugins'
+
+# Invalidating one of tags drops the provider results; they also expire
+# after ttl seconds, the cache default if None.
+CachePolicy = namedtuple('CachePolicy', ['tags', 'ttl'])
+CachePolicy.__new__.__defaults__ = ((), None)
+
+# name: unique plugin name; title: panel title; section: config section;
+# panel: settings entries, as in the files of ``src/json``, the section
+# may be left out; providers: config key -> provider path; options:
+# other config defaults, None for none; cache: CachePolicy applied to
+# the providers that don't use :func:`~network.cache.cached` themselves;
+# cost: hint passed to the registry.
+Plugin = namedtuple('Plugin', [
+    'name', 'title', 'section', 'panel', 'providers', 'options', 'cache',
+    'cost'])
+Plugin.__new__.__defaults__ = (None, None, COST_LOW)
+
+_plugins: Optional[List[Plugin]] = None
+_errors: Dict[str, Exception] = {}
+
+
+def panel_data(plugin: Plugin) -> List[Dict[str, Any]]:
+    """
+    Return the panel entries with their section filled in.
+
+    :param plugin:
+    :return:
+    """
+    return [{'section': plugin.section, **entry} for entry in plugin.panel]
+
+
+def defaults(plugin: Plugin) -> Dict[str, str]:
+    """
+    Return the config defaults of the plugin section.
+
+    :param plugin:
+    :return:
+    """
+    return {**(plugin.options or {}), **plugin.providers}
+
+
+def _entry_points() -> Iterator[Any]:
+    """
+
+    :return:
+    """
+    try:
+        from importlib.metadata import entry_points
+    except ImportError:
+        return iter(())
+
+    eps = entry_points()
+    if hasattr(eps, 'select'):
+        return iter(eps.select(group=ENTRY_POINT_GROUP))
+    return iter(eps.get(ENTRY_POINT_GROUP, ()))
+
+
+def _declaration(obj: Any) -> Plugin:
+    """
+    Accept a Plugin or a module defining ``PLUGIN``.
+
+    :param obj:
+    :return:
+    """
+    obj = getattr(obj, 'PLUGIN', obj)
+    if not isinstance(obj, Plugin):
+        raise TypeError(f'{obj!r} is not a Plugin declaration')
+    return obj
+
+
+def _find() -> Iterator[Tuple[str, Any]]:
+    """
+    Yield ``(origin, loader)`` pairs for every candidate declaration.
+
+    :return:
+    """
+    for info in pkgutil.iter_modules(__path__):
+        if not info.name.startswith('_'):
+            name = f'{__name__}.{info.name}'
+            yield name, lambda name=name: importlib.import_module(name)
+
+    for ep in _entry_points():
+        yield f'{ENTRY_POINT_GROUP}:{ep.name}', ep.load
+
+
+def discover() -> List[Plugin]:
+    """
+    Return the declared plugins, found once. Declarations that fail to
+    load, or whose name or section is taken, are left out and reported
+    by :func:`errors`.
+
+    :return:
+    """
+    global _plugins
+
+    if _plugins is not None:
+        return _plugins
+
+    plugins: List[Plugin] = []
+    names, sections = set(), set()
+
+    for origin, load in _find():
+        try:
+            plugin = _declaration(load())
+            if plugin.name in names or plugin.section in sections:
+                raise ValueError(
+                    f'plugin {plugin.name!r} or section '
+                    f'{plugin.section!r} declared twice')
+        except Exception as e:
+            _errors[origin] = e
+            continue
+
+        names.add(plugin.name)
+        sections.add(plugin.section)
+        plugins.append(plugin)
+
+    _plugins = plugins
+    return plugins
+
+
+def errors() -> Dict[str, Exception]:
+    """
+
+    :return:
+    """
+    return dict(_errors)
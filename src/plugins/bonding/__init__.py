@@ -0,0 +1,18 @@
+"""
+Bond devices and their ports.
+"""
+from plugins import Plugin, CachePolicy
+from network.cache import MANAGER, DEVICE
+
+PLUGIN = Plugin(
+    name='bonding',
+    title='Bonding',
+    section='bonding',
+    panel=[{
+        "type": "table",
+        "title": "Bond devices",
+        "key": "bonds",
+    }],
+    providers={'bonds': 'plugins.bonding.provider.get_bonds'},
+    cache=CachePolicy(tags=(MANAGER, DEVICE)),
+)
@@ -0,0 +1,53 @@
+from typing import Dict, Iterator
+
+from widgets.data import StreamTable, Columns, h
+from network.properties import DEVICE_IFACE, get_all, get_device, get_devices
+from network.collector import stream
+
+BOND_IFACE = DEVICE_IFACE + '.Bond'
+# NM_DEVICE_TYPE_BOND
+DEVICE_TYPE_BOND = 10
+
+NAME, CARRIER, PORTS = 'name', 'carrier', 'ports'
+
+
+def bond_row(path: str) -> Dict[str, str]:
+    """
+    Read the ports from the ``Ports`` device property, falling back to
+    ``Slaves``, deprecated since NetworkManager 1.34, on older versions.
+
+    :param path:
+    :return:
+    """
+    device = get_all(path, DEVICE_IFACE)
+    props = get_all(path, BOND_IFACE)
+    port_paths = device['Ports'] if 'Ports' in device \
+        else props.get('Slaves', [])
+    ports = [get_device(port).interface for port in port_paths]
+
+    return {
+        NAME: str(device.get('Interface', '')),
+        CARRIER: str(props.get('Carrier', False)),
+        PORTS: ', '.join(ports),
+    }
+
+
+def get_bonds() -> StreamTable:
+    """
+    Return the bond devices with the interfaces enslaved to them.
+
+    :return:
+    """
+    cols: Columns = [
+        {'title': h(field), 'key': field, 'hint_text': ''}
+        for field in (NAME, CARRIER, PORTS)
+    ]
+
+    def rows() -> Iterator[Dict[str, str]]:
+        bonds = [
+            dev.path for dev in get_devices()
+            if dev.device_type == DEVICE_TYPE_BOND
+        ]
+        yield from stream(bond_row, bonds)
+
+    return cols, rows()
@@ -0,0 +1,8 @@
+"""
+Process start time. Imported first by ``main.py``, before Kivy, and only
+once: modules that need it import it from here rather than from ``main``,
+which runs a second time when imported from the script.
+"""
+import time
+
+START_TIME = time.perf_counter()
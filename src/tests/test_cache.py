@@ -0,0 +1,111 @@
+import time
+
+from network.cache import SnapshotCache, cached, cache, kind_of, DEVICE
+
+
+def test_put_and_lookup():
+    snapshot = SnapshotCache()
+
+    assert snapshot.lookup('key') == (False, None)
+    snapshot.put('key', 1)
+    assert snapshot.lookup('key') == (True, 1)
+    assert snapshot.stats()['hits'] == 1
+    assert snapshot.stats()['misses'] == 1
+
+
+def test_entries_expire():
+    snapshot = SnapshotCache(ttl=0)
+
+    snapshot.put('key', 1)
+    time.sleep(.001)
+    assert snapshot.lookup('key') == (False, None)
+
+
+def test_least_recently_used_entries_are_evicted():
+    snapshot = SnapshotCache(maxsize=2)
+
+    snapshot.put('a', 1)
+    snapshot.put('b', 2)
+    snapshot.lookup('a')
+    snapshot.put('c', 3)
+
+    assert snapshot.lookup('b') == (False, None)
+    assert snapshot.lookup('a') == (True, 1)
+    assert snapshot.stats()['evictions'] == 1
+
+
+def test_invalidate_tags_drops_tagged_entries_only():
+    snapshot = SnapshotCache()
+    notified = []
+    snapshot.subscribe(notified.append)
+
+    snapshot.put('devices', 1, tags=('device',))
+    snapshot.put('ssids', 2, tags=('access_point', 'device'))
+    snapshot.put('info', 3, tags=('manager',))
+    snapshot.invalidate_tags('device')
+
+    assert snapshot.lookup('devices') == (False, None)
+    assert snapshot.lookup('ssids') == (False, None)
+    assert snapshot.lookup('info') == (True, 3)
+    assert notified == [('device',)]
+
+
+def test_put_is_dropped_after_an_invalidation():
+    snapshot = SnapshotCache()
+
+    generation = snapshot.generation(('device',))
+    snapshot.invalidate_tags('manager')
+    snapshot.put('unrelated', 1, ('device',), generation=generation)
+    assert snapshot.lookup('unrelated') == (True, 1)
+
+    generation = snapshot.generation(('device',))
+    snapshot.invalidate_tags('device')
+    snapshot.put('stale', 1, ('device',), generation=generation)
+    assert snapshot.lookup('stale') == (False, None)
+
+    generation = snapshot.generation()
+    snapshot.clear()
+    snapshot.put('cleared', 1, generation=generation)
+    assert snapshot.lookup('cleared') == (False, None)
+
+
+def test_get_loads_once():
+    snapshot = SnapshotCache()
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return 'value'
+
+    assert snapshot.get('key', loader) == 'value'
+    assert snapshot.get('key', loader) == 'value'
+    assert len(calls) == 1
+
+
+def test_cached_stores_streams_once_read():
+    calls = []
+
+    @cached(DEVICE)
+    def provider(name):
+        calls.append(name)
+        return [{'key': 'name'}], iter([{'name': name}])
+
+    cache.clear()
+    cols, rows = provider('eth0')
+    assert not isinstance(rows, list)
+    assert list(rows) == [{'name': 'eth0'}]
+
+    assert provider('eth0') == ([{'key': 'name'}], [{'name': 'eth0'}])
+    assert calls == ['eth0']
+
+    cache.invalidate_tags(DEVICE)
+    list(provider('eth0')[1])
+    assert calls == ['eth0', 'eth0']
+
+
+def test_kind_of_maps_device_subtypes():
+    assert kind_of('org.freedesktop.NetworkManager') == 'manager'
+    assert kind_of('org.freedesktop.NetworkManager.Device.Wireless') == \
+        'device'
+    assert kind_of('org.freedesktop.NetworkManager.IP6Config') == \
+        'ip6_config'
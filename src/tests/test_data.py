@@ -0,0 +1,109 @@
+from widgets.data import (
+    CompactTree, Node, generate_children, has_children, is_tree,
+    node_children, store_children
+)
+
+
+def build_tree():
+    tree = CompactTree('Active connections')
+    conn = tree.add(0, 'Connection: %s', ('home',))
+    tree.add(conn, 'ipv4')
+    tree.add(conn, 'ipv6')
+    tree.add(0, 'Connection: %s', ('work',))
+    return tree
+
+
+def labels(nodes):
+    return [node['node_id'] for node in nodes]
+
+
+def test_labels_are_formatted_when_read():
+    tree = build_tree()
+
+    assert tree.root['node_id'] == 'Active connections'
+    assert labels(tree.root['children']) == [
+        'Connection: home', 'Connection: work']
+
+
+def test_children_keep_insertion_order():
+    tree = build_tree()
+    home = tree.root['children'][0]
+
+    assert labels(home['children']) == ['ipv4', 'ipv6']
+    assert list(tree.child_indices(0)) == [1, 4]
+    assert has_children(home)
+    assert not has_children(tree.root['children'][1])
+
+
+def test_nodes_compare_by_tree_and_index():
+    tree = build_tree()
+
+    assert tree.root is tree.root
+    assert Node(tree, 1) == tree.root['children'][0]
+    assert Node(tree, 1) != Node(build_tree(), 1)
+    assert len({Node(tree, 1), Node(tree, 1)}) == 1
+
+
+def test_node_reads_like_a_tree_dict():
+    tree = CompactTree('root')
+    tree.add(0, 'secret', children=lambda: [], volatile=True)
+    node = tree.root['children'][0]
+
+    assert is_tree(node)
+    assert is_tree({'node_id': 'x', 'children': []})
+    assert not is_tree(([], []))
+    assert 'volatile' in node
+    assert node.get('volatile') is True
+    assert node.get('background') is False
+    assert node.get('missing', 'default') == 'default'
+
+
+def test_generated_children_are_stored():
+    calls = []
+
+    def children():
+        calls.append(1)
+        return [{'node_id': 'eth0', 'children': []}]
+
+    tree = CompactTree('root')
+    tree.add(0, 'devices', children=children, background=True)
+    node = tree.root['children'][0]
+
+    assert has_children(node)
+    assert labels(node_children(node)) == ['eth0']
+    assert labels(node_children(node)) == ['eth0']
+    assert len(calls) == 1
+
+
+def test_volatile_children_are_generated_every_time():
+    calls = []
+
+    def children():
+        calls.append(1)
+        return []
+
+    tree = CompactTree('root')
+    tree.add(0, 'Secrets', children=children, volatile=True)
+    node = tree.root['children'][0]
+
+    node_children(node)
+    node_children(node)
+    assert len(calls) == 2
+    assert callable(node['children'])
+
+
+def test_generate_children_leaves_the_tree_unchanged():
+    tree = CompactTree('root')
+    tree.add(0, 'devices', children=lambda: [{'node_id': 'eth0',
+                                              'children': []}])
+    node = tree.root['children'][0]
+
+    children = generate_children(node)
+    assert callable(node['children'])
+
+    store_children(node, children)
+    assert node['children'] is children
+
+    # Already stored children are not replaced.
+    store_children(node, [])
+    assert node['children'] is children
@@ -0,0 +1,89 @@
+from widgets.data import CompactTree, node_children
+from widgets.index import TableIndex, TreeIndex, sort_key
+
+ROWS = [
+    {'ssid': 'home', 'frequency': '2412 MHz'},
+    {'ssid': 'Office', 'frequency': '900 MHz'},
+    {'ssid': 'home-5g', 'frequency': '5180 MHz'},
+]
+
+
+def test_sort_key_orders_numbers_by_value():
+    values = ['2412 MHz', '900 MHz', '5180 MHz']
+
+    assert sorted(values, key=sort_key) == [
+        '900 MHz', '2412 MHz', '5180 MHz']
+    assert sort_key('ABC') == sort_key('abc')
+
+
+def test_table_view_sorts_and_filters():
+    index = TableIndex(['ssid', 'frequency'])
+    for row in ROWS:
+        index.add(row)
+
+    assert index.view() == [0, 1, 2]
+    assert index.view(sort='frequency') == [1, 0, 2]
+    assert index.view(sort='frequency', descending=True) == [2, 0, 1]
+    assert index.view(filters={'ssid': 'HOME'}) == [0, 2]
+    assert index.view(sort='ssid', filters={'ssid': 'home', 'frequency': '5'}) \
+        == [2]
+
+
+def test_table_set_and_truncate_update_the_index():
+    index = TableIndex(['ssid', 'frequency'])
+    for row in ROWS:
+        index.add(row)
+
+    assert not index.set(0, dict(ROWS[0]))
+    assert index.set(0, {'ssid': 'cafe', 'frequency': '2462 MHz'})
+    assert index.matching('ssid', 'home') == {2}
+    assert index.view(sort='ssid') == [0, 2, 1]
+
+    assert index.set(5, {'ssid': 'new', 'frequency': '1 MHz'})
+    assert len(index) == 4
+
+    index.truncate(2)
+    assert len(index) == 2
+    assert index.matching('ssid', 'e') == {0, 1}
+    assert index.view(sort='frequency') == [1, 0]
+
+
+def build_tree(secrets):
+    tree = CompactTree('Active connections')
+    conn = tree.add(0, 'Connection: home')
+    tree.add(conn, 'address 10.0.0.2/24')
+    tree.add(conn, 'Secrets', children=secrets, volatile=True)
+    tree.add(conn, 'Device: %s', ('wlan0',), background=True,
+             children=lambda: [{'node_id': 'route 10.1.0.0/16',
+                                'children': []}])
+    tree.add(0, 'Connection: work 10.0.0.3')
+    return tree
+
+
+def test_tree_search_returns_paths_in_display_order():
+    index = TreeIndex(build_tree(lambda: []).root)
+
+    assert index.search('10.0') == [(0, 0), (1,)]
+    assert index.search('ADDRESS 10') == [(0, 0)]
+    assert index.search('work home') == []
+    assert index.search('  ') == []
+
+
+def test_tree_index_never_generates_children():
+    calls = []
+    tree = build_tree(lambda: calls.append(1) or [])
+    index = TreeIndex(tree.root)
+
+    assert calls == []
+    assert index.search('route') == []
+    assert callable(tree.root['children'][0]['children'][2]['children'])
+    assert not index.stale()
+
+
+def test_tree_index_is_stale_once_a_subtree_is_loaded():
+    tree = build_tree(lambda: [])
+    index = TreeIndex(tree.root)
+
+    node_children(tree.root['children'][0]['children'][2])
+    assert index.stale()
+    assert TreeIndex(tree.root).search('route') == [(0, 2, 0)]
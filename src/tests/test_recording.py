@@ -0,0 +1,81 @@
+import json
+
+import pytest
+
+pytest.importorskip('dbus')
+
+from dbus.exceptions import DBusException
+
+from network import recording
+
+
+@pytest.mark.parametrize('value', [
+    b'\x00\xffssid',
+    ('10.0.0.1', 24, '10.0.0.254'),
+    {'ipv4': {'addresses': [(1, 24, 2)]}, 'id': 'home'},
+    {1: 'a', 2: (b'b',)},
+    [True, 1, 2.5, None, 'text'],
+])
+def test_encode_decode_round_trip(value):
+    encoded = recording.encode(value)
+
+    assert recording.decode(json.loads(json.dumps(encoded))) == value
+
+
+def write_recording(path, records):
+    with open(path, 'w') as outfile:
+        outfile.write(json.dumps({'version': recording.FORMAT_VERSION}) + '\n')
+        for record in records:
+            outfile.write(json.dumps(record) + '\n')
+
+
+def record(method, args, **answer):
+    return {'path': '/nm', 'interface': 'org.freedesktop.NetworkManager',
+            'method': method, 'args': recording.encode(list(args)),
+            'seconds': 0.0, **answer}
+
+
+def test_replay_serves_answers_in_order(tmp_path):
+    path = str(tmp_path / 'calls.jsonl')
+    write_recording(path, [
+        record('GetDevices', (), result=['/d/0']),
+        record('GetDevices', (), result=['/d/0', '/d/1']),
+        record('Get', ('org.freedesktop.NetworkManager', 'Version'),
+               result={'$bytes': 'AQI='}),
+    ])
+    replay = recording.Replay(path)
+    iface = 'org.freedesktop.NetworkManager'
+
+    assert len(replay) == 3
+    assert replay('/nm', iface, 'GetDevices', (), None) == ['/d/0']
+    assert replay('/nm', iface, 'GetDevices', (), None) == ['/d/0', '/d/1']
+    assert replay('/nm', iface, 'GetDevices', (), None) == ['/d/0', '/d/1']
+    assert replay('/nm', iface, 'Get', (iface, 'Version'), None) == b'\x01\x02'
+
+    replay.rewind()
+    assert replay('/nm', iface, 'GetDevices', (), None) == ['/d/0']
+
+
+def test_replay_errors(tmp_path):
+    path = str(tmp_path / 'calls.jsonl')
+    write_recording(path, [
+        record('GetPermissions', (), error=['org.example.Error', 'denied']),
+    ])
+    replay = recording.Replay(path)
+    iface = 'org.freedesktop.NetworkManager'
+
+    with pytest.raises(DBusException) as error:
+        replay('/nm', iface, 'GetPermissions', (), None)
+    assert error.value.get_dbus_name() == 'org.example.Error'
+
+    with pytest.raises(DBusException):
+        replay('/nm', iface, 'Unknown', (), None)
+    assert replay.misses == 1
+
+
+def test_unsupported_version(tmp_path):
+    path = tmp_path / 'calls.jsonl'
+    path.write_text(json.dumps({'version': 0}) + '\n')
+
+    with pytest.raises(ValueError):
+        recording.Replay(str(path))
@@ -0,0 +1,100 @@
+import random
+
+import pytest
+
+pytest.importorskip('dbus')
+
+from network.properties import Route
+from network.routes import (
+    PrefixTrie, RouteTable, network_key, MAIN_TABLE
+)
+
+
+def brute_force(prefixes, address, bits):
+    best, found = -1, -1
+    for key, length, value in prefixes:
+        if address >> (bits - length) << (bits - length) == key \
+                if length else True:
+            if length > best:
+                best, found = length, value
+    return found
+
+
+@pytest.mark.parametrize('bits', [8, 32, 128])
+def test_trie_matches_brute_force(bits):
+    rng = random.Random(bits)
+    trie = PrefixTrie(bits)
+    prefixes = {}
+
+    for value in range(300):
+        length = rng.randint(0, bits)
+        key = rng.getrandbits(bits) >> (bits - length) << (bits - length) \
+            if length else 0
+        prefixes[key, length] = value
+        trie.insert(key, length, value)
+
+    entries = [(key, length, value)
+               for (key, length), value in prefixes.items()]
+    for _ in range(500):
+        address = rng.getrandbits(bits)
+        assert trie.lookup(address) == brute_force(entries, address, bits)
+    for key, length, value in entries:
+        assert trie.lookup(key) == brute_force(entries, key, bits)
+
+
+def test_network_key_clears_host_bits():
+    assert network_key(4, '10.1.2.3', 16) == 0x0a010000
+    assert network_key(4, '10.1.2.3', 0) == 0
+    assert network_key(6, '::1', 128) == 1
+
+    with pytest.raises(ValueError):
+        network_key(4, '10.0.0.0', 40)
+
+
+def route(dest, prefix, metric=100, table=0, family=4):
+    return Route(family, dest, prefix, '', metric, table)
+
+
+def test_lookup_prefers_longest_prefix_then_lowest_metric():
+    table = RouteTable([
+        (route('0.0.0.0', 0), 'eth0'),
+        (route('10.1.0.0', 16, metric=600), 'wlan0'),
+        (route('10.1.0.0', 16, metric=100), 'eth0'),
+        (route('10.1.2.0', 24), 'wg0'),
+        (route('fd00::', 8, family=6), 'eth0'),
+    ])
+
+    assert table.lookup('10.1.2.3') == 3
+    assert table.lookup('10.1.9.9') == 2
+    assert table.lookup('8.8.8.8') == 0
+    assert table.lookup('fd12::1') == 4
+    assert table.lookup('2001:db8::1') is None
+
+    with pytest.raises(ValueError):
+        table.lookup('not an address')
+
+
+def test_lookup_is_per_routing_table():
+    table = RouteTable([
+        (route('10.0.0.0', 8), 'eth0'),
+        (route('10.1.0.0', 16, table=100), 'wg0'),
+        (route('10.2.0.0', 16, table=MAIN_TABLE), 'eth1'),
+    ])
+
+    assert table.tables() == [100, MAIN_TABLE]
+    assert table.lookup('10.1.0.1') == 0
+    assert table.lookup('10.2.0.1') == 2
+    assert table.lookup('10.1.0.1', table=100) == 1
+    assert table.label(1) == '10.1.0.0/16 dev wg0 metric 100 table 100'
+
+
+def test_malformed_routes_are_listed_but_not_looked_up():
+    table = RouteTable([
+        (route('10.0.0.0', 40), 'bad'),
+        (route('not an address', 8), 'bad'),
+        (route('10.0.0.0', 8), 'eth0'),
+    ])
+
+    assert len(table) == 3
+    assert table.lookup('10.0.0.1') == 2
+    assert len(list(table.rows())) == 3
@@ -0,0 +1,302 @@
+"""
+Data shapes exchanged between the providers in :mod:`network` and the
+table and tree widgets. This module must not import Kivy, so providers can
+be used headless.
+"""
+import sys
+from array import array
+from typing import Any, Tuple, List, Dict, Iterator, Union, Callable, Optional
+
+Columns = Rows = List[Dict[str, str]]
+Table = Tuple[Columns, Rows]
+# A table whose rows are yielded while they are read. Consumers take a
+# list of rows as a complete table.
+StreamTable = Tuple[Columns, Iterator[Dict[str, str]]]
+
+# ``children`` may be a callable returning the child list, so subtrees can
+# be generated only when they are needed. Optional flags:
+# ``volatile``: children are never stored and are dropped from the view
+# when it is reset (e.g. secrets); ``background``: children are generated
+# off the main thread. A :class:`Node` of a :class:`CompactTree` can be
+# used wherever a Tree dict is.
+Tree = Union[
+    Dict[str, Union[str, bool, List['Tree'], Callable[[], List['Tree']]]],
+    'Node'
+]
+
+# CompactTree node flags.
+VOLATILE, BACKGROUND = 1, 2
+
+
+def h(s: str) -> str:
+    """
+    Convert a string into a header format.
+
+    :param s:
+    :return:
+    """
+    return "<{}>".format(s.title())
+
+
+def is_stream(data: Any) -> bool:
+    """
+    Return True for a table whose rows are still being produced.
+
+    :param data:
+    :return:
+    """
+    return isinstance(data, tuple) and len(data) == 2 \
+        and isinstance(data[1], Iterator)
+
+
+def node_children(node: Tree) -> List[Tree]:
+    """
+    Return the children of a node, generating them first if the node
+    holds a callable. Generated children replace the callable unless
+    the node is volatile.
+
+    :param node:
+    :return:
+    """
+    children = node['children']
+
+    if callable(children):
+        children = children()
+        store_children(node, children)
+    return children
+
+
+def generate_children(node: Tree) -> List[Tree]:
+    """
+    Return the children of a node, generating them if the node holds a
+    callable, without storing them: safe to call from a worker thread
+    while the tree is shown. Pass the result to :func:`store_children`
+    on the main thread.
+
+    :param node:
+    :return:
+    """
+    children = node['children']
+    return children() if callable(children) else children
+
+
+def store_children(node: Tree, children: List[Tree]) -> None:
+    """
+    Replace the callable of a node with the children it generated,
+    unless the node is volatile or already holds its children.
+
+    :param node:
+    :param children:
+    :return:
+    """
+    if callable(node['children']) and not node.get('volatile'):
+        node['children'] = children
+
+
+def has_children(node: Tree) -> bool:
+    """
+    Return True if the node has or may generate children, without
+    listing them.
+
+    :param node:
+    :return:
+    """
+    if isinstance(node, Node):
+        return node.tree.has_children(node.index)
+    return bool(node['children'])
+
+
+def is_tree(data: Any) -> bool:
+    """
+
+    :param data:
+    :return:
+    """
+    return isinstance(data, (dict, Node)) and 'node_id' in data
+
+
+class CompactTree:
+    """
+    A tree kept in flat arrays, for trees too large to hold a dict, a
+    list and a label string per node. A node is an index into the
+    arrays, linked to its parent, first child and next sibling. Its
+    label is an interned format string and the tuple it is formatted
+    with, only when the label is read; the tuple can be a record the
+    provider holds anyway. Node 0 is the root.
+    """
+    __slots__ = ('formats', 'args', 'parent', 'first_child', 'last_child',
+                 'next_sibling', 'flags', 'generated', '_root')
+
+    def __init__(self, label: str, args: Tuple = ()):
+        """
+
+        :param label:
+        :param args:
+        """
+        self.formats: List[str] = []
+        self.args: List[Tuple] = []
+        self.parent = array('i')
+        self.first_child = array('i')
+        self.last_child = array('i')
+        self.next_sibling = array('i')
+        self.flags = array('B')
+        # Children of nodes that generate them, or generated them.
+        self.generated: Dict[int, Union[
+            List[Tree], Callable[[], List[Tree]]]] = {}
+        self._root: Optional[Node] = None
+
+        self.add(-1, label, args)
+
+    def __len__(self) -> int:
+        return len(self.formats)
+
+    def add(self, parent: int, label: str, args: Tuple = (),
+            children: Optional[Callable[[], List[Tree]]] = None,
+            volatile: bool = False, background: bool = False) -> int:
+        """
+        Append a node as the last child of parent and return its index.
+        With args, label is a %-format applied to them when displayed.
+        Children, if given, generate the node's children instead of
+        nodes added under it.
+
+        :param parent:
+        :param label:
+        :param args:
+        :param children:
+        :param volatile:
+        :param background:
+        :return:
+        """
+        index = len(self.formats)
+
+        self.formats.append(sys.intern(label))
+        self.args.append(args)
+        self.parent.append(parent)
+        self.first_child.append(-1)
+        self.last_child.append(-1)
+        self.next_sibling.append(-1)
+        self.flags.append(VOLATILE * volatile | BACKGROUND * background)
+        if children is not None:
+            self.generated[index] = children
+
+        if parent >= 0:
+            last = self.last_child[parent]
+            if last < 0:
+                self.first_child[parent] = index
+            else:
+                self.next_sibling[last] = index
+            self.last_child[parent] = index
+        return index
+
+    def label(self, index: int) -> str:
+        """
+
+        :param index:
+        :return:
+        """
+        args = self.args[index]
+        return self.formats[index] % args if args else self.formats[index]
+
+    def child_indices(self, index: int) -> Iterator[int]:
+        """
+
+        :param index:
+        :return:
+        """
+        child = self.first_child[index]
+        while child >= 0:
+            yield child
+            child = self.next_sibling[child]
+
+    def children(self, index: int) -> Union[
+            List[Tree], Callable[[], List[Tree]]]:
+        """
+        Return the child nodes, or the callable generating them.
+
+        :param index:
+        :return:
+        """
+        if index in self.generated:
+            return self.generated[index]
+        return [Node(self, child) for child in self.child_indices(index)]
+
+    def has_children(self, index: int) -> bool:
+        """
+
+        :param index:
+        :return:
+        """
+        if index in self.generated:
+            return bool(self.generated[index])
+        return self.first_child[index] >= 0
+
+    @property
+    def root(self) -> 'Node':
+        """
+        The root node, always the same object.
+
+        :return:
+        """
+        if self._root is None:
+            self._root = Node(self, 0)
+        return self._root
+
+
+class Node:
+    """
+    A node of a :class:`CompactTree`, read like a :data:`Tree` dict:
+    ``node['node_id']``, ``node['children']`` and ``node.get('volatile')``.
+    Nodes are created when they are read and compare equal when they
+    are the same node.
+    """
+    __slots__ = ('tree', 'index')
+
+    def __init__(self, tree: CompactTree, index: int):
+        """
+
+        :param tree:
+        :param index:
+        """
+        self.tree = tree
+        self.index = index
+
+    def __getitem__(self, key: str) -> Any:
+        if key == 'node_id':
+            return self.tree.label(self.index)
+        if key == 'children':
+            return self.tree.children(self.index)
+        if key == 'volatile':
+            return bool(self.tree.flags[self.index] & VOLATILE)
+        if key == 'background':
+            return bool(self.tree.flags[self.index] & BACKGROUND)
+        raise KeyError(key)
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if key != 'children':
+            raise KeyError(key)
+        self.tree.generated[self.index] = value
+
+    def __contains__(self, key: str) -> bool:
+        return key in ('node_id', 'children', 'volatile', 'background')
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """
+
+        :param key:
+        :param default:
+        :return:
+        """
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, Node) and other.tree is self.tree \
+            and other.index == self.index
+
+    def __hash__(self) -> int:
+        return hash((id(self.tree), self.index))
+
+    def __repr__(self) -> str:
+        return 'Node(%r)' % self.tree.label(self.index)
@@ -0,0 +1,276 @@
+"""
+Search structures over provider data. Like :mod:`widgets.data`, this module
+must not import Kivy.
+"""
+import re
+from bisect import bisect_left, insort
+from typing import Dict, List, Optional, Set, Tuple
+
+from widgets.data import Rows, Tree
+
+_NUMBER = re.compile(r'(-?\d+(?:\.\d+)?)')
+_TOKEN = re.compile(r'\w+')
+
+# Child positions leading from the root of a tree to a node.
+Path = Tuple[int, ...]
+
+SortKey = Tuple[Tuple[int, float, str], ...]
+
+
+def sort_key(value: str) -> SortKey:
+    """
+    Return a key ordering numbers by value, so ``'900MHz'`` sorts before
+    ``'2412MHz'``, and text case insensitively.
+
+    :param value:
+    :return:
+    """
+    parts = _NUMBER.split(value.lower())
+    return tuple(
+        (0, float(part), '') if i % 2 else (1, 0.0, part)
+        for i, part in enumerate(parts) if part
+    )
+
+
+class TableIndex:
+    """
+    The rows of a table with an index per column: the row ids in sort
+    key order, and the row ids by distinct cell value. Both are updated
+    row by row, so sorting and filtering never scan or re-sort the
+    whole table.
+    """
+    def __init__(self, keys: List[str]):
+        """
+
+        :param keys:
+        """
+        self.keys = keys
+        self.rows: Rows = []
+
+        self._sorted: Dict[str, List[Tuple[SortKey, int]]] = {
+            key: [] for key in keys}
+        self._values: Dict[str, Dict[str, Set[int]]] = {
+            key: {} for key in keys}
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def _insert(self, row_id: int) -> None:
+        """
+
+        :param row_id:
+        :return:
+        """
+        row = self.rows[row_id]
+
+        for key in self.keys:
+            value = str(row.get(key, ''))
+            insort(self._sorted[key], (sort_key(value), row_id))
+            self._values[key].setdefault(value.lower(), set()).add(row_id)
+
+    def _remove(self, row_id: int) -> None:
+        """
+
+        :param row_id:
+        :return:
+        """
+        row = self.rows[row_id]
+
+        for key in self.keys:
+            value = str(row.get(key, ''))
+
+            entries = self._sorted[key]
+            del entries[bisect_left(entries, (sort_key(value), row_id))]
+
+            ids = self._values[key][value.lower()]
+            ids.discard(row_id)
+            if not ids:
+                del self._values[key][value.lower()]
+
+    def add(self, row: Dict[str, str]) -> int:
+        """
+        Append a row and return its id.
+
+        :param row:
+        :return:
+        """
+        self.rows.append(row)
+        self._insert(len(self.rows) - 1)
+        return len(self.rows) - 1
+
+    def set(self, row_id: int, row: Dict[str, str]) -> bool:
+        """
+        Replace a row, or append it past the end. Return False if it
+        didn't change.
+
+        :param row_id:
+        :param row:
+        :return:
+        """
+        if row_id >= len(self.rows):
+            self.add(row)
+            return True
+        if self.rows[row_id] == row:
+            return False
+
+        self._remove(row_id)
+        self.rows[row_id] = row
+        self._insert(row_id)
+        return True
+
+    def truncate(self, count: int) -> None:
+        """
+        Remove the rows past count.
+
+        :param count:
+        :return:
+        """
+        for row_id in range(count, len(self.rows)):
+            self._remove(row_id)
+        del self.rows[count:]
+
+    def matching(self, key: str, text: str) -> Set[int]:
+        """
+        Return the ids of the rows whose cell in column key contains
+        text, case insensitively. Only distinct values are scanned.
+
+        :param key:
+        :param text:
+        :return:
+        """
+        text = text.lower()
+        matched: Set[int] = set()
+
+        for value, ids in self._values[key].items():
+            if text in value:
+                matched |= ids
+        return matched
+
+    def view(self, sort: Optional[str] = None, descending: bool = False,
+             filters: Optional[Dict[str, str]] = None) -> List[int]:
+        """
+        Return the ids of the rows passing every filter, in sort order
+        or in insertion order.
+
+        :param sort:
+        :param descending:
+        :param filters:
+        :return:
+        """
+        selected: Optional[Set[int]] = None
+
+        for key, text in (filters or {}).items():
+            if not text:
+                continue
+            matched = self.matching(key, text)
+            selected = matched if selected is None else selected & matched
+
+        if sort is None:
+            order = range(len(self.rows))
+        else:
+            order = [row_id for _, row_id in self._sorted[sort]]
+
+        if descending:
+            order = reversed(order)
+        if selected is None:
+            return list(order)
+        return [row_id for row_id in order if row_id in selected]
+
+
+class TreeIndex:
+    """
+    Inverted index over the node labels of a tree, built once per tree.
+    A query matches the nodes having a token that starts with each of
+    its words and whose label contains the whole query. Only the
+    subtrees already generated are indexed: building the index, in a
+    worker thread, never generates children (each one may be a bus
+    round trip) nor modifies the tree shown. Volatile subtrees
+    (secrets) are not indexed either.
+    """
+    def __init__(self, tree: Tree):
+        """
+
+        :param tree:
+        """
+        self.tree = tree
+        self.paths: List[Path] = []
+        self.labels: List[str] = []
+        # Nodes whose children were not generated yet.
+        self.pending: List[Tree] = []
+
+        postings: Dict[str, List[int]] = {}
+        stack: List[Tuple[Tree, Path]] = [(tree, ())]
+
+        # Depth first, so node ids are in display order.
+        while stack:
+            node, path = stack.pop()
+            node_id = len(self.paths)
+            label = str(node['node_id']).lower()
+
+            self.paths.append(path)
+            self.labels.append(label)
+            for token in set(_TOKEN.findall(label)):
+                postings.setdefault(token, []).append(node_id)
+
+            if node.get('volatile'):
+                continue
+            children = node['children']
+            if callable(children):
+                self.pending.append(node)
+                continue
+            for position in range(len(children) - 1, -1, -1):
+                stack.append((children[position], path + (position,)))
+
+        self.tokens: List[str] = sorted(postings)
+        self.postings: List[List[int]] = [
+            postings[token] for token in self.tokens]
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def stale(self) -> bool:
+        """
+        Return True if a subtree left out has been generated since.
+
+        :return:
+        """
+        return any(not callable(node['children']) for node in self.pending)
+
+    def _prefixed(self, prefix: str) -> Set[int]:
+        """
+        Return the ids of the nodes with a token starting with prefix.
+
+        :param prefix:
+        :return:
+        """
+        ids: Set[int] = set()
+        position = bisect_left(self.tokens, prefix)
+
+        while position < len(self.tokens) and \
+                self.tokens[position].startswith(prefix):
+            ids.update(self.postings[position])
+            position += 1
+        return ids
+
+    def search(self, query: str) -> List[Path]:
+        """
+        Return the paths of the matching nodes in display order.
+
+        :param query:
+        :return:
+        """
+        query = query.strip().lower()
+        selected: Optional[Set[int]] = None
+
+        for word in _TOKEN.findall(query):
+            ids = self._prefixed(word)
+            selected = ids if selected is None else selected & ids
+            if not selected:
+                return []
+
+        if selected is None:
+            return []
+        return [
+            self.paths[node_id] for node_id in sorted(selected)
+            if query in self.labels[node_id]
+        ]
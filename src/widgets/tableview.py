@@ -1,27 +1,32 @@
 # Taken from https://github.com/Huluk/kivy-table
-from typing import Tuple, List, Dict, Callable
+from typing import Tuple, List, Dict, Callable, Optional, Union
 import sys
+import time
 
+from kivy.clock import Clock
 from kivy.uix.widget import Widget
 from kivy.uix.scrollview import ScrollView
 from kivy.uix.gridlayout import GridLayout
 from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.textinput import TextInput
+from kivy.uix.recycleview import RecycleView
+from kivy.uix.recycleview.views import RecycleDataViewBehavior
+from kivy.uix.recycleboxlayout import RecycleBoxLayout
 from kivy.core.window import Keyboard
-from kivy.properties import StringProperty, ObjectProperty
+from kivy.uix.button import Button
+from kivy.properties import StringProperty, ObjectProperty, BooleanProperty
 
-Columns = Rows = List[Dict[str, str]]
-Table = Tuple[Columns, Rows]
+from widgets.data import Columns, Rows, Table, h
+from widgets.index import TableIndex
+from network import profiler
+from config.worker import Feed
 
-
-def h(s: str) -> str:
-    """
-    Convert a string into a header format.
-
-    :param s:
-    :return:
-    """
-    return "<{}>".format(s.title())
+# Must match the TableRow height in settings.kv.
+ROW_HEIGHT = 40
+HEADER_HEIGHT = 2 * ROW_HEIGHT
+# Seconds per frame spent adding streamed rows.
+FRAME_BUDGET = 0.004
+SORT_MARKS = {False: ' ^', True: ' v'}
 
 
 class TableColumn(Widget):
@@ -139,6 +144,45 @@ class TableRow(BoxLayout):
         self.table.scroll_to(self)
 
 
+class RecycleTableRow(RecycleDataViewBehavior, TableRow):
+    """
+    A row of a :class:`RecycleTableView`. Instances are reused for
+    whichever data row scrolls into the viewport.
+    """
+    def __init__(self, **kwargs):
+        """
+
+        :param kwargs:
+        """
+        BoxLayout.__init__(self, orientation='horizontal', **kwargs)
+        self.table: Optional[RecycleTableView] = None
+        self.index: int = 0
+        self.columns: List[TableColumn] = []
+
+    def refresh_view_attrs(self, rv: "RecycleTableView", index: int,
+                           data: Dict[str, str]):
+        """
+        Point the row at another data row. Row data keys are not
+        copied onto the widget, cells read them through :meth:`data`.
+
+        :param rv:
+        :param index:
+        :param data:
+        :return:
+        """
+        self.table = rv
+        self.index = index
+
+        if self.columns != rv.columns:
+            self.columns = list(rv.columns)
+            self.clear_widgets()
+
+            for col in self.columns:
+                self.add_widget(col.get_cell(self))
+        else:
+            self.update()
+
+
 class TableCell(TextInput):
     """
     A single cell, formatted and updated according to column,
@@ -253,6 +297,45 @@ class TableView(ScrollView):
         self.layout_rows.append(row)
         self.layout.add_widget(row)
 
+    def set_row(self, index: int, data: Dict[str, str]):
+        """
+        Replace a row, updating its widgets only if it changed, or
+        append it past the end.
+
+        :param index:
+        :param data:
+        :return:
+        """
+        if index >= len(self.data_rows):
+            self.add_row(data)
+        elif self.data_rows[index] != data:
+            self.data_rows[index] = data
+            self.layout_rows[index].update()
+
+    def truncate(self, count: int):
+        """
+        Remove the rows past count.
+
+        :param count:
+        :return:
+        """
+        for layout_row in self.layout_rows[count:]:
+            self.layout.remove_widget(layout_row)
+        del self.layout_rows[count:]
+        del self.data_rows[count:]
+
+    def set_data(self, rows: Rows):
+        """
+        Replace the table data, updating the widgets of changed rows
+        in place and only adding or removing the difference.
+
+        :param rows:
+        :return:
+        """
+        for index, row in enumerate(rows):
+            self.set_row(index, row)
+        self.truncate(len(rows))
+
     def set_focus(self, row_index: int, column: TableColumn):
         """
 
@@ -265,3 +348,386 @@ class TableView(ScrollView):
         row_index = min(max(row_index, 0), len(self.layout_rows) - 1)
         self.layout_rows[row_index].focus_on_cell(column)
 
+
+class RecycleTableView(RecycleView):
+    """
+    A virtualized :class:`TableView`. Only the rows needed to fill the
+    viewport are instantiated; they are recycled while scrolling, so
+    the widget count doesn't depend on the number of data rows.
+
+    Rows are kept in a :class:`~widgets.index.TableIndex`; ``data`` holds
+    the rows passing the column filters in the current sort order.
+    Sorting and filtering only reassign ``data``, views are recycled.
+    """
+    # Key of the column rows are sorted by, None for insertion order.
+    sort_column: Optional[str] = ObjectProperty(None, allownone=True)
+    descending: bool = BooleanProperty(False)
+
+    def __init__(self, size: Tuple[int, int], pos_hint: Dict[str, str]):
+        """
+
+        :param size:
+        :param pos_hint:
+        """
+        super(RecycleTableView, self).__init__(
+            size_hint=(None, 1), size=size, pos_hint=pos_hint,
+            do_scroll_x=False)
+        self.viewclass = RecycleTableRow
+        self.columns = []
+        self.index = TableIndex([])
+        self.filters: Dict[str, str] = {}
+        self._trigger_view = Clock.create_trigger(self.refresh_view)
+
+        layout = RecycleBoxLayout(
+            orientation='vertical', size_hint=(1, None),
+            default_size=(None, ROW_HEIGHT), default_size_hint=(1, None))
+        layout.bind(minimum_height=layout.setter('height'))
+        self.add_widget(layout)
+
+    @property
+    def data_rows(self) -> Rows:
+        """
+
+        :return:
+        """
+        return self.data
+
+    @property
+    def ordered(self) -> bool:
+        """
+        Whether ``data`` differs from the rows in insertion order.
+
+        :return:
+        """
+        return self.sort_column is not None or any(self.filters.values())
+
+    def add_column(self, column: TableColumn):
+        """
+
+        :param column:
+        :return:
+        """
+        self.columns.append(column)
+
+        rows = self.index.rows
+        self.index = TableIndex([col.key for col in self.columns])
+        for row in rows:
+            self.index.add(row)
+        self.refresh_from_data()
+
+    def add_row(self, data: Dict[str, str]):
+        """
+
+        :param data:
+        :return:
+        """
+        self.index.add(data)
+
+        if self.ordered:
+            self._trigger_view()
+        else:
+            self.data.append(data)
+
+    def set_row(self, index: int, data: Dict[str, str]):
+        """
+        Replace a row if it changed, or append it past the end.
+
+        :param index:
+        :param data:
+        :return:
+        """
+        changed = self.index.set(index, data)
+
+        if self.ordered:
+            if changed:
+                self._trigger_view()
+        elif index >= len(self.data):
+            self.data.append(data)
+        elif changed:
+            self.data[index] = data
+
+    def truncate(self, count: int):
+        """
+        Remove the rows past count.
+
+        :param count:
+        :return:
+        """
+        if count >= len(self.index):
+            return
+
+        self.index.truncate(count)
+        if self.ordered:
+            self._trigger_view()
+        else:
+            del self.data[count:]
+
+    def set_data(self, rows: Rows):
+        """
+        Replace the table data. Only changed rows are assigned, so only
+        the visible views bound to them are refreshed.
+
+        :param rows:
+        :return:
+        """
+        if self.ordered:
+            for index, row in enumerate(rows):
+                self.index.set(index, row)
+            self.index.truncate(len(rows))
+            self.refresh_view()
+            return
+
+        data = self.data
+        count = len(data)
+
+        for index, row in enumerate(rows[:count]):
+            if self.index.set(index, row):
+                data[index] = row
+
+        if len(rows) > count:
+            for row in rows[count:]:
+                self.index.add(row)
+            data.extend(rows[count:])
+        else:
+            self.truncate(len(rows))
+
+    def sort_by(self, key: str):
+        """
+        Sort by a column, toggling the direction if it is already the
+        sort column.
+
+        :param key:
+        :return:
+        """
+        if self.sort_column == key:
+            self.descending = not self.descending
+        else:
+            self.sort_column = key
+            self.descending = False
+        self.refresh_view()
+
+    def set_filter(self, key: str, text: str):
+        """
+        Only show rows whose cell in column key contains text.
+
+        :param key:
+        :param text:
+        :return:
+        """
+        self.filters[key] = text
+        self.refresh_view()
+
+    def refresh_view(self, *args):
+        """
+        Recompute ``data`` from the index.
+
+        :param args:
+        :return:
+        """
+        self._trigger_view.cancel()
+
+        rows = self.index.rows
+        self.data = [
+            rows[row_id] for row_id in self.index.view(
+                self.sort_column, self.descending, self.filters)
+        ]
+
+    def scroll_to_index(self, index: int):
+        """
+        Scroll the minimum distance that makes a row visible.
+
+        :param index:
+        :return:
+        """
+        scrollable = self.layout_manager.height - self.height
+        if scrollable <= 0:
+            return
+
+        offset = (1 - self.scroll_y) * scrollable
+        top = index * ROW_HEIGHT
+
+        if top < offset:
+            offset = top
+        elif top + ROW_HEIGHT > offset + self.height:
+            offset = top + ROW_HEIGHT - self.height
+        self.scroll_y = 1 - min(max(offset / scrollable, 0), 1)
+
+    def set_focus(self, row_index: int, column: TableColumn):
+        """
+        The row widget only exists once the row is in the viewport, so
+        focus is given on the next frame after scrolling to it.
+
+        :param row_index:
+        :param column:
+        :return:
+        """
+        if len(self.data) == 0:
+            return
+        row_index = min(max(row_index, 0), len(self.data) - 1)
+
+        self.scroll_to_index(row_index)
+        Clock.schedule_once(
+            lambda dt: self._focus_visible(row_index, column))
+
+    def _focus_visible(self, row_index: int, column: TableColumn):
+        """
+
+        :param row_index:
+        :param column:
+        :return:
+        """
+        row = self.view_adapter.get_visible_view(row_index)
+        if row is not None:
+            row.focus_on_cell(column)
+
+
+class TableHeaderCell(BoxLayout):
+    """
+    The title of a column, which sorts the table by it when clicked, and
+    a filter input for it.
+    """
+    def __init__(self, table: RecycleTableView, column: TableColumn):
+        """
+
+        :param table:
+        :param column:
+        """
+        super().__init__(orientation='vertical')
+        self.table = table
+        self.column = column
+
+        self.button = Button(text=column.title)
+        self.button.bind(on_release=self._on_release)
+        self.filter = TextInput(
+            hint_text='Filter', multiline=False, write_tab=False)
+        self.filter.bind(text=self._on_filter)
+
+        self.add_widget(self.button)
+        self.add_widget(self.filter)
+
+        table.bind(sort_column=self._on_sort, descending=self._on_sort)
+
+    def _on_release(self, button: Button):
+        """
+
+        :param button:
+        :return:
+        """
+        self.table.sort_by(self.column.key)
+
+    def _on_filter(self, instance: TextInput, text: str):
+        """
+
+        :param instance:
+        :param text:
+        :return:
+        """
+        self.table.set_filter(self.column.key, text)
+
+    def _on_sort(self, *args):
+        """
+        Mark the sort column and direction.
+
+        :param args:
+        :return:
+        """
+        mark = ''
+        if self.table.sort_column == self.column.key:
+            mark = SORT_MARKS[self.table.descending]
+        self.button.text = self.column.title + mark
+
+
+class TableHeader(BoxLayout):
+    """
+    Column headers of a :class:`RecycleTableView`, laid out above it.
+    """
+    def __init__(self, table: RecycleTableView):
+        """
+
+        :param table:
+        """
+        super().__init__(
+            orientation='horizontal', size_hint=(None, None),
+            width=table.width, height=HEADER_HEIGHT,
+            pos_hint={'x': table.pos_hint.get('x', 0)})
+
+        for column in table.columns:
+            self.add_widget(TableHeaderCell(table, column))
+
+
+class TableFill:
+    """
+    Moves streamed rows from a :class:`~config.worker.Feed` into a table,
+    one batch per frame. A batch ends when the frame budget is spent or
+    no row is ready, so the first rows show up on the next frame and
+    the UI keeps running while the rest are read. Rows replace the
+    current ones in order; the leftovers are removed once the stream
+    ends.
+    """
+    def __init__(self, table: Union[TableView, "RecycleTableView"],
+                 feed: Feed,
+                 on_done: Optional[Callable[[], None]] = None,
+                 on_error: Optional[Callable[[BaseException], None]] = None,
+                 budget: float = FRAME_BUDGET):
+        """
+
+        :param table:
+        :param feed:
+        :param on_done:
+        :param on_error:
+        :param budget:
+        """
+        self.table = table
+        self.feed = feed
+        self.on_done = on_done
+        self.on_error = on_error
+        self.budget = budget
+        self.count = 0
+
+        self.event = Clock.schedule_interval(self._step, 0)
+
+    def _step(self, dt: float) -> None:
+        """
+
+        :param dt:
+        :return:
+        """
+        feed = self.feed
+        deadline = time.perf_counter() + self.budget
+
+        with profiler.span('widget', 'TableView fill'):
+            while time.perf_counter() < deadline:
+                try:
+                    row = feed.take()
+                except IndexError:
+                    if feed.exhausted():
+                        self._finish()
+                    return
+
+                self.table.set_row(self.count, row)
+                self.count += 1
+
+    def _finish(self) -> None:
+        """
+
+        :return:
+        """
+        self.event.cancel()
+
+        if self.feed.error is not None:
+            if self.on_error is not None:
+                self.on_error(self.feed.error)
+            return
+
+        self.table.truncate(self.count)
+        if self.on_done is not None:
+            self.on_done()
+
+    def cancel(self) -> None:
+        """
+        Stop reading and filling; rows added so far stay.
+
+        :return:
+        """
+        self.event.cancel()
+        self.feed.cancel()
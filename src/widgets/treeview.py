@@ -1,19 +1,162 @@
-from typing import List, Dict, Union, Optional
+from typing import List, Union, Optional
 
 from kivy.uix.treeview import TreeView, TreeViewLabel
 
-Tree = Dict[str, Union[str, List['Tree']]]
+from widgets.data import (
+    Tree, node_children, has_children, generate_children, store_children
+)
+from widgets.index import Path
+from network import profiler
+from config.worker import submit
+
+LOADING_TEXT = 'Loading...'
+HIGHLIGHT_COLOR = (1, .8, 0, 1)
+
+
+def _add_children(tree_view: TreeView, tree_node: TreeViewLabel,
+                  children: List[Tree]) -> None:
+    """
+
+    :param tree_view:
+    :param tree_node:
+    :param children:
+    :return:
+    """
+    with profiler.span('widget', 'TreeView expand'):
+        for child_node in children:
+            populate_tree_view(tree_view, tree_node, child_node, lazy=True)
+
+
+def _on_background_children(tree_view: TreeView, tree_node: TreeViewLabel,
+                            node: Tree, children: List[Tree]) -> None:
+    """
+    Replace the loading placeholder with children generated in a
+    worker thread. They are stored in the tree here, on the main
+    thread.
+
+    :param tree_view:
+    :param tree_node:
+    :param node:
+    :param children:
+    :return:
+    """
+    tree_node.job = None
+    store_children(node, children)
+    for child in list(tree_node.nodes):
+        tree_view.remove_node(child)
+    _add_children(tree_view, tree_node, children)
+
+
+def _error_children(error: Exception) -> List[Tree]:
+    """
+
+    :param error:
+    :return:
+    """
+    return [dict(node_id="Error: %s" % error, children=[])]
+
+
+def _on_node_expand(tree_view: TreeView, tree_node: TreeViewLabel) -> None:
+    """
+    Materialize the children of a node the first time it is opened.
+
+    :param tree_view:
+    :param tree_node:
+    :return:
+    """
+    node: Optional[Tree] = getattr(tree_node, 'pending', None)
+    if node is None:
+        return
+
+    tree_node.pending = None
+    if not node.get('background') or not callable(node['children']):
+        # Stored children are added at once, so expand_path finds them.
+        _add_children(tree_view, tree_node, node_children(node))
+        return
+
+    tree_view.add_node(TreeViewLabel(text=LOADING_TEXT), tree_node)
+    tree_node.job = submit(
+        lambda: generate_children(node),
+        lambda children: _on_background_children(
+            tree_view, tree_node, node, children),
+        lambda error: _on_background_children(
+            tree_view, tree_node, {'children': []}, _error_children(error)))
+
+
+def reset_volatile_nodes(tree_view: TreeView) -> None:
+    """
+    Drop the materialized children of volatile nodes and close them,
+    so they are generated again on the next expand.
+
+    :param tree_view:
+    :return:
+    """
+    for tree_node in list(tree_view.iterate_all_nodes()):
+        node: Optional[Tree] = getattr(tree_node, 'volatile', None)
+        if node is None:
+            continue
+
+        job = getattr(tree_node, 'job', None)
+        if job is not None:
+            job.cancel()
+            tree_node.job = None
+
+        for child in list(tree_node.nodes):
+            tree_view.remove_node(child)
+        tree_node.is_open = False
+        tree_node.is_leaf = False
+        tree_node.pending = node
+
+
+def expand_path(tree_view: TreeView, path: Path) -> TreeViewLabel:
+    """
+    Open the nodes leading to a node and return it. Only the children
+    of the opened nodes are created. Stops early at a node whose
+    children are still being generated in the background.
+
+    :param tree_view:
+    :param path:
+    :return:
+    """
+    tree_node = tree_view.root.nodes[0]
+
+    for position in path:
+        if not tree_node.is_open:
+            # Dispatches on_node_expand, which creates the children.
+            tree_view.toggle_node(tree_node)
+        if position >= len(tree_node.nodes):
+            break
+        tree_node = tree_node.nodes[position]
+    return tree_node
+
+
+def set_highlight(tree_node: TreeViewLabel, highlight: bool) -> None:
+    """
+
+    :param tree_node:
+    :param highlight:
+    :return:
+    """
+    if highlight:
+        if not hasattr(tree_node, 'plain_color'):
+            tree_node.plain_color = tree_node.color
+        tree_node.color = HIGHLIGHT_COLOR
+    elif hasattr(tree_node, 'plain_color'):
+        tree_node.color = tree_node.plain_color
 
 
 def populate_tree_view(tree_view: TreeView,
                        parent: Union[TreeView, TreeViewLabel, None],
-                       node: Tree) -> None:
+                       node: Tree, lazy: bool = False) -> None:
     """
-    Populates a TreeView recursively from node data.
+    Populates a TreeView recursively from node data, Tree dicts or
+    :class:`~widgets.data.CompactTree` nodes. In lazy mode, the
+    children of a closed node are only created when it is expanded.
 
     :param tree_view:
     :param parent:
     :param node:
+    :param lazy:
     :return:
     """
     if parent is None:
@@ -22,6 +165,12 @@ def populate_tree_view(tree_view: TreeView,
                 text=node['node_id'],
                 is_open=True
             ))
+        tree_node.node = node
+
+        if lazy:
+            # The view may be repopulated, bind the handler only once.
+            tree_view.funbind('on_node_expand', _on_node_expand)
+            tree_view.fbind('on_node_expand', _on_node_expand)
     else:
         tree_node = tree_view.add_node(
             TreeViewLabel(
@@ -30,9 +179,124 @@ def populate_tree_view(tree_view: TreeView,
             ),
             parent
         )
+        tree_node.node = node
+
+        if lazy:
+            if has_children(node):
+                tree_node.is_leaf = False
+                tree_node.pending = node
+            if node.get('volatile'):
+                tree_node.volatile = node
+            return
 
-    for child_node in node['children']:
+    for child_node in node_children(node):
         populate_tree_view(
-            tree_view, tree_node, child_node
+            tree_view, tree_node, child_node, lazy
         )
 
+
+def _update_node(tree_view: TreeView, tree_node: TreeViewLabel,
+                 node: Tree) -> None:
+    """
+
+    :param tree_view:
+    :param tree_node:
+    :param node:
+    :return:
+    """
+    if tree_node.text != node['node_id']:
+        tree_node.text = node['node_id']
+    tree_node.node = node
+
+    if getattr(tree_node, 'volatile', None) is not None:
+        # Secrets being shown stay until the view is reset.
+        tree_node.volatile = node
+        if getattr(tree_node, 'pending', None) is not None:
+            tree_node.pending = node
+        return
+
+    if getattr(tree_node, 'job', None) is not None:
+        return
+
+    update_job = getattr(tree_node, 'update_job', None)
+    if update_job is not None:
+        # Superseded by this newer version of the node.
+        update_job.cancel()
+        tree_node.update_job = None
+
+    if getattr(tree_node, 'pending', None) is not None or \
+            (tree_node.is_leaf and has_children(node)):
+        # Children not created yet: create them from the new node.
+        tree_node.is_leaf = not has_children(node)
+        tree_node.pending = node if not tree_node.is_leaf else None
+        return
+
+    if node.get('background') and callable(node['children']):
+        # Open node whose new children need the bus: generate them in
+        # a worker, the shown ones stay until they are ready.
+        tree_node.update_job = submit(
+            lambda: generate_children(node),
+            lambda children: _on_updated_children(
+                tree_view, tree_node, node, children),
+            lambda error: _on_updated_children(
+                tree_view, tree_node, {'children': []},
+                _error_children(error)))
+        return
+
+    _update_children(tree_view, tree_node, node_children(node))
+
+
+def _on_updated_children(tree_view: TreeView, tree_node: TreeViewLabel,
+                         node: Tree, children: List[Tree]) -> None:
+    """
+
+    :param tree_view:
+    :param tree_node:
+    :param node:
+    :param children:
+    :return:
+    """
+    tree_node.update_job = None
+    store_children(node, children)
+    with profiler.span('widget', 'TreeView update'):
+        _update_children(tree_view, tree_node, children)
+
+
+def _update_children(tree_view: TreeView, tree_node: TreeViewLabel,
+                     children: List[Tree]) -> None:
+    """
+    Update the shown children of a node to a new child list.
+
+    :param tree_view:
+    :param tree_node:
+    :param children:
+    :return:
+    """
+    existing = list(tree_node.nodes)
+
+    for position, child_node in enumerate(children):
+        if position < len(existing):
+            _update_node(tree_view, existing[position], child_node)
+        else:
+            populate_tree_view(tree_view, tree_node, child_node, lazy=True)
+
+    for child in existing[len(children):]:
+        tree_view.remove_node(child)
+
+
+def update_tree_view(tree_view: TreeView, tree: Tree) -> None:
+    """
+    Apply a new version of the tree shown by a lazily populated view.
+    Nodes are matched by position: labels that changed are set, missing
+    nodes added and extra ones removed, and open nodes stay open.
+    Closed subtrees are only replaced by their new, lazy version.
+
+    :param tree_view:
+    :param tree:
+    :return:
+    """
+    with profiler.span('widget', 'TreeView update'):
+        if not tree_view.root.nodes:
+            populate_tree_view(tree_view, None, tree, lazy=True)
+        else:
+            _update_node(tree_view, tree_view.root.nodes[0], tree)
@@ -0,0 +1,168 @@
+from typing import Callable, List
+
+from kivy.clock import Clock
+from kivy.metrics import dp
+from kivy.uix.boxlayout import BoxLayout
+from kivy.uix.label import Label
+from kivy.uix.slider import Slider
+from kivy.properties import NumericProperty
+
+LINE_HEIGHT = 28
+SCROLLBAR_WIDTH = 24
+# Lines moved per mouse wheel step.
+WHEEL_LINES = 3
+SELECTED_COLOR = (1, .8, 0, 1)
+PLAIN_COLOR = (1, 1, 1, 1)
+
+
+class VirtualList(BoxLayout):
+    """
+    A scrollable list of ``count`` lines of text where only the lines in
+    view exist, as labels. A line's text is asked for by position when it
+    scrolls into view, so neither the widgets nor the text kept depend on
+    the number of lines.
+    """
+    count: int = NumericProperty(0)
+    # Position of the first line in view.
+    offset: int = NumericProperty(0)
+    # Highlighted line, -1 for none.
+    selected: int = NumericProperty(-1)
+
+    def __init__(self, get_text: Callable[[int], str], count: int = 0,
+                 **kwargs):
+        """
+
+        :param get_text: returns the text of the line at a position.
+        :param count:
+        :param kwargs:
+        """
+        super().__init__(orientation='horizontal', **kwargs)
+        self.get_text = get_text
+        self.labels: List[Label] = []
+
+        self.lines = BoxLayout(orientation='vertical')
+        self.scrollbar = Slider(
+            orientation='vertical', min=0, max=1, value=1, step=1,
+            size_hint_x=None, width=dp(SCROLLBAR_WIDTH))
+        self.scrollbar.bind(value=self._on_scrollbar)
+        self.add_widget(self.lines)
+        self.add_widget(self.scrollbar)
+
+        self._trigger_layout_lines = Clock.create_trigger(self._layout_lines)
+        self._trigger_refresh = Clock.create_trigger(self.refresh)
+        self.bind(size=lambda *args: self._trigger_layout_lines(),
+                  count=self._on_count,
+                  offset=lambda *args: self._trigger_refresh(),
+                  selected=lambda *args: self._trigger_refresh())
+        self.count = count
+
+    @property
+    def visible(self) -> int:
+        """
+        Number of lines that fit in view.
+
+        :return:
+        """
+        return len(self.labels)
+
+    @property
+    def max_offset(self) -> int:
+        """
+
+        :return:
+        """
+        return max(self.count - self.visible, 0)
+
+    def _layout_lines(self, *args) -> None:
+        """
+        Create as many labels as lines fit in the height.
+
+        :param args:
+        :return:
+        """
+        wanted = max(int(self.height // dp(LINE_HEIGHT)), 1)
+
+        while len(self.labels) < wanted:
+            label = Label(size_hint_y=None, height=dp(LINE_HEIGHT),
+                          halign='left', valign='middle', shorten=True)
+            label.bind(size=lambda label, size: setattr(
+                label, 'text_size', size))
+            self.labels.append(label)
+            self.lines.add_widget(label)
+        while len(self.labels) > wanted:
+            self.lines.remove_widget(self.labels.pop())
+
+        self._on_count()
+
+    def _on_count(self, *args) -> None:
+        """
+
+        :param args:
+        :return:
+        """
+        self.scrollbar.max = max(self.max_offset, 1)
+        self.scroll_to_offset(self.offset)
+        self._trigger_refresh()
+
+    def _on_scrollbar(self, slider: Slider, value: float) -> None:
+        """
+        The scrollbar is at its maximum at the top.
+
+        :param slider:
+        :param value:
+        :return:
+        """
+        offset = int(round(self.max_offset - value))
+        if offset != self.offset:
+            self.offset = min(max(offset, 0), self.max_offset)
+
+    def scroll_to_offset(self, offset: int) -> None:
+        """
+
+        :param offset:
+        :return:
+        """
+        self.offset = min(max(int(offset), 0), self.max_offset)
+        self.scrollbar.value = self.max_offset - self.offset
+
+    def scroll_to(self, index: int) -> None:
+        """
+        Bring a line into view, centered, unless it already is.
+
+        :param index:
+        :return:
+        """
+        if not self.offset <= index < self.offset + self.visible:
+            self.scroll_to_offset(index - self.visible // 2)
+
+    def refresh(self, *args) -> None:
+        """
+        Set the text of the labels in view. Call it when the text of
+        the lines changed.
+
+        :param args:
+        :return:
+        """
+        self._trigger_refresh.cancel()
+
+        for position, label in enumerate(self.labels):
+            index = self.offset + position
+            label.text = self.get_text(index) if index < self.count else ''
+            label.color = SELECTED_COLOR if index == self.selected \
+                else PLAIN_COLOR
+
+    def on_touch_down(self, touch) -> bool:
+        """
+        Scroll with the mouse wheel.
+
+        :param touch:
+        :return:
+        """
+        if self.collide_point(*touch.pos) and \
+                getattr(touch, 'is_mouse_scrolling', False):
+            if touch.button == 'scrolldown':
+                self.scroll_to_offset(self.offset - WHEEL_LINES)
+            elif touch.button == 'scrollup':
+                self.scroll_to_offset(self.offset + WHEEL_LINES)
+            return True
+        return super().on_touch_down(touch)